@@ -0,0 +1,91 @@
+"""Import time benchmark for future_food.
+
+Measures the cumulative import time of a module with python -X importtime in
+fresh interpreters, and exits with a non-zero status if the best of the runs
+exceeds the budget, or if any of the heavy dependencies is imported eagerly.
+
+Usage:
+    python benchmarks/import_time.py [--module future_food] [--budget-ms 50]
+                                     [--repeat 5] [--allow-heavy]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Modules which must not be imported by a bare "import future_food"
+HEAVY_MODULES = ["xarray", "pandas", "agrifoodpy", "agrifoodpy_data", "Crypto"]
+
+
+def import_time(module, python=sys.executable):
+    """Returns the cumulative import time of module in microseconds, and the
+    list of modules imported with it"""
+
+    result = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True,
+                            env=_environment())
+
+    cumulative = None
+    imported = []
+    for line in result.stderr.splitlines():
+        # Lines have the form "import time: self [us] | cumulative | name"
+        fields = line.split("|")
+        if not line.startswith("import time:") or len(fields) != 3:
+            continue
+        cumulative_us = fields[1].strip()
+        name = fields[2].strip()
+        if not cumulative_us.isdigit():
+            continue
+        imported.append(name)
+        if name == module:
+            cumulative = int(cumulative_us)
+
+    if cumulative is None:
+        raise RuntimeError(f"No import time reported for {module}")
+
+    return cumulative, imported
+
+
+def _environment():
+    # Make the package importable from a source checkout
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    return env
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="future_food")
+    parser.add_argument("--budget-ms", type=float, default=50.)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--allow-heavy", action="store_true",
+                        help="Do not fail if heavy dependencies are imported")
+    args = parser.parse_args(argv)
+
+    times = []
+    for _ in range(args.repeat):
+        cumulative, imported = import_time(args.module)
+        times.append(cumulative / 1000)
+
+    best = min(times)
+    print(f"import {args.module}: best {best:.1f} ms, "
+          f"worst {max(times):.1f} ms over {args.repeat} runs "
+          f"(budget {args.budget_ms:.1f} ms)")
+
+    failed = False
+    eager = sorted({name.split(".")[0] for name in imported} & set(HEAVY_MODULES))
+    if eager and not args.allow_heavy:
+        print("Heavy modules imported eagerly: " + ", ".join(eager))
+        failed = True
+
+    if best > args.budget_ms:
+        print(f"Import time budget exceeded by {best - args.budget_ms:.1f} ms")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
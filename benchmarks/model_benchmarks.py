@@ -0,0 +1,391 @@
+"""Model benchmarks for future_food.
+
+Times every public model function and the full calculator pipeline on a
+synthetic datablock, built by future_food.synthetic, so that neither the data
+packages nor the AES key of the land cover asset are needed. Each case is run
+a number of warm-up times and then timed repeatedly, each run on a fresh
+copy-on-write copy of its input datablock, and the summary statistics of the
+timings are printed and optionally written to a JSON file, to be compared
+across commits.
+
+Usage:
+    python benchmarks/model_benchmarks.py [--repeat 10] [--warmup 1]
+                                          [--filter REGEX] [--seed 0]
+                                          [--items N] [--end-year 2050]
+                                          [--land-resolution 2000]
+                                          [--land-classes N]
+                                          [--output results.json]
+
+The --items, --end-year, --land-resolution and --land-classes options enlarge
+the synthetic datablock, to measure how the model scales.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Make the package importable from a source checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from future_food import model
+from future_food.datablock_utils import copy_datablock
+from future_food.pipeline import ModelPipeline
+from future_food.pipeline_builder import pipeline_setup
+from future_food.synthetic import synthetic_datablock
+
+PERCENTILES = [50, 90, 99]
+
+slider_values = {
+    "ruminant" : -20,
+    "pig_poultry" : -10,
+    "fish_seafood" : 0,
+    "dairy" : -10,
+    "eggs" : 0,
+    "fruit_veg" : 20,
+    "pulses" : 20,
+    "meat_alternatives" : 20,
+    "dairy_alternatives" : 20,
+    "waste" : 20,
+    "foresting_pasture" : 13.17,
+    "bdleaf_conif_ratio":75,
+    "land_BECCS" : 2,
+    "land_BECCS_pasture":2,
+    "horticulture" : 20,
+    "pulse_production" : 20,
+    "lowland_peatland" : 20,
+    "upland_peatland" : 20,
+    "pasture_soil_carbon" : 20,
+    "arable_soil_carbon" : 20,
+    "mixed_farming" : 10,
+    "silvopasture" : 10,
+    "nitrogen" : 20,
+    "methane_inhibitor" : 20,
+    "stock_density" : 10,
+    "manure_management" : 20,
+    "livestock_yield":105,
+    "animal_breeding" : 20,
+    "fossil_livestock" : 20,
+    "agroforestry" : 10,
+    "vertical_farming" : 10,
+    "fossil_arable" : 20,
+    "waste_BECCS" : 1,
+    "overseas_BECCS" : 1,
+    "DACCS" : 1,
+    "biochar":1
+}
+
+advanced_settings = {
+    "pop_proj": "Medium",
+    "yield_proj":0.0,
+    "elasticity":0.5,
+    "baseline_total_emissions":71,
+    "baseline_agricultural_emissions":30,
+    "ssr_metric":"g/cap/day",
+    "baseline_beef_herd":5672659,
+    "baseline_dairy_herd":3479950,
+    "baseline_dairy_herd_breeding_aged_2_years_":1836442,
+    "baseline_sheep_flock":31016701,
+    "baseline_poultry_heads":178000000,
+    "baseline_pig_heads":4715669,
+    "baseline_potato_area":0.12,
+    "baseline_oilseed_area":0.418,
+    "baseline_horticulture_area":0.145,
+    "baseline_cereal_area":3.1,
+    "baseline_othercrops_area":0.75,
+    "labmeat_co2e":2.2,
+    "dairy_alternatives_co2e":0.31,
+    "rda_kcal":2250,
+    "n_scale":20,
+    "bdleaf_seq_ha_yr":3.82,
+    "conif_seq_ha_yr":7.63,
+    "new_bdleaf_seq_ha_yr":2.1,
+    "new_conif_seq_ha_yr":11.2,
+    "peatland_seq_ha_yr":20,
+    "managed_arable_seq_ha_yr":0.66,
+    "managed_pasture_seq_ha_yr":0.66,
+    "mixed_farming_seq_ha_yr":0.66,
+    "beccs_crops_arable_seq_ha_yr":5.34,
+    "beccs_crops_pasture_seq_ha_yr":11.82,
+    "BECCS_arable_tco2_ha_yr":20.84,
+    "BECCS_pasture_tco2_ha_yr":5.11,
+    "dairy_herd_grazing":0.05,
+    "dairy_herd_beef":0.52,
+    "horticulture_land_ratio":0.086,
+    "pulse_land_ratio":0.033,
+    "mixed_farming_production_scale":0.93,
+    "mixed_farming_secondary_production_scale":0.1,
+    "agroecology_tree_coverage":0.1,
+    "nitrogen_prod_factor":0,
+    "nitrogen_ghg_factor":0.1,
+    "manure_prod_factor":0,
+    "manure_ghg_factor":0.07,
+    "breeding_prod_factor":0,
+    "breeding_ghg_factor":0.08,
+    "methane_prod_factor":0,
+    "methane_ghg_factor":0.13,
+    "fossil_livestock_prod_factor":0,
+    "fossil_livestock_ghg_factor":0.1,
+    "fossil_arable_prod_factor":0,
+    "fossil_arable_ghg_factor":0.1,
+    "scaling_nutrient":"kCal/cap/day"
+}
+
+# Slider positions at which the sliders leave the datablock unchanged, see
+# future_food.neutral. The forest sliders set a target and have none.
+neutral_slider_values = {key: 100 if key == "livestock_yield" else 0 for key in slider_values}
+neutral_slider_values.update({key: slider_values[key]
+                              for key in ["foresting_pasture", "bdleaf_conif_ratio"]})
+
+
+def time_case(run, setup=None, repeat=10, warmup=1):
+    """Times a benchmark case.
+
+    Parameters
+    ----------
+    run : callable
+        Function to time, called with the value returned by setup.
+    setup : callable, optional
+        Function returning the input of each call to run, which is not timed.
+    repeat : int, optional
+        Number of timed calls.
+    warmup : int, optional
+        Number of untimed calls made first.
+
+    Returns
+    -------
+    times : list of float
+        Wall time of each timed call, in seconds.
+    """
+
+    times = []
+    for n in range(warmup + repeat):
+        args = setup() if setup is not None else None
+        start = time.perf_counter()
+        run(args)
+        elapsed = time.perf_counter() - start
+        if n >= warmup:
+            times.append(elapsed)
+
+    return times
+
+
+def summarize(times):
+    """Returns the summary statistics of a list of timings, in seconds"""
+
+    stats = {"repeat": len(times),
+             "min": float(np.min(times)),
+             "mean": float(np.mean(times)),
+             "std": float(np.std(times))}
+    for q in PERCENTILES:
+        stats[f"p{q}"] = float(np.percentile(times, q))
+
+    return stats
+
+
+def pipeline_states(datablock, params, adv_settings):
+    """Runs the calculator pipeline once and returns the pipeline and a copy of
+    the datablock before each node and after the last one"""
+
+    pipeline = pipeline_setup(ModelPipeline(datablock=copy_datablock(datablock),
+                                            checkpoints=False), params, adv_settings)
+
+    states = [copy_datablock(pipeline.datablock)]
+    for node, node_params in zip(pipeline.nodes, pipeline.params):
+        states.append(node(datablock=copy_datablock(states[-1]), **node_params))
+
+    return pipeline, states
+
+
+def benchmark_cases(datablock, params, adv_settings):
+    """Returns the benchmark cases, as a dictionary mapping case names to
+    (run, setup) pairs"""
+
+    pipeline, states = pipeline_states(datablock, params, adv_settings)
+    cases = {}
+
+    # ---- Pipeline nodes, run on the datablock the pipeline gives them ----
+    counts = {}
+    for i, (node, node_params) in enumerate(zip(pipeline.nodes, pipeline.params)):
+        counts[node.__name__] = counts.get(node.__name__, 0) + 1
+        name = f"node/{node.__name__}[{counts[node.__name__] - 1}]"
+        cases[name] = _node_case(node, node_params, states[i])
+
+    # ---- Model functions not used by the pipeline ----
+    food_state = states[2]
+    final_state = states[-1]
+    timescale = adv_settings["n_scale"]
+
+    cases["model/item_scaling"] = _node_case(model.item_scaling, {
+        "scale": 0.8, "items": [2731, 2732], "source": ["production", "imports"],
+        "scaling_nutrient": "kCal/cap/day", "elasticity": [0.5, 0.5],
+        "non_sel_items": ("Item_group", "Cereals - Excluding Beer")},
+        food_state)
+
+    cases["model/cultured_meat_model"] = _node_case(model.cultured_meat_model, {
+        "cultured_scale": 0.2, "labmeat_co2e": adv_settings["labmeat_co2e"],
+        "items": [2731, 2732], "copy_from": 2731, "new_items": 5000,
+        "new_item_name": "Cultured meat", "source": ["production", "imports"],
+        "elasticity": [0.5, 0.5]},
+        food_state)
+
+    cases["model/compute_t_anomaly"] = _node_case(model.compute_t_anomaly, {},
+                                                  final_state)
+
+    cases["model/forest_land_model"] = _node_case(model.forest_land_model, {
+        "forest_fraction": 0.1, "bdleaf_conif_ratio": 0.75},
+        food_state)
+
+    cases["model/zero_land_farming_model"] = _node_case(model.zero_land_farming_model, {
+        "fraction": 0.1, "items": ("Item_group", "Vegetables")},
+        food_state)
+
+    # ---- Food balance sheet helpers ----
+    fbs = food_state["food"]["g/cap/day"]
+    ref = states[1]["food"]["g/cap/day"]
+    items = model.get_items(fbs, [2731, 2732])
+
+    cases["helper/balanced_scaling"] = (
+        lambda fbs: model.balanced_scaling(fbs, items=items, scale=0.8, element="food",
+                                           year=2021, adoption="logistic",
+                                           timescale=timescale,
+                                           origin=["production", "imports"],
+                                           elasticity=[0.5, 0.5], constant=True),
+        lambda: fbs.copy(deep=True))
+
+    cases["helper/feed_scale"] = (lambda fbs: model.feed_scale(fbs, ref),
+                                  lambda: fbs.copy(deep=True))
+
+    cases["helper/check_negative_source"] = (
+        lambda fbs: model.check_negative_source(fbs, "imports", "exports", add=False),
+        lambda: fbs.copy(deep=True))
+
+    cases["helper/logistic_food_supply"] = (
+        lambda fbs: model.logistic_food_supply(fbs, timescale, 1, 0.8),
+        lambda: fbs)
+
+    cases["helper/scale_kcal_feed"] = (
+        lambda fbs: model.scale_kcal_feed(fbs, food_state["food"]["kCal/cap/day"], 2731),
+        lambda: final_state["food"]["kCal/cap/day"].copy(deep=True))
+
+    cases["helper/get_items"] = (
+        lambda fbs: model.get_items(fbs, ("Item_group", "Meat")),
+        lambda: fbs)
+
+    # ---- Full calculator run ----
+    def run_pipeline(datablock):
+        pipeline = pipeline_setup(ModelPipeline(datablock=datablock, checkpoints=False),
+                                  params, adv_settings)
+        pipeline.run()
+
+    cases["pipeline/pipeline_setup+run"] = (run_pipeline,
+                                            lambda: copy_datablock(states[0]))
+
+    # At neutral slider positions, with and without the elimination of the
+    # neutral nodes
+    for neutral in [True, False]:
+        def run_neutral_pipeline(datablock, neutral=neutral):
+            pipeline = pipeline_setup(ModelPipeline(datablock=datablock, checkpoints=False),
+                                      neutral_slider_values, adv_settings, neutral=neutral)
+            pipeline.run()
+
+        cases[f"pipeline/pipeline_setup+run[neutral sliders, neutral={neutral}]"] = (
+            run_neutral_pipeline, lambda: copy_datablock(states[0]))
+
+    return cases
+
+
+def _node_case(node, node_params, state):
+    return (lambda datablock: node(datablock=datablock, **node_params),
+            lambda: copy_datablock(state))
+
+
+def _git_commit():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def _environment():
+    import xarray as xr
+    return {"commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "xarray": xr.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--filter", default=None,
+                        help="Only run the cases whose name matches this regular expression")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the synthetic datablock")
+    parser.add_argument("--items", type=int, default=None,
+                        help="Number of food items of the synthetic datablock")
+    parser.add_argument("--end-year", type=int, default=2050,
+                        help="Last projected year")
+    parser.add_argument("--land-resolution", type=float, default=2000.,
+                        help="Size of the land use grid pixels, in metres")
+    parser.add_argument("--land-classes", type=int, default=None,
+                        help="Number of land use classes")
+    parser.add_argument("--output", default=None,
+                        help="Path of the JSON file the results are written to")
+    args = parser.parse_args(argv)
+
+    datablock = synthetic_datablock(advanced_settings, seed=args.seed,
+                                    n_items=args.items, end_year=args.end_year,
+                                    land_resolution=args.land_resolution,
+                                    n_land_classes=args.land_classes)
+    cases = benchmark_cases(datablock, slider_values, advanced_settings)
+    if args.filter is not None:
+        cases = {name: case for name, case in cases.items()
+                 if re.search(args.filter, name)}
+
+    width = max([len(name) for name in cases] + [4])
+    print(f"{'Case':<{width}}  {'min ms':>9}  {'p50 ms':>9}  {'p90 ms':>9}  {'p99 ms':>9}")
+
+    results = {}
+    skipped = {}
+    for name, (run, setup) in cases.items():
+        try:
+            times = time_case(run, setup, repeat=args.repeat, warmup=args.warmup)
+        except ImportError as error:
+            # Cases needing optional dependencies, like fair for compute_t_anomaly
+            skipped[name] = str(error)
+            print(f"{name:<{width}}  skipped: {error}")
+            continue
+        stats = summarize(times)
+        results[name] = stats
+        print(f"{name:<{width}}  {stats['min'] * 1e3:>9.2f}  {stats['p50'] * 1e3:>9.2f}  " \
+              f"{stats['p90'] * 1e3:>9.2f}  {stats['p99'] * 1e3:>9.2f}")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"environment": _environment(),
+                       "settings": {"repeat": args.repeat, "warmup": args.warmup,
+                                    "seed": args.seed, "items": args.items,
+                                    "end_year": args.end_year,
+                                    "land_resolution": args.land_resolution,
+                                    "land_classes": args.land_classes},
+                       "results": results,
+                       "skipped": skipped}, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
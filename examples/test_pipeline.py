@@ -1,7 +1,7 @@
 from future_food.datablock_setup import datablock_setup
+from future_food.datablock_utils import copy_datablock
 from future_food.pipeline_builder import pipeline_setup
-from agrifoodpy.pipeline import Pipeline
-import copy
+from future_food.pipeline import ModelPipeline
 
 from timer import Timer
 
@@ -112,9 +112,9 @@ datablock = datablock_setup(
 )
 
 it = Timer()
-db_copy = copy.deepcopy(datablock)
+db_copy = copy_datablock(datablock)
 
-fs = Pipeline(datablock=db_copy)
+fs = ModelPipeline(datablock=db_copy)
 
 fs = pipeline_setup(
     fs,
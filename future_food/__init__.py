@@ -1,2 +1,79 @@
-from .model import *
-from .pipeline_builder import pipeline_setup
+import importlib
+
+# The model nodes and the pipeline builder import xarray and agrifoodpy, which
+# take most of the import time of the package. They are only imported when one
+# of their attributes is first accessed (PEP 562).
+_LAZY_SUBMODULES = ["model", "pipeline_builder", "pipeline", "sweep", "profiling",
+                    "synthetic", "fusion", "neutral", "service", "result_store",
+                    "worker_pool", "glossary"]
+_LAZY_ATTRIBUTES = {"pipeline_setup": "pipeline_builder",
+                    "ModelPipeline": "pipeline",
+                    "NodeProfiler": "profiling",
+                    "run_sweep": "sweep",
+                    "ScenarioService": "service",
+                    "serve_http": "service",
+                    "ResultStore": "result_store",
+                    "scenario_key": "result_store",
+                    "WorkerPool": "worker_pool",
+                    "synthetic_datablock": "synthetic",
+                    "synthetic_datablock_regions": "synthetic"}
+
+# Names bound by "from future_food import *": the public names of model, which
+# the package used to import with a star import, and pipeline_setup. They are
+# resolved lazily through __getattr__, and new public names of model must be
+# added here.
+_MODEL_NAMES = ["project_future", "item_scaling_multiple_neutral",
+                "item_scaling_multiple", "item_scaling", "balanced_scaling",
+                "food_waste_model_neutral", "food_waste_model",
+                "add_alternative_items", "alternative_food_model_neutral",
+                "alternative_food_model", "cultured_meat_model",
+                "compute_emissions", "compute_t_anomaly",
+                "forest_land_model_new", "forest_land_model",
+                "peatland_restoration_neutral", "peatland_restoration",
+                "peatland_restoration_steps", "ccs_model",
+                "forest_sequestration_model", "scale_impact_neutral",
+                "scale_impact", "scale_impact_multiple",
+                "scale_production_neutral", "scale_production",
+                "scale_production_steps", "BECCS_farm_land_neutral",
+                "BECCS_farm_land", "BECCS_farm_land_steps",
+                "agroecology_model_neutral", "agroecology_model", "feed_scale",
+                "feed_scale_factors", "check_negative_source", "unit_ratio",
+                "neutral_food_supply", "append_sequestration",
+                "logistic_food_supply", "scale_kcal_feed",
+                "production_land_scale",
+                "managed_agricultural_land_carbon_model_neutral",
+                "managed_agricultural_land_carbon_model",
+                "zero_land_farming_model", "extra_urban_farming_neutral",
+                "extra_urban_farming", "mixed_farming_model_neutral",
+                "mixed_farming_model", "mixed_farming_model_steps",
+                "get_items", "shift_production_neutral", "shift_production",
+                "shift_production_steps", "apply_production_steps",
+                "production_pass", "compute_metrics", "label_new_forest",
+                "generate_API_url", "glossary_dict", "vegetarian_diet_dict",
+                "option_list", "FAOSTAT_percapita_items", "x_axis_title",
+                "land_color_dict", "land_label_dict", "sector_emissions_dict",
+                "sector_emissions_colors", "logistic_scale", "linear_scale",
+                "FoodBalanceSheet"]
+__all__ = _MODEL_NAMES + ["pipeline_setup"]
+
+
+def __getattr__(name):
+    if name.startswith("__"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+
+    # Every other public name is re-exported from model
+    module = importlib.import_module(f".{_LAZY_ATTRIBUTES.get(name, 'model')}", __name__)
+    try:
+        value = getattr(module, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_LAZY_SUBMODULES) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,282 @@
+"""Loading of the encrypted data assets packaged with future_food"""
+
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+import numpy as np
+import xarray as xr
+
+import importlib.resources as resources
+
+LAND_ASSET = "UKCEH_LC_target_percentage.bin"
+
+# Environment variable used to enable the decrypted land cover cache when no
+# cache directory is passed explicitly
+CACHE_DIR_ENV = "FUTURE_FOOD_CACHE_DIR"
+
+_HASH_CHUNK = 1 << 20
+_DECRYPT_CHUNK = 1 << 20
+
+
+def asset_path(name=LAND_ASSET):
+    """Returns a traversable path to a packaged data asset"""
+    return resources.files("future_food.data").joinpath(name)
+
+
+def load_land_cover(
+        AES_KEY,
+        AES_IV,
+        cache_dir=None
+        ):
+    """Loads the UKCEH land cover percentage grid.
+
+    The grid is stored encrypted with AES-CBC in the package data. If a cache
+    directory is given, or set via the FUTURE_FOOD_CACHE_DIR environment
+    variable, the decrypted grid is stored there once as a raw .npy array plus
+    a JSON coordinate sidecar, keyed by the SHA-256 hash of the ciphertext.
+    Later calls memory-map the cached array instead of decrypting the asset
+    again, so processes reading the same cache share its pages.
+
+    Parameters
+    ----------
+    AES_KEY : str
+        Base64 encoded AES key.
+    AES_IV : str
+        Base64 encoded AES initialization vector.
+    cache_dir : str, optional
+        Directory used to store the decrypted grid. It is created with
+        owner-only permissions if it does not exist, and must not be
+        accessible by other users if it does. Cached files contain the
+        decrypted data and are only readable by their owner.
+
+    Returns
+    -------
+    land : xarray.DataArray
+        Land cover percentage grid.
+    """
+
+    if cache_dir is None:
+        cache_dir = os.environ.get(CACHE_DIR_ENV)
+
+    if cache_dir is None:
+        return _decrypt_land_cover(AES_KEY, AES_IV)
+
+    _private_dir(cache_dir)
+    digest = _asset_digest(LAND_ASSET)
+    land = _read_cached_grid(cache_dir, digest)
+
+    if land is None:
+        _write_cached_grid(cache_dir, digest, _decrypt_land_cover(AES_KEY, AES_IV))
+        land = _read_cached_grid(cache_dir, digest)
+
+    return land
+
+
+def _decrypt_land_cover(AES_KEY, AES_IV):
+    """Decrypts the land cover asset and parses it into a DataArray.
+
+    The asset is decrypted in fixed size chunks into an in-memory buffer
+    preallocated to the size of the ciphertext, which the netCDF backend then
+    reads in place. The full ciphertext is never held in memory, and the
+    plaintext is never written to disk.
+    """
+
+    with asset_path(LAND_ASSET).open("rb") as src:
+        ciphertext_size = src.seek(0, io.SEEK_END)
+        src.seek(0)
+
+        # The plaintext is at most as long as the ciphertext. The buffer owns
+        # its initial bytes, so writing to it does not copy them.
+        buffer = io.BytesIO(bytes(ciphertext_size))
+        size = decrypt_stream(src, buffer, AES_KEY, AES_IV)
+
+    buffer.truncate(size)
+    buffer.seek(0)
+
+    with xr.open_dataarray(buffer) as LC:
+        LC.load()
+
+    return LC
+
+
+def decrypt_stream(
+        src,
+        dst,
+        AES_KEY,
+        AES_IV,
+        chunk_size=_DECRYPT_CHUNK
+        ):
+    """Decrypts an AES-CBC encrypted, PKCS#7 padded stream in chunks.
+
+    Parameters
+    ----------
+    src : file-like
+        Binary stream with the ciphertext.
+    dst : file-like
+        Binary stream where the plaintext is written.
+    AES_KEY : str
+        Base64 encoded AES key.
+    AES_IV : str
+        Base64 encoded AES initialization vector.
+    chunk_size : int, optional
+        Number of bytes decrypted at a time. Must be a multiple of the AES
+        block size.
+
+    Returns
+    -------
+    size : int
+        Number of plaintext bytes written.
+    """
+
+    from Crypto.Cipher import AES
+    from Crypto.Util.Padding import unpad
+
+    block = AES.block_size
+    if chunk_size % block:
+        raise ValueError(f"chunk_size must be a multiple of {block} bytes")
+
+    cipher = AES.new(base64.b64decode(AES_KEY), AES.MODE_CBC, base64.b64decode(AES_IV))
+
+    # Preallocated input and output buffers, reused for every chunk
+    ciphertext = bytearray(chunk_size)
+    plaintext = bytearray(chunk_size)
+
+    # The last block holds the padding, so it is only written once the end of
+    # the stream is reached
+    last_block = b""
+    size = 0
+
+    while True:
+        n = _read_full(src, ciphertext)
+        if n == 0:
+            break
+        if n % block:
+            raise ValueError("Ciphertext length is not a multiple of the block size")
+
+        out = memoryview(plaintext)[:n]
+        cipher.decrypt(memoryview(ciphertext)[:n], output=out)
+
+        dst.write(last_block)
+        dst.write(out[:-block])
+        size += len(last_block) + n - block
+        last_block = bytes(out[-block:])
+
+    if not last_block:
+        raise ValueError("Empty ciphertext")
+
+    last_block = unpad(last_block, block)
+    dst.write(last_block)
+
+    return size + len(last_block)
+
+
+def _read_full(src, buffer):
+    """Reads from src until buffer is full or the stream ends"""
+
+    view = memoryview(buffer)
+    n = 0
+    while n < len(buffer):
+        read = src.readinto(view[n:])
+        if not read:
+            break
+        n += read
+
+    return n
+
+
+def _asset_digest(name):
+    """Computes the SHA-256 digest of a packaged asset in chunks"""
+
+    digest = hashlib.sha256()
+    with asset_path(name).open("rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _private_dir(path):
+    """Creates a directory only accessible by its owner, or checks that an
+    existing one is"""
+
+    if not os.path.isdir(path):
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        # The mode passed to makedirs is masked by the umask
+        os.chmod(path, 0o700)
+
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise ValueError(f"The cache directory {path} must be owned by the current "
+                         f"user and not accessible by other users")
+
+
+def _grid_paths(cache_dir, digest):
+    base = os.path.join(cache_dir, f"land_cover_{digest}")
+    return base + ".npy", base + ".json"
+
+
+def _read_cached_grid(cache_dir, digest):
+    """Memory-maps a cached land cover grid, or returns None if it is not in
+    the cache"""
+
+    data_path, meta_path = _grid_paths(cache_dir, digest)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    data = np.load(data_path, mmap_mode="r")
+    coords = {name: (coord["dims"], np.asarray(coord["values"], dtype=coord["dtype"]))
+              for name, coord in meta["coords"].items()}
+
+    return xr.DataArray(data,
+                        dims=meta["dims"],
+                        coords=coords,
+                        name=meta["name"],
+                        attrs=meta["attrs"])
+
+
+def _write_cached_grid(cache_dir, digest, land):
+    """Stores a land cover grid in the cache with owner-only permissions"""
+
+    _private_dir(cache_dir)
+    data_path, meta_path = _grid_paths(cache_dir, digest)
+
+    meta = {"name": land.name,
+            "dims": list(land.dims),
+            "attrs": {key: _to_json(value) for key, value in land.attrs.items()},
+            "coords": {name: {"dims": list(coord.dims),
+                              "dtype": coord.dtype.str,
+                              "values": coord.values.tolist()}
+                       for name, coord in land.coords.items()}}
+
+    # Write the array before its sidecar, as the sidecar marks a complete entry
+    _atomic_write(data_path, lambda f: np.save(f, np.ascontiguousarray(land.values)))
+    _atomic_write(meta_path, lambda f: f.write(json.dumps(meta).encode()))
+
+
+def _atomic_write(path, writer):
+    """Writes a file through a private temporary file and moves it in place"""
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            writer(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
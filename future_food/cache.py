@@ -0,0 +1,319 @@
+"""Small in-process caches shared by the datablock and pipeline helpers."""
+
+import hashlib
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+import xarray as xr
+
+# Digests of read-only arrays, keyed by id, so that arrays shared between
+# datablocks are only hashed once
+_array_digests = {}
+_digests_lock = threading.Lock()
+_MEMO_NBYTES = 1 << 16
+
+
+class LRUCache():
+    """Thread safe least-recently-used mapping with a bounded number of
+    entries, and optionally a bounded total size in bytes.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of entries kept in the cache. If None, the number of
+        entries is not bounded.
+    maxbytes : int, optional
+        Maximum total size of the entries, as measured by sizeof. If None, the
+        size of the entries is not bounded. Entries larger than maxbytes are
+        not kept.
+    sizeof : callable, optional
+        Function returning the size of an entry in bytes. Defaults to nbytes.
+    shared : bool, optional
+        If True, the size of the cache is that of the distinct array buffers
+        held by its entries, as returned by array_buffers, so that arrays
+        shared by several entries, such as those of copy-on-write datablocks,
+        are counted once. sizeof is then not used.
+    """
+
+    def __init__(self, maxsize=4, maxbytes=None, sizeof=None, shared=False):
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._buffer_refs = {}
+        self._lock = threading.RLock()
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = nbytes if sizeof is None else sizeof
+        self.shared = shared
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def get(self, key, default=None):
+        """Returns the entry stored under key and marks it as recently used,
+        or default if it is not in the cache."""
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        """Stores value under key, evicting the least recently used entries if
+        the cache is full."""
+        if self.shared:
+            size = array_buffers(value)
+        else:
+            size = self.sizeof(value) if self.maxbytes is not None else 0
+        with self._lock:
+            self._forget(key)
+            self._data[key] = value
+            self._sizes[key] = size
+            self.nbytes += self._count(size, 1)
+            self._evict()
+
+    def pop(self, key, default=None):
+        """Removes and returns the entry stored under key."""
+        with self._lock:
+            value = self._data.get(key, default)
+            self._forget(key)
+            return value
+
+    def clear(self):
+        """Removes all entries from the cache."""
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._buffer_refs.clear()
+            self.nbytes = 0
+
+    def resize(self, maxsize, maxbytes=None):
+        """Sets a new maximum number of entries, and optionally a new maximum
+        total size, evicting entries if needed."""
+        with self._lock:
+            self.maxsize = maxsize
+            if maxbytes is not None:
+                self.maxbytes = maxbytes
+            self._evict()
+
+    def _forget(self, key):
+        if key in self._data:
+            del self._data[key]
+            self.nbytes -= self._count(self._sizes.pop(key), -1)
+
+    def _evict(self):
+        while self._data and (
+                (self.maxsize is not None and len(self._data) > max(self.maxsize, 0))
+                or (self.maxbytes is not None and self.nbytes > self.maxbytes)):
+            self._forget(next(iter(self._data)))
+
+    def _count(self, size, change):
+        """Updates the references to the buffers of an entry, and returns the
+        number of bytes they add to or remove from the cache"""
+
+        if not self.shared:
+            return size
+
+        counted = 0
+        for buffer, buffer_size in size.items():
+            refs = self._buffer_refs.get(buffer, 0) + change
+            if refs == 0 or (refs == 1 and change > 0):
+                counted += buffer_size
+            if refs:
+                self._buffer_refs[buffer] = refs
+            else:
+                del self._buffer_refs[buffer]
+
+        return counted
+
+
+def nbytes(obj):
+    """Returns the approximate size in bytes of the arrays held by an object.
+
+    xarray objects and numpy arrays count the bytes of their data, mappings,
+    lists and tuples the sum of the sizes of their values. Arrays shared by
+    several values are counted once per value.
+    """
+
+    if isinstance(obj, (xr.DataArray, xr.Dataset, np.ndarray)):
+        return int(obj.nbytes)
+    if isinstance(obj, Mapping):
+        return sum(nbytes(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(nbytes(value) for value in obj)
+    return sys.getsizeof(obj)
+
+
+def array_buffers(obj, buffers=None):
+    """Returns the size in bytes of each distinct array buffer held by an
+    object, keyed by the id of the buffer.
+
+    Views of a numpy array count as their base array. Supports the same
+    objects as nbytes. The ids are only valid while the object is alive, as
+    it keeps its buffers alive.
+
+    Parameters
+    ----------
+    obj : object
+        Object holding the arrays.
+
+    Returns
+    -------
+    buffers : dict
+        Size of each buffer, keyed by its id.
+    """
+
+    if buffers is None:
+        buffers = {}
+
+    if isinstance(obj, xr.DataArray):
+        variables = [obj.variable, *obj.coords.variables.values()]
+    elif isinstance(obj, xr.Dataset):
+        variables = obj.variables.values()
+    elif isinstance(obj, xr.Variable):
+        variables = [obj]
+    elif isinstance(obj, np.ndarray):
+        while isinstance(obj.base, np.ndarray):
+            obj = obj.base
+        buffers[id(obj)] = int(obj.nbytes)
+        return buffers
+    elif isinstance(obj, Mapping):
+        for value in obj.values():
+            array_buffers(value, buffers)
+        return buffers
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            array_buffers(value, buffers)
+        return buffers
+    else:
+        return buffers
+
+    for var in variables:
+        if isinstance(var._data, np.ndarray):
+            array_buffers(var._data, buffers)
+        else:
+            buffers[id(var._data)] = int(var.nbytes)
+
+    return buffers
+
+
+def fingerprint(obj):
+    """Returns a digest identifying the contents of an object.
+
+    Supports the contents of datablocks and node parameters: dictionaries and
+    other mappings, lists, tuples, scalars, strings, numpy arrays, xarray
+    objects and functions. Equal contents give equal fingerprints. Other
+    objects are identified by their repr.
+
+    The digests of large read-only arrays, such as those of frozen
+    datablocks, are memoized, as these arrays are assumed not to change.
+    Read-only views of writable memory, whose contents can still change, are
+    hashed every time.
+
+    Parameters
+    ----------
+    obj : object
+        Object to identify.
+
+    Returns
+    -------
+    digest : str
+        Hexadecimal sha256 digest.
+    """
+
+    digest = hashlib.sha256()
+    _update(digest, obj)
+    return digest.hexdigest()
+
+
+def _update(digest, obj):
+    digest.update(type(obj).__name__.encode())
+
+    if isinstance(obj, xr.DataArray):
+        _update(digest, [obj.name, obj.variable, dict(obj.coords.variables)])
+    elif isinstance(obj, xr.Dataset):
+        _update(digest, [dict(obj.variables), list(obj.coords), obj.attrs])
+    elif isinstance(obj, xr.Variable):
+        _update(digest, [obj.dims, obj.values, obj.attrs])
+    elif isinstance(obj, np.ndarray):
+        digest.update(_array_digest(obj).encode())
+    elif isinstance(obj, Mapping):
+        items = sorted(obj.items(), key=lambda item: repr(item[0]))
+        for key, value in items:
+            _update(digest, key)
+            _update(digest, value)
+        digest.update(b"}")
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            _update(digest, value)
+        digest.update(b"]")
+    elif callable(obj) and hasattr(obj, "__qualname__"):
+        digest.update(f"{obj.__module__}.{obj.__qualname__}".encode())
+    else:
+        digest.update(repr(obj).encode())
+
+
+def _array_digest(array):
+    memo = array.nbytes >= _MEMO_NBYTES and _immutable(array)
+    if memo:
+        with _digests_lock:
+            entry = _array_digests.get(id(array))
+        if entry is not None and entry[0]() is array:
+            return entry[1]
+
+    digest = hashlib.sha256(f"{array.dtype.str}{array.shape}".encode())
+    if array.dtype.hasobject:
+        digest.update(repr(array.tolist()).encode())
+    else:
+        digest.update(np.ascontiguousarray(array).data)
+    value = digest.hexdigest()
+
+    if memo:
+        key = id(array)
+        ref = weakref.ref(array, lambda _, key=key: _forget_array(key))
+        with _digests_lock:
+            _array_digests[key] = (ref, value)
+
+    return value
+
+
+def _immutable(array):
+    """Returns True if an array and all the memory it views are read-only"""
+
+    while isinstance(array, np.ndarray):
+        if array.flags.writeable:
+            return False
+        array = array.base
+
+    if array is None:
+        return True
+
+    # Arrays may also view other buffers, such as memory maps
+    try:
+        return memoryview(array).readonly
+    except TypeError:
+        return False
+
+
+def _forget_array(key):
+    with _digests_lock:
+        entry = _array_digests.get(key)
+        if entry is not None and entry[0]() is None:
+            del _array_digests[key]
@@ -1,157 +1,666 @@
 import numpy as np
 import xarray as xr
 import copy
-import base64
-from io import BytesIO
-import base64
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import unpad
+import functools
+import hashlib
+import os
+import threading
+from importlib import metadata
 
 import importlib.resources as resources
 
+from .assets import LAND_ASSET, asset_path, load_land_cover
+from .cache import LRUCache
+from .land_encoding import LAND_PRECISIONS, encode_land
+from .land_layout import LAND_LAYOUTS, pixel_grid, to_pixels
+from .land_totals import class_totals, link_land_section
+from .datablock_utils import (LazySection, freeze_datablock, lazy_view,
+                              materialize, readonly_view)
+from .snapshot import read_snapshot, write_snapshot
+
+# ----------------------
+# Regional configuration
+# ----------------------
+
+AREA_POP = 826 #UK
+# AREA_POP = 900 # WORLD
+AREA_POP_WORLD = 900 #WORLD
+
+AREA_FAO = 229 #UK
+# AREA_FAO = 5000 # WORLD
+
+# Process-wide cache of baseline datablocks. Entries are frozen, and every
+# datablock_setup call with cache=True returns a new read-only view of them.
+datablock_cache = LRUCache(maxsize=4)
+_cache_lock = threading.Lock()
+
+
 def datablock_setup(
         AES_KEY,
         AES_IV,
-        advanced_settings = {}
+        advanced_settings = {},
+        cache=False,
+        land_cache_dir=None,
+        lazy=False,
+        snapshot=None,
+        land_precision="float64",
+        land_layout="grid"
         ):
 
     """
     This function sets up the datablock for the Agrifood Calculator.
 
     It loads the data from the agrifoodpy_data package and returns a datablock
-    type dictionary with all the necessary data. This function is cached to
-    improve performance and avoid re-running the function if the data has not
-    changed. It takes a single argument, population_projection, which is a
-    string that specifies the population projection to use.
+    type dictionary with all the necessary data. The advanced_settings
+    dictionary is stored in the datablock, and its "pop_proj" entry sets the
+    population projection to use.
+
+    By default every call builds a new datablock, whose arrays can be modified
+    in place. If cache is True, the baseline datablock is instead memoized in
+    a process-wide LRU cache keyed on the population projection, the region
+    codes and a fingerprint of the data assets. Repeated calls then return a
+    new datablock whose dictionaries can be freely modified, but whose arrays
+    are read-only views shared with every other datablock built from the same
+    cache entry, so entries must be replaced instead of modified in place.
+    Use clear_datablock_cache to invalidate the cache.
+
+    land_cache_dir optionally sets a directory where the decrypted land cover
+    grid is stored once and memory-mapped on later cold starts. See
+    future_food.assets.load_land_cover.
+
+    If lazy is True, the "food", "impact", "population" and "land" sections
+    are returned as LazySection mappings, and each group of entries is only
+    loaded when one of its keys is first read.
+
+    If snapshot is the path to a file written by build_snapshot, the baseline
+    is memory-mapped from it instead of being built from the data packages.
+    Arrays loaded from a snapshot are always read-only. The snapshot must have
+    been built for the same population projection, regions, land precision
+    and layout, and from the installed versions of agrifoodpy_data and the
+    land cover asset.
+
+    land_precision sets how the land use grids are stored: "float64",
+    "float32", or "uint16" fixed-point percentages. The grids which the model
+    nodes compute from uint16 baselines are stored in float32. See
+    future_food.land_encoding.
+
+    land_layout sets the layout of the land use grids. The default "grid"
+    layout keeps the (aggregate_class, y, x) grid. The "pixel" layout only
+    stores pixels with data, as an (aggregate_class, pixel) array, and adds a
+    "pixel_grid" entry to the land section with the position of each pixel.
+    Use future_food.land_layout.land_grid to rebuild the full grid, and
+    to_pixels to convert mask maps added to the land section.
     """
 
-    from agrifoodpy_data.food import FAOSTAT, Nutrients_FAOSTAT
-    from agrifoodpy_data.impact import UKNDC_FAOSTAT
-    from agrifoodpy_data.population import UN
+    population_projection = advanced_settings["pop_proj"]
+
+    if snapshot is not None:
+        return _snapshot_datablock(snapshot, advanced_settings, cache, lazy,
+                                   land_precision, land_layout)
+
+    if not cache:
+        loader = _BaselineLoader(AES_KEY, AES_IV, population_projection, land_cache_dir,
+                                 land_precision=land_precision,
+                                 land_layout=land_layout)
+        datablock = _lazy_datablock(loader)
+        if not lazy:
+            datablock = materialize(datablock)
+        datablock["advanced_settings"] = advanced_settings
+        return datablock
+
+    key = _cache_key(AES_KEY, AES_IV, population_projection, land_precision, land_layout)
+
+    baseline = datablock_cache.get(key)
+    if baseline is None:
+        with _cache_lock:
+            # Another thread may have built the entry while we were waiting
+            baseline = datablock_cache.get(key)
+            if baseline is None:
+                loader = _BaselineLoader(AES_KEY, AES_IV, population_projection, land_cache_dir,
+                                         land_precision=land_precision,
+                                         land_layout=land_layout)
+                baseline = _lazy_datablock(loader, freeze=True)
+                datablock_cache.put(key, baseline)
+
+    if lazy:
+        datablock = lazy_view(baseline)
+    else:
+        datablock = readonly_view(baseline)
+    datablock["advanced_settings"] = advanced_settings
 
-    datablock = {}
-    datablock["food"] = {}
-    datablock["land"] = {}
-    datablock["impact"] = {}
-    datablock["population"] = {}
+    return datablock
 
+
+def datablock_setup_regions(
+        AES_KEY,
+        AES_IV,
+        regions,
+        advanced_settings = {},
+        land_cache_dir=None,
+        lazy=False,
+        land_precision="float64",
+        land_layout="grid"
+        ):
+    """Sets up one datablock per region, loading the source tables once.
+
+    The population, food balance and nutrient tables are read once from
+    agrifoodpy_data and every requested region is selected from them in a
+    single pass. The land cover grid and the emission factors are UK data, and
+    are the same for every region. The land cover asset is only decrypted
+    once.
+
+    Parameters
+    ----------
+    AES_KEY : str
+        Base64 encoded AES key for the land cover asset.
+    AES_IV : str
+        Base64 encoded AES initialization vector for the land cover asset.
+    regions : list of tuple
+        List of (population region, FAOSTAT region) code pairs, for example
+        [(826, 229)] for the UK.
+    advanced_settings : dict
+        Advanced settings stored in every datablock. Its "pop_proj" entry sets
+        the population projection to use.
+    land_cache_dir : str, optional
+        Directory for the decrypted land cover cache.
+    lazy : bool, optional
+        If True, the datablock sections are LazySection mappings.
+    land_precision : str, optional
+        Storage precision of the land use grids.
+    land_layout : str, optional
+        Layout of the land use grids, "grid" or "pixel".
+
+    Returns
+    -------
+    datablocks : dict
+        Dictionary mapping each region code pair to its datablock.
+    """
+
+    population_projection = advanced_settings["pop_proj"]
+    regions = [tuple(region) for region in regions]
+
+    sources = _SourceTables(AES_KEY, AES_IV, population_projection,
+                            pop_regions=[area_pop for area_pop, _ in regions] + [AREA_POP_WORLD],
+                            fao_regions=[area_fao for _, area_fao in regions],
+                            land_cache_dir=land_cache_dir,
+                            land_users=len(set(regions)))
+
+    datablocks = {}
+    for area_pop, area_fao in regions:
+        if (area_pop, area_fao) in datablocks:
+            continue
+        loader = _BaselineLoader(AES_KEY, AES_IV, population_projection, land_cache_dir,
+                                 area_pop=area_pop, area_fao=area_fao, sources=sources,
+                                 land_precision=land_precision,
+                                 land_layout=land_layout)
+        datablock = _lazy_datablock(loader)
+        if not lazy:
+            datablock = materialize(datablock)
+        datablock["advanced_settings"] = advanced_settings
+        datablocks[(area_pop, area_fao)] = datablock
+
+    return datablocks
+
+
+def build_snapshot(
+        path,
+        AES_KEY,
+        AES_IV,
+        advanced_settings = {},
+        land_cache_dir=None,
+        land_precision="float64",
+        land_layout="grid"
+        ):
+    """Builds the baseline datablock and stores it in a snapshot file.
+
+    The snapshot can then be passed to datablock_setup to start without
+    importing agrifoodpy_data or decrypting the land cover asset. It contains
+    the decrypted land cover data, and is written with owner-only permissions.
+
+    Parameters
+    ----------
+    path : str
+        Path of the snapshot file.
+    AES_KEY : str
+        Base64 encoded AES key for the land cover asset.
+    AES_IV : str
+        Base64 encoded AES initialization vector for the land cover asset.
+    advanced_settings : dict
+        Advanced settings, whose "pop_proj" entry sets the population
+        projection to use.
+    land_cache_dir : str, optional
+        Directory for the decrypted land cover cache.
+    land_precision : str, optional
+        Storage precision of the land use grids.
+    land_layout : str, optional
+        Layout of the land use grids, "grid" or "pixel".
+    """
+
+    population_projection = advanced_settings["pop_proj"]
+    loader = _BaselineLoader(AES_KEY, AES_IV, population_projection, land_cache_dir,
+                             land_precision=land_precision,
+                             land_layout=land_layout)
+    datablock = materialize(_lazy_datablock(loader))
+
+    metadata = _snapshot_metadata(population_projection, land_precision, land_layout)
+
+    write_snapshot(path, datablock, metadata=metadata)
+
+
+def _snapshot_metadata(population_projection, land_precision, land_layout):
+    """Returns the settings and asset versions a snapshot is built with, which
+    must match those of the datablock requested from it"""
+    return {"pop_proj": population_projection,
+            "regions": [AREA_POP, AREA_POP_WORLD, AREA_FAO],
+            "land_precision": land_precision,
+            "land_layout": land_layout,
+            "asset_fingerprint": list(_asset_fingerprint())}
+
+
+def _snapshot_datablock(
+        path,
+        advanced_settings,
+        cache,
+        lazy,
+        land_precision,
+        land_layout
+        ):
+    """Returns a datablock view of the baseline stored in a snapshot file"""
+
+    stat = os.stat(path)
+    key = ("snapshot", os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+    entry = datablock_cache.get(key) if cache else None
+    if entry is None:
+        entry = read_snapshot(path)
+        link_land_section(entry[0]["land"])
+        if cache:
+            datablock_cache.put(key, entry)
+    baseline, metadata = entry
+
+    # Snapshots without land settings store float64 grids
+    metadata = {"land_precision": "float64", "land_layout": "grid", **metadata}
+
+    expected = _snapshot_metadata(advanced_settings["pop_proj"], land_precision, land_layout)
+    for name in expected:
+        if metadata.get(name) != expected[name]:
+            raise ValueError(f"Snapshot {path} was built with {name}={metadata.get(name)!r}, "
+                             f"but {expected[name]!r} was requested")
+
+    if lazy:
+        datablock = lazy_view(baseline)
+    else:
+        datablock = readonly_view(baseline)
     datablock["advanced_settings"] = advanced_settings
 
-    # ----------------------
-    # Regional configuration
-    # ----------------------
+    return datablock
+
+
+def clear_datablock_cache():
+    """Removes all the memoized baseline datablocks"""
+    datablock_cache.clear()
+
+
+def _asset_fingerprint():
+    """Returns a tuple identifying the current version of the data assets"""
+
+    try:
+        data_version = metadata.version("agrifoodpy_data")
+    except metadata.PackageNotFoundError:
+        data_version = None
+
+    with resources.as_file(asset_path(LAND_ASSET)) as path:
+        stat = os.stat(path)
+
+    return (data_version, stat.st_size, stat.st_mtime_ns)
+
+
+def _cache_key(
+        AES_KEY,
+        AES_IV,
+        population_projection,
+        land_precision="float64",
+        land_layout="grid"
+        ):
+    """Builds the datablock cache key from the inputs that change its contents"""
+
+    # Store a digest of the secrets rather than the secrets themselves
+    secret = hashlib.sha256(f"{AES_KEY}:{AES_IV}".encode()).hexdigest()
+
+    return (population_projection,
+            AREA_POP,
+            AREA_POP_WORLD,
+            AREA_FAO,
+            land_precision,
+            land_layout,
+            _asset_fingerprint(),
+            secret)
+
+
+def _lazy_datablock(loader, freeze=False):
+    """Builds the baseline datablock with one LazySection per section, whose
+    entries are loaded by a _BaselineLoader.
+
+    If freeze is True, the arrays returned by each loader are made read-only
+    as soon as they are loaded.
+    """
+
+    def section(groups):
+        loaders = {}
+        for keys, name in groups:
+            load = functools.partial(loader.group, name)
+            if freeze:
+                load = _frozen(load)
+            loaders.update({key: load for key in keys})
+        return LazySection(loaders=loaders)
+
+    datablock = {}
+    datablock["food"] = section([
+        (["1000 T/year", "g/cap/day"], "food_supply"),
+        (["kCal/g_food", "g_prot/g_food", "g_fat/g_food"], "nutrient_factors"),
+        (["kCal/cap/day", "g_prot/cap/day", "g_fat/cap/day", "g_co2e/cap/day"], "per_capita"),
+        (["baseline"], "food_baseline"),
+        ])
+    land_keys = ["percentage_land_use", "baseline",
+                 "class_totals", "baseline_class_totals"]
+    if loader.land_layout == "pixel":
+        land_keys.append("pixel_grid")
+    datablock["land"] = section([
+        (land_keys, "land"),
+        ])
+    datablock["impact"] = section([
+        (["gco2e/gfood", "gco2e/gfood_land"], "emission_factors"),
+        ])
+    datablock["population"] = section([
+        (["population"], "population"),
+        ])
+
+    return datablock
+
+
+def _frozen(load):
+    return lambda: freeze_datablock(load())
+
+
+class _SourceTables():
+    """Source tables from agrifoodpy_data and the packaged assets, restricted
+    to a set of regions.
+
+    Each table is read once, on first use, and the requested regions are
+    selected from it in a single pass. Loaders then select their own region
+    from these smaller tables.
+
+    The land cover grid is decrypted once and handed to land_users loaders.
+    Every loader but the last one gets its own copy of the grid.
+    """
+
+    def __init__(
+            self,
+            AES_KEY,
+            AES_IV,
+            population_projection,
+            pop_regions,
+            fao_regions,
+            land_cache_dir=None,
+            land_users=1
+            ):
+        self.AES_KEY = AES_KEY
+        self.AES_IV = AES_IV
+        self.population_projection = population_projection
+        self.pop_regions = list(dict.fromkeys(pop_regions))
+        self.fao_regions = list(dict.fromkeys(fao_regions))
+        self.land_cache_dir = land_cache_dir
+        self.land_users = land_users
+        self.years = np.arange(2020, 2051)
+        self._tables = {}
+        self._lock = threading.RLock()
+
+    def _table(self, name, load):
+        with self._lock:
+            if name not in self._tables:
+                self._tables[name] = load()
+            return self._tables[name]
+
+    def UN(self):
+        """UN population projections, in thousands of people"""
+
+        def load():
+            from agrifoodpy_data.population import UN
+            projections = list(dict.fromkeys(["Medium", self.population_projection]))
+            return UN[projections].sel(Region=self.pop_regions, Year=self.years, Datatype="Total")
+
+        return self._table("UN", load)
+
+    def FAOSTAT(self):
+        """FAOSTAT food balance sheets for 2020"""
+
+        def load():
+            from agrifoodpy_data.food import FAOSTAT
+            return FAOSTAT.sel(Region=self.fao_regions, Year=[2020])
+
+        return self._table("FAOSTAT", load)
+
+    def Nutrients_FAOSTAT(self):
+        """FAOSTAT nutrient contents for 2020"""
+
+        def load():
+            from agrifoodpy_data.food import Nutrients_FAOSTAT
+            return Nutrients_FAOSTAT[["kcal", "protein", "fat"]].sel(Region=self.fao_regions, Year=2020)
+
+        return self._table("Nutrients_FAOSTAT", load)
+
+    def land_cover(self):
+        """Land cover percentage grid"""
+
+        with self._lock:
+            LC = self._table("land_cover", lambda: load_land_cover(
+                self.AES_KEY, self.AES_IV, cache_dir=self.land_cache_dir))
+            self.land_users -= 1
+            if self.land_users > 0:
+                return copy.deepcopy(LC)
+            # Hand the grid itself to the last user
+            return self._tables.pop("land_cover")
+
+
+class _BaselineLoader():
+    """Loads the groups of entries of the baseline datablock from the data
+    packages and assets.
+
+    Each group is computed once by the method of the same name. Groups which
+    depend on others read them through group, so they are always computed
+    from the baseline values even if the datablock has been modified.
+
+    The source tables are read through a _SourceTables object, which can be
+    shared between the loaders of several regions.
+    """
+
+    def __init__(
+            self,
+            AES_KEY,
+            AES_IV,
+            population_projection,
+            land_cache_dir=None,
+            area_pop=AREA_POP,
+            area_fao=AREA_FAO,
+            sources=None,
+            land_precision="float64",
+            land_layout="grid"
+            ):
+        if land_precision not in LAND_PRECISIONS:
+            raise ValueError(f"Unknown land precision {land_precision!r}, "
+                             f"must be one of {LAND_PRECISIONS}")
+        if land_layout not in LAND_LAYOUTS:
+            raise ValueError(f"Unknown land layout {land_layout!r}, "
+                             f"must be one of {LAND_LAYOUTS}")
+
+        self.population_projection = population_projection
+        self.land_precision = land_precision
+        self.land_layout = land_layout
+        self.area_pop = area_pop
+        self.area_pop_world = AREA_POP_WORLD
+        self.area_fao = area_fao
+        self.years = np.arange(2020, 2051)
+        if sources is None:
+            sources = _SourceTables(AES_KEY, AES_IV, population_projection,
+                                    pop_regions=[area_pop, AREA_POP_WORLD],
+                                    fao_regions=[area_fao],
+                                    land_cache_dir=land_cache_dir)
+        self.sources = sources
+        self._pop_medium = None
+        self._groups = {}
+        self._lock = threading.RLock()
+
+    def group(self, name):
+        """Returns the dictionary of entries of a group, loading it if needed"""
+
+        with self._lock:
+            if name not in self._groups:
+                self._groups[name] = getattr(self, name)()
+            return self._groups[name]
+
+    def pop_medium(self):
+        """UN medium population projection, used to fill missing years and
+        compute per capita values"""
+
+        if self._pop_medium is None:
+            UN = self.sources.UN()
+            self._pop_medium = UN.Medium.sel(Region=[self.area_pop, self.area_pop_world], Year=self.years)*1000
+        return self._pop_medium
+
+    def population(self):
+
+        # ------------------------------
+        # Select population data from UN
+        # ------------------------------
+
+        UN = self.sources.UN()
+
+        years = self.years
+
+        pop = self.pop_medium()
+        # pop_proj = UN[st.session_state["population_projection"]].sel(Region=[area_pop, area_pop_world], Year=years, Datatype="Total")*1000
+        pop_proj = UN[self.population_projection].sel(Region=[self.area_pop, self.area_pop_world], Year=years)*1000
+
+        years_with_data = pop_proj.where(np.isfinite(pop_proj), drop=True).Year.values
+        years_to_fill = np.setdiff1d(years, years_with_data)
+
+        pop_proj.loc[{"Year":years_to_fill}] = pop.sel(Year=years_to_fill)
+
+        return {"population": pop_proj}
+
+    def food_supply(self):
+
+        # -----------------------------------------
+        # Select food consumption data from FAOSTAT
+        # -----------------------------------------
+
+        FAOSTAT = self.sources.FAOSTAT()
+
+        # FAOSTAT *= 1
+        # 1000 T / year
+        food_uk = FAOSTAT.sel(Region=self.area_fao, Year=2020).expand_dims("Year")
 
-    area_pop = 826 #UK
-    # area_pop = 900 # WORLD
-    area_pop_world = 900 #WORLD
+        # Delete summary items
+        food_uk = food_uk.drop_sel(Item=[2905, 2943, 2924,
+                                        2946, 2961, 2960,
+                                        2919, 2945, 2913,
+                                        2911, 2923, 2907,
+                                        2918, 2914, 2912,
+                                        2908, 2909, 2922,
+                                        2941, 2903])
 
-    area_fao = 229 #UK
-    # area_fao = 5000 # WORLD
-    years = np.arange(2020, 2051)
+        # --------------------------
+        # UK Per capita daily values
+        # --------------------------
 
-    # ------------------------------
-    # Select population data from UN
-    # ------------------------------
+        # g_food / cap / day
+        pop_past_uk = self.pop_medium().sel(Year=2020, Region=self.area_pop)
+        food_cap_day_baseline = food_uk*1e9/pop_past_uk/365.25
 
-    population_projection = datablock["advanced_settings"]["pop_proj"]
+        return {"1000 T/year": food_uk,
+                "g/cap/day": food_cap_day_baseline}
 
-    pop = UN.Medium.sel(Region=[area_pop, area_pop_world], Year=years, Datatype="Total")*1000
-    # pop_proj = UN[st.session_state["population_projection"]].sel(Region=[area_pop, area_pop_world], Year=years, Datatype="Total")*1000
-    pop_proj = UN[population_projection].sel(Region=[area_pop, area_pop_world], Year=years, Datatype="Total")*1000
+    def emission_factors(self):
 
-    years_with_data = pop_proj.where(np.isfinite(pop_proj), drop=True).Year.values
-    years_to_fill = np.setdiff1d(years, years_with_data)
-    
-    pop_proj.loc[{"Year":years_to_fill}] = pop.sel(Year=years_to_fill)
+        # ----------------
+        # Emission factors
+        # ----------------
 
-    datablock["population"]["population"] = pop_proj
+        from agrifoodpy_data.impact import UKNDC_FAOSTAT
 
-    # -----------------------------------------
-    # Select food consumption data from FAOSTAT
-    # -----------------------------------------
+        # These are UK values for the entire population and year
+        scale_ones = xr.DataArray(data = np.ones_like([2020]),
+                            coords = {"Year":[2020]})
 
-    # FAOSTAT *= 1
-    # 1000 T / year
-    food_uk = FAOSTAT.sel(Region=229, Year=2020).expand_dims("Year")
+        extended_impact = UKNDC_FAOSTAT["NDC_emissions_agriculture"].drop_vars(["Item_name", "Item_group", "Item_origin"]) * scale_ones
+        land_use_food_impact  = UKNDC_FAOSTAT["NDC_emissions_land_use"].drop_vars(["Item_name", "Item_group", "Item_origin"]) * scale_ones
 
-    # Delete summary items
-    food_uk = food_uk.drop_sel(Item=[2905, 2943, 2924,
-                                    2946, 2961, 2960,
-                                    2919, 2945, 2913,
-                                    2911, 2923, 2907,
-                                    2918, 2914, 2912,
-                                    2908, 2909, 2922,
-                                    2941, 2903])
+        # datablock["impact"]["g_co2e/year"] = fbs_impacts(food_uk, datablock["impact"]["gco2e/gfood"])
 
-    datablock["food"]["1000 T/year"] = food_uk
+        return {"gco2e/gfood": extended_impact,
+                "gco2e/gfood_land": land_use_food_impact}
 
+    def nutrient_factors(self):
 
-    # ----------------
-    # Emission factors
-    # ----------------
-    # These are UK values for the entire population and year
-    scale_ones = xr.DataArray(data = np.ones_like(food_uk.Year.values),
-                        coords = {"Year":food_uk.Year.values})
+        Nutrients_FAOSTAT = self.sources.Nutrients_FAOSTAT()
 
-    extended_impact = UKNDC_FAOSTAT["NDC_emissions_agriculture"].drop_vars(["Item_name", "Item_group", "Item_origin"]) * scale_ones
-    land_use_food_impact  = UKNDC_FAOSTAT["NDC_emissions_land_use"].drop_vars(["Item_name", "Item_group", "Item_origin"]) * scale_ones
+        # kCal, g_prot, g_fat / g_food
+        qty_g = Nutrients_FAOSTAT.sel(Region=self.area_fao)
+        qty_g = qty_g.where(np.isfinite(qty_g), other=0)
 
-    datablock["impact"]["gco2e/gfood"] = extended_impact
-    datablock["impact"]["gco2e/gfood_land"] = land_use_food_impact
+        return {"kCal/g_food": qty_g["kcal"],
+                "g_prot/g_food": qty_g["protein"],
+                "g_fat/g_food": qty_g["fat"]}
 
-    # datablock["impact"]["g_co2e/year"] = fbs_impacts(food_uk, datablock["impact"]["gco2e/gfood"])
+    def per_capita(self):
 
-    # --------------------------
-    # UK Per capita daily values
-    # --------------------------
+        food_cap_day_baseline = self.group("food_supply")["g/cap/day"]
+        nutrients = self.group("nutrient_factors")
+        impacts = self.group("emission_factors")
 
-    # g_food / cap / day
-    pop_past_uk = pop.sel(Year=2020, Region=area_pop)
-    food_cap_day_baseline = food_uk*1e9/pop_past_uk/365.25
+        # kCal, g_prot, g_fat, g_co2e / cap / day
+        kcal_cap_day_baseline = food_cap_day_baseline * nutrients["kCal/g_food"]
+        prot_cap_day_baseline = food_cap_day_baseline * nutrients["g_prot/g_food"]
+        fats_cap_day_baseline = food_cap_day_baseline * nutrients["g_fat/g_food"]
+        co2e_cap_day_baseline = food_cap_day_baseline * impacts["gco2e/gfood"]
 
-    datablock["food"]["g/cap/day"] = food_cap_day_baseline
+        return {"kCal/cap/day": kcal_cap_day_baseline,
+                "g_prot/cap/day": prot_cap_day_baseline,
+                "g_fat/cap/day": fats_cap_day_baseline,
+                "g_co2e/cap/day": co2e_cap_day_baseline}
 
-    # kCal, g_prot, g_fat / g_food
-    qty_g = Nutrients_FAOSTAT[["kcal", "protein", "fat"]].sel(Region=area_fao, Year=2020)
-    qty_g = qty_g.where(np.isfinite(qty_g), other=0)
+    def food_baseline(self):
 
-    datablock["food"]["kCal/g_food"] = qty_g["kcal"]
-    datablock["food"]["g_prot/g_food"] = qty_g["protein"]
-    datablock["food"]["g_fat/g_food"] = qty_g["fat"]
+        # -------------------------------
+        # Baseline data for comparison
+        # -------------------------------
 
-    # kCal, g_prot, g_fat, g_co2e / cap / day
-    kcal_cap_day_baseline = food_cap_day_baseline * datablock["food"]["kCal/g_food"]
-    prot_cap_day_baseline = food_cap_day_baseline * datablock["food"]["g_prot/g_food"]
-    fats_cap_day_baseline = food_cap_day_baseline * datablock["food"]["g_fat/g_food"]
-    co2e_cap_day_baseline = food_cap_day_baseline * datablock["impact"]["gco2e/gfood"]
+        return {"baseline": copy.deepcopy(self.group("food_supply")["g/cap/day"])}
 
-    datablock["food"]["kCal/cap/day"] = kcal_cap_day_baseline
-    datablock["food"]["g_prot/cap/day"] = prot_cap_day_baseline
-    datablock["food"]["g_fat/cap/day"] = fats_cap_day_baseline
-    datablock["food"]["g_co2e/cap/day"] = co2e_cap_day_baseline
+    def land(self):
 
-    # -------------------------------
-    # Land use data
-    # -------------------------------
+        # -------------------------------
+        # Land use data
+        # -------------------------------
 
-    # Get AES key & IV from secrets
-    AES_KEY = base64.b64decode(AES_KEY)
-    AES_IV = base64.b64decode(AES_IV)
-    with resources.files("future_food.data").joinpath("UKCEH_LC_target_percentage.bin").open("rb") as f:
-        encrypted_data = f.read()
+        LC = self.sources.land_cover()
 
-    # Decrypt the dataset
-    cipher = AES.new(AES_KEY, AES.MODE_CBC, AES_IV)
-    decrypted_data = unpad(cipher.decrypt(encrypted_data), AES.block_size)
-    LC = xr.open_dataarray(BytesIO(decrypted_data))
+        land = {}
+        if self.land_layout == "pixel":
+            land["pixel_grid"] = pixel_grid(LC)
+            LC = to_pixels(LC, land["pixel_grid"])
 
-    datablock["land"]["percentage_land_use"] = LC
+        totals = class_totals(LC)
+        LC = encode_land(LC, self.land_precision)
 
-    # -------------------------------
-    # Baseline data for comparison
-    # -------------------------------
+        # -------------------------------
+        # Baseline data for comparison
+        # -------------------------------
 
-    datablock["land"]["baseline"] = copy.deepcopy(datablock["land"]["percentage_land_use"])
-    datablock["food"]["baseline"] = copy.deepcopy(datablock["food"]["g/cap/day"])
+        land["percentage_land_use"] = LC
+        land["class_totals"] = totals
+        land["baseline"] = copy.deepcopy(LC)
+        land["baseline_class_totals"] = totals.copy()
+        link_land_section(land)
 
-    return datablock
\ No newline at end of file
+        return land
@@ -0,0 +1,248 @@
+"""Utilities to share datablock contents between model runs"""
+
+import copy
+import threading
+from collections.abc import MutableMapping
+
+import xarray as xr
+import numpy as np
+
+
+class LazySection(MutableMapping):
+    """Datablock section whose entries are loaded on first access.
+
+    Behaves like the dictionaries used for datablock sections. Entries are
+    either stored values or pending loaders. A loader is a callable with no
+    arguments which returns a dictionary of entries, so that a single loader
+    can fill several related keys at once. Reading any of these keys runs the
+    loader and stores all the entries it returns.
+
+    Membership tests, iteration over keys and len do not trigger any loading,
+    while reading values does.
+
+    Parameters
+    ----------
+    loaders : dict, optional
+        Dictionary mapping each key to the loader that provides it.
+    data : dict, optional
+        Entries which are already loaded.
+    """
+
+    def __init__(self, loaders=None, data=None):
+        self._entries = {}
+        self._lock = threading.RLock()
+        if loaders is not None:
+            self._entries.update({key: _Pending(loader) for key, loader in loaders.items()})
+        if data is not None:
+            self._entries.update(data)
+
+    def __getitem__(self, key):
+        value = self._entries[key]
+        if isinstance(value, _Pending):
+            self._load(value.loader)
+            value = self._entries[key]
+        return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._entries[key]
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __repr__(self):
+        entries = ", ".join(f"{key!r}: {'...' if isinstance(value, _Pending) else type(value).__name__}"
+                            for key, value in list(self._entries.items()))
+        return f"LazySection({{{entries}}})"
+
+    def __deepcopy__(self, memo):
+        with self._lock:
+            out = LazySection()
+            out._entries = {key: value if isinstance(value, _Pending) else copy.deepcopy(value, memo)
+                            for key, value in self._entries.items()}
+            return out
+
+    def is_loaded(self, key):
+        """Returns True if key is stored and does not need loading"""
+        return not isinstance(self._entries[key], _Pending)
+
+    def _load(self, loader):
+        with self._lock:
+            pending = [key for key, value in self._entries.items()
+                       if isinstance(value, _Pending) and value.loader is loader]
+            # The entries may have been loaded by another thread
+            if not pending:
+                return
+            values = loader()
+            for key in pending:
+                self._entries[key] = values[key]
+
+
+class _Pending():
+    """Placeholder for an entry that has not been loaded yet"""
+
+    __slots__ = ("loader",)
+
+    def __init__(self, loader):
+        self.loader = loader
+
+
+def _is_section(value):
+    """Datablock sections are dictionaries or lazy sections. Note xarray
+    Datasets are mappings too, so these cannot be checked with Mapping."""
+    return isinstance(value, (dict, LazySection))
+
+
+def materialize(datablock):
+    """Loads every pending entry of a datablock, replacing lazy sections by
+    plain dictionaries"""
+
+    return {key: materialize(value) if _is_section(value) else value
+            for key, value in datablock.items()}
+
+
+def freeze(obj):
+    """Marks the numpy buffers of an xarray object as read-only.
+
+    Any attempt to modify the frozen arrays in place raises a ValueError, which
+    makes it safe to share them between datablocks. Arrays which are views of
+    other arrays are frozen along with the arrays they view, so that their
+    contents cannot change through them either.
+
+    Parameters
+    ----------
+    obj : xarray.DataArray, xarray.Dataset or numpy.ndarray
+        Object to freeze. Other types are returned unchanged.
+
+    Returns
+    -------
+    obj : same type as input
+        The same object, with read-only buffers.
+    """
+
+    if isinstance(obj, xr.DataArray):
+        variables = [obj.variable] + list(obj.coords.variables.values())
+    elif isinstance(obj, xr.Dataset):
+        variables = obj.variables.values()
+    elif isinstance(obj, np.ndarray):
+        _freeze_array(obj)
+        return obj
+    else:
+        return obj
+
+    for var in variables:
+        if isinstance(var._data, np.ndarray):
+            _freeze_array(var._data)
+
+    return obj
+
+
+def _freeze_array(array):
+    while isinstance(array, np.ndarray):
+        array.flags.writeable = False
+        array = array.base
+
+
+def freeze_datablock(datablock):
+    """Recursively freezes every xarray object in a datablock"""
+
+    for value in datablock.values():
+        if _is_section(value):
+            freeze_datablock(value)
+        else:
+            freeze(value)
+
+    return datablock
+
+
+def readonly_view(datablock):
+    """Returns a new datablock sharing the arrays of a frozen datablock.
+
+    The nested dictionaries are new objects, so model nodes can add or replace
+    entries freely, while the xarray objects are shallow copies pointing to the
+    same read-only buffers as the input datablock.
+
+    Parameters
+    ----------
+    datablock : dict
+        Datablock previously frozen with freeze_datablock.
+
+    Returns
+    -------
+    view : dict
+        New datablock with shared, read-only data.
+    """
+
+    view = {}
+    for key, value in datablock.items():
+        if _is_section(value):
+            view[key] = readonly_view(value)
+        elif isinstance(value, (xr.DataArray, xr.Dataset)):
+            view[key] = value.copy(deep=False)
+        else:
+            view[key] = value
+
+    return view
+
+
+def copy_datablock(datablock):
+    """Returns a copy-on-write copy of a datablock.
+
+    The arrays of the input datablock are frozen and shared with the returned
+    copy, so no data is duplicated. Model nodes store their results as new
+    arrays, which only replaces the entries of the datablock they run on.
+    Writing into a shared array in place raises a ValueError instead of
+    modifying both datablocks, so code which needs to do so must write to a
+    copy of the entry, made with .copy(deep=True), and store it back.
+
+    Pending entries of lazy sections are loaded first.
+
+    Parameters
+    ----------
+    datablock : dict
+        Datablock to copy. Its arrays are made read-only.
+
+    Returns
+    -------
+    copy : dict
+        New datablock sharing the arrays of the input datablock.
+    """
+
+    return readonly_view(freeze_datablock(datablock))
+
+
+def lazy_view(datablock):
+    """Returns a lazy datablock sharing the arrays of a frozen datablock.
+
+    Like readonly_view, but entries of the input datablock are only loaded and
+    shared when they are first read from the returned datablock.
+    """
+
+    view = {}
+    for key, value in datablock.items():
+        if _is_section(value):
+            view[key] = LazySection(loaders={name: _shared_loader(value, name)
+                                             for name in value})
+        else:
+            view[key] = value
+
+    return view
+
+
+def _shared_loader(section, name):
+    def loader():
+        value = section[name]
+        if isinstance(value, (xr.DataArray, xr.Dataset)):
+            value = value.copy(deep=False)
+        return {name: value}
+    return loader
@@ -0,0 +1,110 @@
+"""Fusion of consecutive pipeline nodes.
+
+pipeline_setup adds some nodes several times in a row, such as the
+scale_impact nodes of the livestock sliders, and each of them copies and
+updates the same datablock entry. fuse_nodes compiles the node list of a
+pipeline before it runs, replacing each run of consecutive nodes of a function
+listed in FUSED_NODES by a single node which gives the same result with one
+copy of the entry.
+
+Runs of nodes scaling the food production, listed in PRODUCTION_STEPS, are
+replaced by a production_pass node, which applies the production scaling steps
+of all of them to the food balance sheet in a single pass. Nodes which do not
+read or write the food balance sheet, such as the land carbon nodes, may come
+between them and are run by the production_pass node in their place.
+"""
+
+from .model import (PRODUCTION_STEPS, production_pass, scale_impact,
+                    scale_impact_multiple)
+from .node_io import is_declared, node_defaults, node_reads, node_writes, overlaps
+
+# Functions whose consecutive nodes can be merged, mapped to the function of
+# the merged node and to the name of the list parameter of the merged node
+# which collects each parameter of the merged nodes
+FUSED_NODES = {
+    scale_impact: (scale_impact_multiple, {"scale_factor": "scale_factors",
+                                           "items": "items"}),
+    }
+
+_FOOD = ("food", "g/cap/day")
+
+
+def fuse_nodes(pipeline):
+    """Merges the runs of consecutive nodes listed in FUSED_NODES, and the
+    runs of nodes listed in PRODUCTION_STEPS into production_pass nodes.
+
+    Skipped nodes are not merged. The merged node is named after the names of
+    the nodes it replaces.
+
+    Parameters
+    ----------
+    pipeline : Pipeline
+        Pipeline whose node list is compiled, before it runs.
+
+    Returns
+    -------
+    pipeline : Pipeline
+        The same pipeline, with the merged nodes.
+    """
+
+    nodes, params, names, skip = [], [], [], []
+
+    i = 0
+    while i < len(pipeline.nodes):
+        node = pipeline.nodes[i]
+        j = i + 1
+        fused = None
+
+        if node in FUSED_NODES and not pipeline.skip[i]:
+            while j < len(pipeline.nodes) and pipeline.nodes[j] is node \
+                    and not pipeline.skip[j]:
+                j += 1
+            if j - i > 1:
+                fused_node, param_names = FUSED_NODES[node]
+                defaults = node_defaults(node)
+                fused = (fused_node,
+                         {fused_name: [{**defaults, **pipeline.params[k]}[name]
+                                       for k in range(i, j)]
+                          for name, fused_name in param_names.items()})
+
+        elif node in PRODUCTION_STEPS and not pipeline.skip[i]:
+            j = _production_run_end(pipeline, i)
+            if sum(other in PRODUCTION_STEPS for other in pipeline.nodes[i:j]) > 1:
+                fused = (production_pass, {"nodes": pipeline.nodes[i:j],
+                                           "params": pipeline.params[i:j]})
+            else:
+                j = i + 1
+
+        if fused is not None:
+            nodes.append(fused[0])
+            params.append(fused[1])
+            names.append(" + ".join(pipeline.names[i:j]))
+            skip.append(False)
+        else:
+            nodes.append(node)
+            params.append(pipeline.params[i])
+            names.append(pipeline.names[i])
+            skip.append(pipeline.skip[i])
+        i = j
+
+    pipeline.nodes, pipeline.params, pipeline.names, pipeline.skip = nodes, params, names, skip
+
+    return pipeline
+
+
+def _production_run_end(pipeline, i):
+    """Returns the index after the last production scaling node of the run
+    starting at node i"""
+
+    end = i + 1
+    for j in range(i + 1, len(pipeline.nodes)):
+        node, params = pipeline.nodes[j], pipeline.params[j]
+        if pipeline.skip[j]:
+            break
+        if node in PRODUCTION_STEPS:
+            end = j + 1
+        elif not is_declared(node) or any(overlaps(path, _FOOD) for path
+                                          in node_reads(node, params) + node_writes(node, params)):
+            break
+
+    return end
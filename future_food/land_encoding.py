@@ -0,0 +1,120 @@
+"""Storage precision of the land use percentage grids.
+
+The land use grids can be stored as float64, float32 or as fixed-point uint16
+percentages. Model nodes decode the stored grid into a floating point working
+copy, and store their result with the working precision of the grid, see
+working_precision. Grid-wide totals are always accumulated in float64.
+"""
+
+import numpy as np
+
+LAND_PRECISIONS = ["float64", "float32", "uint16"]
+
+# Fixed-point percentages are stored in steps of 1/640 %, which is exactly
+# representable and allows values up to 102.4 %. The largest integer marks
+# missing values.
+LAND_SCALE_FACTOR = 1 / 640
+LAND_FILL_VALUE = np.iinfo(np.uint16).max
+
+
+def land_precision(land):
+    """Returns the storage precision of a land use grid"""
+
+    if land.dtype == np.uint16:
+        return "uint16"
+    if land.dtype == np.float32:
+        return "float32"
+    return "float64"
+
+
+def working_precision(precision):
+    """Returns the precision with which model nodes store the grids they
+    compute from a grid of the given precision.
+
+    Fixed-point grids are only used for stored baselines. Grids computed by
+    the nodes are kept in float32, the precision they are decoded to, as
+    quantizing the result of each node would round away small moves of land
+    and accumulate the rounding errors down the pipeline.
+    """
+    return "float32" if precision == "uint16" else precision
+
+
+def encode_land(land, precision="float64"):
+    """Stores a land use grid with the given precision.
+
+    Parameters
+    ----------
+    land : xarray.DataArray
+        Land use percentages, as floating point values.
+    precision : str, optional
+        One of "float64", "float32" or "uint16". Fixed-point uint16 grids
+        store round(land / scale_factor), with the scale factor and the value
+        used for missing data stored in their attributes.
+
+    Returns
+    -------
+    encoded : xarray.DataArray
+        Encoded land use grid.
+    """
+
+    if precision not in LAND_PRECISIONS:
+        raise ValueError(f"Unknown land precision {precision!r}, "
+                         f"must be one of {LAND_PRECISIONS}")
+
+    if precision != "uint16":
+        return land.astype(precision, copy=False)
+
+    if land.dtype == np.uint16:
+        return land
+
+    scaled = np.rint(land.values / LAND_SCALE_FACTOR)
+    encoded = np.where(np.isfinite(scaled),
+                       np.clip(scaled, 0, LAND_FILL_VALUE - 1),
+                       LAND_FILL_VALUE).astype(np.uint16)
+
+    out = land.copy(deep=False, data=encoded)
+    out.attrs.update({"scale_factor": LAND_SCALE_FACTOR,
+                      "fill_value": int(LAND_FILL_VALUE)})
+
+    return out
+
+
+def decode_land(land, copy=True):
+    """Returns the floating point values of a stored land use grid.
+
+    Fixed-point grids are decoded into a new float32 array. Floating point
+    grids keep their precision, and are copied unless copy is False.
+
+    Parameters
+    ----------
+    land : xarray.DataArray
+        Stored land use grid.
+    copy : bool, optional
+        If False, floating point grids are returned as they are. Use it when
+        the returned grid is only read.
+
+    Returns
+    -------
+    decoded : xarray.DataArray
+        Land use percentages.
+    """
+
+    if land.dtype != np.uint16:
+        return land.copy(deep=True) if copy else land
+
+    scale_factor = np.float32(land.attrs.get("scale_factor", LAND_SCALE_FACTOR))
+    fill_value = land.attrs.get("fill_value", LAND_FILL_VALUE)
+
+    data = land.values.astype(np.float32) * scale_factor
+    data[land.values == fill_value] = np.nan
+
+    out = land.copy(deep=False, data=data)
+    out.attrs = {key: value for key, value in land.attrs.items()
+                 if key not in ["scale_factor", "fill_value"]}
+
+    return out
+
+
+def land_sum(land, dim=None):
+    """Sums land use percentages, accumulating in float64"""
+    return land.sum(dim=dim, dtype=np.float64)
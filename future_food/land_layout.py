@@ -0,0 +1,139 @@
+"""Layouts of the land use percentage grids.
+
+Land use grids are read as (aggregate_class, y, x) arrays, most of whose
+pixels are sea or have no data. In the "pixel" layout, only pixels with data
+in at least one class are kept, as a dense (aggregate_class, pixel) array with
+the x and y coordinates of each pixel. The positions of the pixels in the
+original grid are stored in a separate pixel grid dataset, which is used to
+rebuild the full grid when needed, for example to export maps.
+"""
+
+import numpy as np
+import xarray as xr
+
+from .land_encoding import decode_land
+
+LAND_LAYOUTS = ["grid", "pixel"]
+
+CLASS_DIM = "aggregate_class"
+PIXEL_DIM = "pixel"
+
+
+def pixel_grid(land):
+    """Builds the pixel index of a land use grid.
+
+    Parameters
+    ----------
+    land : xarray.DataArray
+        Land use grid with an aggregate_class dimension and spatial dimensions.
+
+    Returns
+    -------
+    grid : xarray.Dataset
+        Dataset with the full spatial coordinates of the grid, and one
+        "<dim>_index" variable per spatial dimension holding the position of
+        each valid pixel along that dimension.
+    """
+
+    grid_dims = [dim for dim in land.dims if dim != CLASS_DIM]
+    values = land.transpose(CLASS_DIM, *grid_dims).values
+    positions = np.nonzero(np.isfinite(values).any(axis=0))
+
+    return xr.Dataset({f"{dim}_index": (PIXEL_DIM, index)
+                       for dim, index in zip(grid_dims, positions)},
+                      coords={dim: land[dim].variable for dim in grid_dims},
+                      attrs={"grid_dims": grid_dims})
+
+
+def to_pixels(land, grid):
+    """Converts a grid to the pixel layout of a pixel grid.
+
+    Parameters
+    ----------
+    land : xarray.DataArray
+        Grid with the same spatial dimensions as the pixel grid. Any other
+        dimensions, like aggregate_class, are kept.
+    grid : xarray.Dataset
+        Pixel grid built with pixel_grid.
+
+    Returns
+    -------
+    pixels : xarray.DataArray
+        Values of the valid pixels, with the pixel dimension last.
+    """
+
+    grid_dims = list(grid.attrs["grid_dims"])
+    other_dims = [dim for dim in land.dims if dim not in grid_dims]
+    values = land.transpose(*other_dims, *grid_dims).values
+    index = tuple(grid[f"{dim}_index"].values for dim in grid_dims)
+
+    coords = {name: coord.variable for name, coord in land.coords.items()
+              if not set(coord.dims) & set(grid_dims)}
+    coords.update({dim: (PIXEL_DIM, grid[dim].values[grid[f"{dim}_index"].values])
+                   for dim in grid_dims})
+
+    return xr.DataArray(values[(Ellipsis,) + index],
+                        dims=other_dims + [PIXEL_DIM],
+                        coords=coords,
+                        name=land.name,
+                        attrs=land.attrs)
+
+
+def to_grid(land, grid):
+    """Rebuilds the full grid of a land use array in the pixel layout.
+
+    Pixels which are not in the pixel grid are set to NaN. Arrays which are
+    already in the grid layout are returned as they are.
+
+    Parameters
+    ----------
+    land : xarray.DataArray
+        Floating point array in the pixel layout. Fixed-point arrays must be
+        decoded with decode_land first.
+    grid : xarray.Dataset
+        Pixel grid built with pixel_grid.
+
+    Returns
+    -------
+    grid : xarray.DataArray
+        Array with the spatial dimensions of the pixel grid.
+    """
+
+    if PIXEL_DIM not in land.dims:
+        return land
+
+    grid_dims = list(grid.attrs["grid_dims"])
+    land = land.transpose(..., PIXEL_DIM)
+    other_dims = list(land.dims[:-1])
+    shape = [land.sizes[dim] for dim in other_dims] + [grid.sizes[dim] for dim in grid_dims]
+
+    dtype = np.result_type(land.dtype, np.float32)
+    values = np.full(shape, np.nan, dtype=dtype)
+    index = tuple(grid[f"{dim}_index"].values for dim in grid_dims)
+    values[(Ellipsis,) + index] = land.values
+
+    coords = {name: coord.variable for name, coord in land.coords.items()
+              if PIXEL_DIM not in coord.dims}
+    coords.update({dim: grid[dim].variable for dim in grid_dims})
+
+    return xr.DataArray(values,
+                        dims=other_dims + grid_dims,
+                        coords=coords,
+                        name=land.name,
+                        attrs=land.attrs)
+
+
+def land_grid(datablock, key="percentage_land_use"):
+    """Returns the decoded values of a land use entry of a datablock as a full
+    grid, whatever the layout and precision of the datablock"""
+
+    land = decode_land(datablock["land"][key], copy=False)
+    if "pixel_grid" in datablock["land"]:
+        land = to_grid(land, datablock["land"]["pixel_grid"])
+
+    return land
+
+
+def spatial_dims(land):
+    """Returns the spatial dimensions of a land use array"""
+    return [dim for dim in land.dims if dim != CLASS_DIM]
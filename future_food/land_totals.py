@@ -0,0 +1,244 @@
+"""National totals of each land use class.
+
+The land section of a datablock keeps the total of each aggregate_class of
+"percentage_land_use" in "class_totals", and those of "baseline" in
+"baseline_class_totals". Land nodes store their new grid with set_land_use,
+which updates the totals along with it, so that nodes which only need
+national totals read them in O(classes) instead of reducing the full grid.
+
+Stored totals are only used for the grid they were computed for, which
+set_land_use records by the identity of the data buffers of the two arrays.
+Shallow copies of the datablock share these buffers, while any replaced grid
+has a new one, so totals stored alongside a grid replaced without
+set_land_use are recomputed from the grid instead of being used.
+"""
+
+import weakref
+
+import numpy as np
+import xarray as xr
+
+from .land_encoding import (decode_land, encode_land, land_precision, land_sum,
+                            working_precision)
+from .land_layout import CLASS_DIM, spatial_dims
+
+TOTALS_KEYS = {"percentage_land_use": "class_totals",
+               "baseline": "baseline_class_totals"}
+
+# Pairs of (totals, grid) data buffers recorded by link_totals, keyed by
+# their ids. Entries are removed when either buffer is freed.
+_linked_buffers = {}
+
+
+def class_totals(land):
+    """Computes the total of each class of a land use array over all its
+    pixels, accumulating in float64"""
+    return land_sum(land, dim=spatial_dims(land))
+
+
+def land_totals(datablock, key="percentage_land_use"):
+    """Returns the per-class totals of a land use entry of a datablock.
+
+    The stored totals are used if they were stored for the current grid of
+    the entry. Otherwise the totals are computed from the grid, without
+    storing them.
+
+    Parameters
+    ----------
+    datablock : dict
+        Datablock with a land section.
+    key : str, optional
+        Land use entry, "percentage_land_use" or "baseline".
+
+    Returns
+    -------
+    totals : xarray.DataArray
+        Total of each class, along the aggregate_class dimension.
+    """
+
+    land = datablock["land"][key]
+    totals = datablock["land"].get(TOTALS_KEYS[key])
+
+    if totals is not None and _is_linked(totals, land):
+        return totals
+
+    return class_totals(decode_land(land, copy=False))
+
+
+def link_totals(totals, land):
+    """Records that totals are the per-class totals of a land use grid, so
+    that land_totals uses them while the grid is not replaced.
+
+    Parameters
+    ----------
+    totals : xarray.DataArray
+        Per-class totals of land.
+    land : xarray.DataArray
+        Stored land use grid.
+    """
+
+    buffers = (totals.variable._data, land.variable._data)
+    key = tuple(id(buffer) for buffer in buffers)
+
+    def forget(_):
+        _linked_buffers.pop(key, None)
+
+    try:
+        _linked_buffers[key] = tuple(weakref.ref(buffer, forget) for buffer in buffers)
+    except TypeError:
+        # Arrays without weak references, such as some lazily loaded ones,
+        # have their totals recomputed
+        pass
+
+
+def link_land_section(land):
+    """Records the totals stored in a land section, built along with its
+    grids, as those of the grids"""
+
+    for key, totals_key in TOTALS_KEYS.items():
+        if key in land and totals_key in land:
+            link_totals(land[totals_key], land[key])
+
+
+def _is_linked(totals, land):
+    buffers = (totals.variable._data, land.variable._data)
+    refs = _linked_buffers.get(tuple(id(buffer) for buffer in buffers))
+
+    return refs is not None and all(ref() is buffer for ref, buffer in zip(refs, buffers))
+
+
+def set_land_use(datablock, land, precision="float64", totals=None):
+    """Stores a new land use grid and its per-class totals in a datablock.
+
+    Parameters
+    ----------
+    datablock : dict
+        Datablock to update.
+    land : xarray.DataArray
+        New land use percentages, as floating point values.
+    precision : str, optional
+        Storage precision of the grid the node started from. The new grid is
+        stored with its working precision, see working_precision.
+    totals : xarray.DataArray, optional
+        Per-class totals of land, if already known. Otherwise they are
+        computed from land.
+
+    Returns
+    -------
+    totals : xarray.DataArray
+        Per-class totals of the new grid.
+    """
+
+    if totals is None:
+        totals = class_totals(land)
+
+    land = encode_land(land, working_precision(precision))
+    link_totals(totals, land)
+
+    datablock["land"]["percentage_land_use"] = land
+    datablock["land"]["class_totals"] = totals
+
+    return totals
+
+
+def transfer_totals(totals, delta, to_class):
+    """Updates per-class totals after moving land between classes.
+
+    Follows the grid update pctg.loc[classes of delta] -= delta followed by
+    pctg.loc[to_class] += delta summed over classes, where each of the classes
+    in to_class receives the summed delta.
+
+    Parameters
+    ----------
+    totals : xarray.DataArray
+        Per-class totals before the move.
+    delta : xarray.DataArray
+        Per pixel land percentages removed from their classes.
+    to_class : str or list of str
+        Class or classes receiving the moved land. Classes missing from totals
+        are added with a zero total.
+
+    Returns
+    -------
+    totals : xarray.DataArray
+        Per-class totals after the move.
+    """
+
+    moved = class_totals(delta)
+    if CLASS_DIM not in moved.dims:
+        moved = moved.expand_dims(CLASS_DIM)
+
+    to_class = [to_class] if np.isscalar(to_class) else list(to_class)
+    totals = add_classes(totals, to_class)
+
+    totals.loc[{CLASS_DIM: moved[CLASS_DIM].values}] -= moved.values
+    totals.loc[{CLASS_DIM: to_class}] += moved.sum().values
+
+    return totals
+
+
+def add_land_classes(datablock, classes, missing_from=None):
+    """Adds empty land use classes to the grid and totals of a datablock.
+
+    Gives the grid and totals which the land nodes store when they move no
+    land to new classes, without decoding floating point grids: the new
+    classes are zero where the first class of the grid has a value, and
+    missing elsewhere.
+
+    Parameters
+    ----------
+    datablock : dict
+        Datablock with a land section.
+    classes : list of str
+        Classes to add, at the end of the grid. Classes already in the grid
+        are left as they are.
+    missing_from : str, optional
+        Class whose missing values are also missing in the new classes, as
+        when its land is added to them without skipping missing values.
+
+    Returns
+    -------
+    totals : xarray.DataArray
+        Per-class totals of the new grid.
+    """
+
+    land = datablock["land"]["percentage_land_use"]
+    totals = land_totals(datablock)
+
+    missing = [name for name in classes if name not in land[CLASS_DIM].values]
+    precision = land_precision(land)
+    if not missing and precision == working_precision(precision):
+        return totals
+
+    # Fixed-point grids are stored in their working precision, as by the nodes
+    precision = working_precision(precision)
+    land = decode_land(land, copy=False)
+
+    first = land.isel({CLASS_DIM: 0})
+    layer = xr.zeros_like(first).where(np.isfinite(first))
+    if missing_from is not None:
+        layer = layer.where(np.isfinite(land.sel({CLASS_DIM: missing_from})))
+
+    layers = []
+    for name in missing:
+        new_class = layer.copy()
+        new_class[CLASS_DIM] = name
+        layers.append(encode_land(new_class, precision))
+
+    return set_land_use(datablock, xr.concat([land, *layers], dim=CLASS_DIM),
+                        precision, add_classes(totals, missing))
+
+
+def add_classes(totals, classes):
+    """Returns a copy of totals including classes, with zero totals for the
+    classes which were missing. New classes are appended at the end, as model
+    nodes do with the land use grid."""
+
+    missing = [name for name in classes if name not in totals[CLASS_DIM].values]
+    totals = totals.copy()
+    if missing:
+        zeros = xr.zeros_like(totals.isel({CLASS_DIM: [0] * len(missing)}))
+        zeros[CLASS_DIM] = missing
+        totals = xr.concat([totals, zeros], dim=CLASS_DIM)
+
+    return totals
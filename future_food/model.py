@@ -2,11 +2,33 @@ import xarray as xr
 import numpy as np
 from agrifoodpy.utils.scaling import logistic_scale, linear_scale
 import warnings
-import copy
 from .glossary import *
+from .datablock_utils import freeze
+from .land_encoding import decode_land, land_precision, land_sum
+from .land_totals import add_land_classes, land_totals, set_land_use, transfer_totals
+from .neutral import neutral_values
+from .node_io import node_io, node_reads, node_writes
 from agrifoodpy.food.food import FoodBalanceSheet
 
-
+# ---- Datablock paths declared by the model nodes ----
+
+_TIMESCALE = ("global_parameters", "timescale")
+_POPULATION = ("population", "population")
+_FOOD = ("food", "g/cap/day")
+_FOOD_BASELINE = ("food", "baseline_projected")
+_FOOD_YEARS = ("food", "g/cap/day", "Year")
+_QTY_KEYS = [("food", key) for key in ["g/cap/day", "g_prot/cap/day", "g_fat/cap/day", "kCal/cap/day"]]
+_NUTRITION_KEYS = [("food", key) for key in ["g_prot/g_food", "g_fat/g_food", "kCal/g_food"]]
+_IMPACT = ("impact", "gco2e/gfood")
+_SEQUESTRATION = ("impact", "co2e_sequestration")
+# The totals are computed from the grid when they are not stored for it, see
+# land_totals
+_LAND = [("land", "percentage_land_use"), ("land", "class_totals")]
+
+
+@node_io(reads=[_POPULATION, *_QTY_KEYS, _IMPACT, ("impact", "gco2e/gfood_land")],
+         writes=[*_QTY_KEYS, _IMPACT, ("impact", "gco2e/gfood_land"),
+                 ("impact", "baseline"), _FOOD_BASELINE])
 def project_future(
         datablock,
         yield_change=None
@@ -29,13 +51,8 @@ def project_future(
     datablock : Dict
         New dictionary containinng projected food consumption data
     """
-    years = np.arange(2021, 2051)
-
     pop = datablock["population"]["population"]
 
-    scale = pop.sel(Region=826, Year=np.arange(2021, 2051)) \
-        / pop.sel(Region=826, Year=2020)
-
     # Per capita per day values remain constant
     g_cap_day = datablock["food"]["g/cap/day"]
     g_prot_cap_day = datablock["food"]["g_prot/cap/day"]
@@ -44,10 +61,17 @@ def project_future(
 
     years_past = g_cap_day.Year.values
 
-    g_cap_day = g_cap_day.fbs.add_years(years, "constant")
-    g_prot_cap_day = g_prot_cap_day.fbs.add_years(years, "constant")
-    g_fat_cap_day = g_fat_cap_day.fbs.add_years(years, "constant")
-    kcal_cap_day = kcal_cap_day.fbs.add_years(years, "constant")
+    # Project over the population years after the food balance sheet years
+    years = pop.Year.values[pop.Year.values > years_past[-1]]
+
+    # The first population region is the modelled area
+    scale = pop.isel(Region=0).sel(Year=years) \
+        / pop.isel(Region=0).sel(Year=2020)
+
+    g_cap_day = g_cap_day.fbs.add_years(years, projection="constant")
+    g_prot_cap_day = g_prot_cap_day.fbs.add_years(years, projection="constant")
+    g_fat_cap_day = g_fat_cap_day.fbs.add_years(years, projection="constant")
+    kcal_cap_day = kcal_cap_day.fbs.add_years(years, projection="constant")
 
     # Scale food production
     scale_past = xr.DataArray(
@@ -63,7 +87,7 @@ def project_future(
     if yield_change is not None:
         scale_tot = scale_tot.expand_dims({"Item": g_cap_day.Item.values})
         scale_yield = xr.ones_like(scale_tot)
-        scale_yield.loc[{"Item": cereal_items}] = linear_scale(2020, 2020, 2050, 2050, c_init=1, c_end=1+yield_change)
+        scale_yield.loc[{"Item": cereal_items}] = linear_scale(2020, 2020, years[-1], years[-1], c_init=1, c_end=1+yield_change)
         scale_tot = scale_tot / scale_yield
 
     # Scale food production and balance using imports
@@ -81,8 +105,8 @@ def project_future(
     # Emissions per gram of food also remain constant
     g_co2e_g = datablock["impact"]["gco2e/gfood"]
     g_co2e_g_land = datablock["impact"]["gco2e/gfood_land"]
-    g_co2e_g = g_co2e_g.fbs.add_years(years, "constant")
-    g_co2e_g_land = g_co2e_g_land.fbs.add_years(years, "constant")
+    g_co2e_g = g_co2e_g.fbs.add_years(years, projection="constant")
+    g_co2e_g_land = g_co2e_g_land.fbs.add_years(years, projection="constant")
 
     datablock["food"]["g/cap/day"] = g_cap_day
     datablock["food"]["g_prot/cap/day"] = g_prot_cap_day
@@ -90,13 +114,35 @@ def project_future(
     datablock["food"]["kCal/cap/day"] = kcal_cap_day
     datablock["impact"]["gco2e/gfood"] = g_co2e_g
     datablock["impact"]["gco2e/gfood_land"] = g_co2e_g_land
-    datablock["impact"]["baseline"] = copy.deepcopy(datablock["impact"]["gco2e/gfood"])
+    # The baselines share the arrays of the projected values, which are made
+    # read-only. Nodes replace these entries instead of modifying them.
+    datablock["impact"]["baseline"] = freeze(datablock["impact"]["gco2e/gfood"].copy(deep=False))
 
-    datablock["food"]["baseline_projected"] = copy.deepcopy(datablock["food"]["g/cap/day"])
+    datablock["food"]["baseline_projected"] = freeze(datablock["food"]["g/cap/day"].copy(deep=False))
 
     return datablock
 
 
+def item_scaling_multiple_neutral(
+        datablock,
+        scaling_nutrient,
+        **params
+        ):
+    """Neutral item_scaling_multiple node, see neutral.neutral_values"""
+
+    food_orig = datablock["food"][scaling_nutrient]
+
+    if not neutral_food_supply(food_orig):
+        return item_scaling_multiple(datablock, scaling_nutrient=scaling_nutrient, **params)
+
+    unit_ratio(datablock, food_orig)
+
+    return datablock
+
+
+@neutral_values(stub=item_scaling_multiple_neutral, scale=1)
+@node_io(reads=[_TIMESCALE, _FOOD, ("food", "{scaling_nutrient}")],
+         writes=[_FOOD])
 def item_scaling_multiple(
         datablock,
         scale,
@@ -172,6 +218,8 @@ def item_scaling_multiple(
     return datablock
 
 
+@node_io(reads=[_TIMESCALE, *_QTY_KEYS, ("food", "{scaling_nutrient}")],
+         writes=_QTY_KEYS)
 def item_scaling(
         datablock,
         scale,
@@ -421,6 +469,31 @@ def balanced_scaling(
     return out
 
 
+def food_waste_model_neutral(
+        datablock,
+        waste_scale,
+        kcal_rda,
+        source,
+        elasticity=None
+        ):
+    """Neutral food_waste_model node, see neutral.neutral_values"""
+
+    food_orig = datablock["food"]["g/cap/day"]*datablock["food"]["kCal/g_food"]
+    kcal_total = food_orig["food"].isel(Year=-1).sum(dim="Item").to_numpy()
+
+    if not (neutral_food_supply(food_orig) and np.all(np.isfinite(kcal_rda))
+            and np.all(np.isfinite(kcal_total)) and np.all(kcal_total != 0)):
+        return food_waste_model(datablock, waste_scale, kcal_rda, source, elasticity)
+
+    datablock["food"]["rda_kcal"] = kcal_rda
+    unit_ratio(datablock, food_orig)
+
+    return datablock
+
+
+@neutral_values(stub=food_waste_model_neutral, waste_scale=0)
+@node_io(reads=[_TIMESCALE, _FOOD, ("food", "kCal/g_food")],
+         writes=[_FOOD, ("food", "rda_kcal")])
 def food_waste_model(
         datablock,
         waste_scale,
@@ -433,7 +506,7 @@ def food_waste_model(
 
     timescale = datablock["global_parameters"]["timescale"]
     kcal_fact = datablock["food"]["kCal/g_food"]
-    food_orig = copy.deepcopy(datablock["food"]["g/cap/day"])*kcal_fact
+    food_orig = datablock["food"]["g/cap/day"]*kcal_fact
     datablock["food"]["rda_kcal"] = kcal_rda
 
     # This is the maximum factor we can multiply food by to achieve consumption
@@ -469,26 +542,16 @@ def food_waste_model(
     return datablock
 
 
-def alternative_food_model(
+def add_alternative_items(
         datablock,
-        cultured_scale,
         labmeat_co2e,
-        baseline_items,
         copy_from,
         new_items,
-        new_item_name,
-        replaced_items,
-        source,
-        elasticity=None
+        new_item_name
         ):
-    """Replaces selected items by alternative products on a weight by weight
-    basis, compared to a baseline array.
-    A list of replaced items is adjusted to keep calories constant.
-    """
-
-    timescale = datablock["global_parameters"]["timescale"]
-    baseline_items = get_items(datablock["food"]["g/cap/day"], baseline_items)
-    items_to_replace = get_items(datablock["food"]["g/cap/day"], replaced_items)
+    """Adds the alternative food items to the food, nutrition and emissions
+    datasets, with zero food quantities, the nutrition values of the copy_from
+    item and the labmeat_co2e emissions factor."""
 
     nutrition_keys = ["g_prot/g_food", "g_fat/g_food", "kCal/g_food"]
     # Add new items to the food dataset
@@ -506,11 +569,81 @@ def alternative_food_model(
         datablock["food"][key]["Item_origin"].loc[{"Item":new_items}] = "Alternative Food"
         datablock["food"][key]["Item_group"].loc[{"Item":new_items}] = "Alternative Food"
 
+    # Add emissions factor for cultured meat
+    datablock["impact"]["gco2e/gfood"] = datablock["impact"]["gco2e/gfood"].fbs.add_items(new_items)
+    datablock["impact"]["gco2e/gfood"].loc[{"Item":new_items}] = labmeat_co2e
+
+
+def alternative_food_model_neutral(
+        datablock,
+        cultured_scale,
+        labmeat_co2e,
+        baseline_items,
+        copy_from,
+        new_items,
+        new_item_name,
+        replaced_items,
+        source,
+        elasticity=None
+        ):
+    """Neutral alternative_food_model node, see neutral.neutral_values"""
+
+    food_orig = datablock["food"]["g/cap/day"]
+    kcal_fact = datablock["food"]["kCal/g_food"]
+    kcal_orig = food_orig * kcal_fact
+    items_to_replace = get_items(food_orig, replaced_items)
+
+    # The calories of the replaced items and of feed must be non-zero, as they
+    # divide the calories of the new items
+    target_calories = kcal_orig["food"].sel(Item=items_to_replace).sum(dim="Item").to_numpy()
+    feed_calories = kcal_orig["feed"].sum(dim="Item").to_numpy()
+
+    if not (neutral_food_supply(food_orig) and neutral_food_supply(kcal_orig)
+            and np.all(np.isfinite(kcal_fact.sel(Item=copy_from).to_numpy()))
+            and np.all(np.isfinite(target_calories)) and np.all(target_calories != 0)
+            and np.all(np.isfinite(feed_calories)) and np.all(feed_calories != 0)
+            and (elasticity is None or np.all(np.isfinite(elasticity)))):
+        return alternative_food_model(datablock, cultured_scale, labmeat_co2e, baseline_items,
+                                      copy_from, new_items, new_item_name, replaced_items,
+                                      source, elasticity)
+
+    add_alternative_items(datablock, labmeat_co2e, copy_from, new_items, new_item_name)
+    unit_ratio(datablock, datablock["food"]["g/cap/day"] * datablock["food"]["kCal/g_food"])
+
+    return datablock
+
+
+@neutral_values(stub=alternative_food_model_neutral, cultured_scale=0)
+@node_io(reads=[_TIMESCALE, _FOOD, _FOOD_BASELINE, *_NUTRITION_KEYS, _IMPACT],
+         writes=[_FOOD, *_NUTRITION_KEYS, _IMPACT])
+def alternative_food_model(
+        datablock,
+        cultured_scale,
+        labmeat_co2e,
+        baseline_items,
+        copy_from,
+        new_items,
+        new_item_name,
+        replaced_items,
+        source,
+        elasticity=None
+        ):
+    """Replaces selected items by alternative products on a weight by weight
+    basis, compared to a baseline array.
+    A list of replaced items is adjusted to keep calories constant.
+    """
+
+    timescale = datablock["global_parameters"]["timescale"]
+    baseline_items = get_items(datablock["food"]["g/cap/day"], baseline_items)
+    items_to_replace = get_items(datablock["food"]["g/cap/day"], replaced_items)
+
+    add_alternative_items(datablock, labmeat_co2e, copy_from, new_items, new_item_name)
+
     # Scale products by cultured_scale
-    food_orig = copy.deepcopy(datablock["food"]["g/cap/day"])
+    food_orig = datablock["food"]["g/cap/day"]
     kcal_fact = datablock["food"]["kCal/g_food"]
     kcal_orig = food_orig * kcal_fact
-    food_base = copy.deepcopy(datablock["food"]["baseline_projected"])
+    food_base = datablock["food"]["baseline_projected"]
 
     scale_alternative = logistic_food_supply(food_orig, timescale, 0, cultured_scale)
 
@@ -557,10 +690,6 @@ def alternative_food_model(
     out = feed_scale(out, food_orig)
     datablock["food"]["g/cap/day"] = out
 
-    # Add emissions factor for cultured meat
-    datablock["impact"]["gco2e/gfood"] = datablock["impact"]["gco2e/gfood"].fbs.add_items(new_items)
-    datablock["impact"]["gco2e/gfood"].loc[{"Item":new_items}] = labmeat_co2e
-
     out_kcal_cap_day = scale_kcal_feed(kcal_cap_day, kcal_orig, new_items)
     ratio = out_kcal_cap_day / kcal_cap_day
     ratio = ratio.where(~np.isnan(ratio), 1)
@@ -570,6 +699,8 @@ def alternative_food_model(
     return datablock
 
 
+@node_io(reads=[_TIMESCALE, *_QTY_KEYS, *_NUTRITION_KEYS, _IMPACT],
+         writes=[*_QTY_KEYS, *_NUTRITION_KEYS, _IMPACT])
 def cultured_meat_model(
         datablock,
         cultured_scale,
@@ -600,8 +731,8 @@ def cultured_meat_model(
         datablock["food"][key].loc[{"Item":new_items}] = 0
 
     # Scale products by cultured_scale
-    food_orig = copy.deepcopy(datablock["food"]["g/cap/day"])
-    kcal_orig = copy.deepcopy(datablock["food"]["kCal/cap/day"])
+    food_orig = datablock["food"]["g/cap/day"]
+    kcal_orig = datablock["food"]["kCal/cap/day"]
 
     scale_labmeat = logistic_food_supply(food_orig, timescale, 1, 1-cultured_scale)
 
@@ -655,13 +786,16 @@ def cultured_meat_model(
     return datablock
 
 
+@node_io(reads=[_POPULATION, _FOOD, _IMPACT, ("impact", "gco2e/gfood_land")],
+         writes=[("food", "g_co2e/cap/day"), ("food", "g_co2e/cap/day_land"),
+                 ("impact", "g_co2e/year"), ("impact", "g_co2e/year_land")])
 def compute_emissions(datablock):
     """
     Computes the emissions per capita per day and per year for each food item,
     using the per capita daily weights and PN18 emissions factors.
     """
     pop = datablock["population"]["population"]
-    pop_world = pop.sel(Region = 826)
+    pop_world = pop.isel(Region = 0)
 
     # Compute emissions per capita per day
     co2e_cap_day_ag = datablock["food"]["g/cap/day"] * datablock["impact"]["gco2e/gfood"]
@@ -677,6 +811,8 @@ def compute_emissions(datablock):
     return datablock
 
 
+@node_io(reads=[("impact", "g_co2e/year")],
+         writes=[("impact", "T"), ("impact", "C"), ("impact", "F")])
 def compute_t_anomaly(datablock):
     """Computes the temperature anomaly, concentration and radiation forcing from
     the per year emissions using the FAIR model.
@@ -703,6 +839,8 @@ def compute_t_anomaly(datablock):
     return datablock
 
 
+@node_io(reads=[_TIMESCALE, _FOOD, *_LAND],
+         writes=[_FOOD, *_LAND])
 def forest_land_model_new(
         datablock,
         forest_fraction,
@@ -716,16 +854,17 @@ def forest_land_model_new(
     """
 
     timescale = datablock["global_parameters"]["timescale"]
-    pctg = datablock["land"]["percentage_land_use"].copy(deep=True)
+    precision = land_precision(datablock["land"]["percentage_land_use"])
+    pctg = decode_land(datablock["land"]["percentage_land_use"])
+    totals = land_totals(datablock)
 
+    old_use_arable = totals.sel({"aggregate_class":["Arable"]}).sum()
 
-    old_use_arable = datablock["land"]["percentage_land_use"].sel({"aggregate_class":["Arable"]}).sum()
-
-    total_uk_land = pctg.sum()
+    total_uk_land = totals.sum()
 
     # Fraction of forest to achieve area delta
-    forest_xy = datablock["land"]["percentage_land_use"].sel({"aggregate_class":["Broadleaf woodland", "Coniferous woodland"]})
-    total_forest = forest_xy.sum()
+    forest_xy = pctg.sel({"aggregate_class":["Broadleaf woodland", "Coniferous woodland"]})
+    total_forest = totals.sel({"aggregate_class":["Broadleaf woodland", "Coniferous woodland"]}).sum()
 
     # Required delta to forest = requested fraction - current fraction
     delta_forest_land_percentage = forest_fraction - float(total_forest / total_uk_land)
@@ -733,8 +872,8 @@ def forest_land_model_new(
     # Total area in hectares to be converted
     delta_forest_area = total_uk_land * delta_forest_land_percentage
 
-    pasture_xy = datablock["land"]["percentage_land_use"].sel({"aggregate_class":["Improved grassland", "Semi-natural grassland"]})
-    old_use_pasture = pasture_xy.sum()
+    pasture_xy = pctg.sel({"aggregate_class":["Improved grassland", "Semi-natural grassland"]})
+    old_use_pasture = totals.sel({"aggregate_class":["Improved grassland", "Semi-natural grassland"]}).sum()
 
     if delta_forest_land_percentage > 0:
         # We only change pasture to forest
@@ -755,7 +894,7 @@ def forest_land_model_new(
 
     else:
         # We change forest to a mix of arable and forest
-        agricultural_xy = datablock["land"]["percentage_land_use"].sel({"aggregate_class":["Improved grassland", "Semi-natural grassland", "Arable"]})
+        agricultural_xy = pctg.sel({"aggregate_class":["Improved grassland", "Semi-natural grassland", "Arable"]})
 
         # Per pixel percentage delta
         delta_forest_ratio = delta_forest_area / total_forest
@@ -766,11 +905,11 @@ def forest_land_model_new(
         pctg.loc[{"aggregate_class":["Improved grassland", "Semi-natural grassland", "Arable"]}] -= delta_agriculture_xy
 
     # Add spared class to the land use map
-    datablock["land"]["percentage_land_use"] = pctg
+    totals = set_land_use(datablock, pctg, precision)
 
     # Scale food production and imports
-    new_use_pasture = pctg.sel({"aggregate_class":["Improved grassland", "Semi-natural grassland"]}).sum()
-    new_use_arable = pctg.sel({"aggregate_class":"Arable"}).sum()
+    new_use_pasture = totals.sel({"aggregate_class":["Improved grassland", "Semi-natural grassland"]}).sum()
+    new_use_arable = totals.sel({"aggregate_class":"Arable"}).sum()
 
     scale_use_pasture = (new_use_pasture/old_use_pasture).to_numpy()
     scale_use_arable = (new_use_arable/old_use_arable).to_numpy()
@@ -805,6 +944,8 @@ def forest_land_model_new(
     return datablock
 
 
+@node_io(reads=[_TIMESCALE, *_QTY_KEYS, *_LAND, ("land", "{map_mask}")],
+         writes=[*_QTY_KEYS, *_LAND])
 def forest_land_model(
         datablock,
         forest_fraction,
@@ -819,9 +960,11 @@ def forest_land_model(
     """
 
     timescale = datablock["global_parameters"]["timescale"]
-    pctg = datablock["land"]["percentage_land_use"].copy(deep=True)
-    old_use_pasture = datablock["land"]["percentage_land_use"].sel({"aggregate_class":["Improved grassland", "Semi-natural grassland"]}).sum()
-    old_use_arable = datablock["land"]["percentage_land_use"].sel({"aggregate_class":["Arable"]}).sum()
+    precision = land_precision(datablock["land"]["percentage_land_use"])
+    pctg = decode_land(datablock["land"]["percentage_land_use"])
+    totals = land_totals(datablock)
+    old_use_pasture = totals.sel({"aggregate_class":["Improved grassland", "Semi-natural grassland"]}).sum()
+    old_use_arable = totals.sel({"aggregate_class":["Arable"]}).sum()
 
     # if no alc grade is provided, then use the whole map
     if mask_vals is not None or map_mask is not None:
@@ -830,10 +973,10 @@ def forest_land_model(
     else:
         alc_mask = np.ones_like(pctg, dtype=bool)
 
-    total_uk_land = pctg.sum()
+    total_uk_land = totals.sum()
 
-    total_forestable_pasture_land = pctg.where(alc_mask, other=0).sel({"aggregate_class":["Improved grassland", "Semi-natural grassland"]}).sum()
-    total_forestable_arable_land = pctg.where(alc_mask, other=0).sel({"aggregate_class":["Arable"]}).sum()
+    total_forestable_pasture_land = land_sum(pctg.where(alc_mask, other=0).sel({"aggregate_class":["Improved grassland", "Semi-natural grassland"]}))
+    total_forestable_arable_land = land_sum(pctg.where(alc_mask, other=0).sel({"aggregate_class":["Arable"]}))
 
     pasture_to_agricultural = total_forestable_pasture_land / (total_forestable_arable_land + total_forestable_pasture_land)
 
@@ -859,11 +1002,11 @@ def forest_land_model(
     pctg.loc[{"aggregate_class":"Coniferous woodland"}] += delta_forest_pasture.sum(dim="aggregate_class")*(1-bdleaf_conif_ratio)
 
     # Add spared class to the land use map
-    datablock["land"]["percentage_land_use"] = pctg
+    totals = set_land_use(datablock, pctg, precision)
 
     # Scale food production and imports
-    new_use_pasture = pctg.sel({"aggregate_class":["Improved grassland", "Semi-natural grassland"]}).sum()
-    new_use_arable = pctg.sel({"aggregate_class":"Arable"}).sum()
+    new_use_pasture = totals.sel({"aggregate_class":["Improved grassland", "Semi-natural grassland"]}).sum()
+    new_use_arable = totals.sel({"aggregate_class":"Arable"}).sum()
 
     scale_use_pasture = (new_use_pasture/old_use_pasture).to_numpy()
     scale_use_arable = (new_use_arable/old_use_arable).to_numpy()
@@ -904,6 +1047,32 @@ def forest_land_model(
     return datablock
 
 
+def peatland_restoration_neutral(
+        datablock,
+        restore_fraction,
+        new_land_type,
+        old_land_type,
+        items,
+        peat_map_key=None,
+        mask_val=None
+        ):
+    """Neutral peatland_restoration node, see neutral.neutral_values"""
+
+    old_use = land_totals(datablock).sel({"aggregate_class":old_land_type}).sum().to_numpy()
+
+    if not (neutral_food_supply(datablock["food"]["g/cap/day"])
+            and np.isfinite(old_use) and old_use != 0):
+        return peatland_restoration(datablock, restore_fraction, new_land_type, old_land_type,
+                                    items, peat_map_key, mask_val)
+
+    add_land_classes(datablock, [new_land_type])
+
+    return datablock
+
+
+@neutral_values(stub=peatland_restoration_neutral, restore_fraction=0)
+@node_io(reads=[_TIMESCALE, _FOOD, *_LAND, ("land", "{peat_map_key}")],
+         writes=[_FOOD, *_LAND])
 def peatland_restoration(
         datablock,
         restore_fraction,
@@ -918,10 +1087,32 @@ def peatland_restoration(
     use.
     """
 
+    steps = peatland_restoration_steps(datablock, restore_fraction, new_land_type,
+                                       old_land_type, items, peat_map_key, mask_val)
+    datablock["food"]["g/cap/day"] = apply_production_steps(datablock["food"]["g/cap/day"],
+                                                            [steps])
+
+    return datablock
+
+
+def peatland_restoration_steps(
+        datablock,
+        restore_fraction,
+        new_land_type,
+        old_land_type,
+        items,
+        peat_map_key=None,
+        mask_val=None
+        ):
+    """Updates the land use as peatland_restoration does and returns the
+    production scaling steps of the node, see apply_production_steps."""
+
     timescale = datablock["global_parameters"]["timescale"]
 
-    pctg = datablock["land"]["percentage_land_use"].copy(deep=True)
-    old_use = datablock["land"]["percentage_land_use"].sel({"aggregate_class":old_land_type}).sum()
+    precision = land_precision(datablock["land"]["percentage_land_use"])
+    pctg = decode_land(datablock["land"]["percentage_land_use"])
+    totals = land_totals(datablock)
+    old_use = totals.sel({"aggregate_class":old_land_type}).sum()
 
     if peat_map_key is not None:
         peat_map_da = datablock["land"][peat_map_key]
@@ -947,10 +1138,11 @@ def peatland_restoration(
     pctg.loc[{"aggregate_class":new_land_type}] += delta_spared.sum(dim="aggregate_class")
 
     # Add spared class to the land use map
-    datablock["land"]["percentage_land_use"] = pctg
+    totals = transfer_totals(totals, delta_spared, new_land_type)
+    set_land_use(datablock, pctg, precision, totals)
 
     # Scale food production and imports
-    new_use = pctg.sel({"aggregate_class":old_land_type}).sum()
+    new_use = totals.sel({"aggregate_class":old_land_type}).sum()
     scale_use = (new_use/old_use).to_numpy()
 
     food_orig = datablock["food"]["g/cap/day"]
@@ -958,21 +1150,13 @@ def peatland_restoration(
 
     scaled_items = food_orig.sel(Item=food_orig.Item_origin==items).Item.values
 
-    out = food_orig.fbs.scale_add(element_in="production",
-                                  element_out="imports",
-                                  scale=scale_spare,
-                                  items=scaled_items,
-                                  add=False)
-    datablock["food"]["g/cap/day"] = out
-
-    ratio = out / food_orig
-    ratio = ratio.where(~np.isnan(ratio), 1)
-
-    datablock["food"]["g/cap/day"] = out
-
-    return datablock
+    return [("scale_add", "production", "imports", scale_spare, scaled_items, False)]
 
 
+@node_io(reads=[_TIMESCALE, _FOOD_YEARS, *_LAND,
+                ("advanced_settings", "BECCS_pasture_tco2_ha_yr"),
+                ("advanced_settings", "BECCS_arable_tco2_ha_yr"), _SEQUESTRATION],
+         writes=[_SEQUESTRATION])
 def ccs_model(
         datablock,
         waste_BECCS,
@@ -997,13 +1181,13 @@ def ccs_model(
 
     timescale = datablock["global_parameters"]["timescale"]
     food_orig = datablock["food"]["g/cap/day"]
-    pctg = datablock["land"]["percentage_land_use"]
+    totals = land_totals(datablock)
 
     # Compute the total area of BECCS land used in hectares, and the total
     # sequestration in Mt CO2e / year
 
-    pasture_BECCS_area = pctg.sel({"aggregate_class":"Bioenergy crops (pasture)"}).sum().to_numpy()
-    arable_BECCS_area = pctg.sel({"aggregate_class":"Bioenergy crops (arable)"}).sum().to_numpy()
+    pasture_BECCS_area = totals.sel({"aggregate_class":"Bioenergy crops (pasture)"}).to_numpy()
+    arable_BECCS_area = totals.sel({"aggregate_class":"Bioenergy crops (arable)"}).to_numpy()
     land_BECCS = pasture_BECCS_area * datablock["advanced_settings"]["BECCS_pasture_tco2_ha_yr"]
     land_BECCS += arable_BECCS_area * datablock["advanced_settings"]["BECCS_arable_tco2_ha_yr"]
 
@@ -1024,17 +1208,13 @@ def ccs_model(
 
     seq_da = seq_ds.to_array(dim="Item", name="sequestration")
 
-    if "co2e_sequestration" not in datablock["impact"]:
-        datablock["impact"]["co2e_sequestration"] = seq_da
-    else:
-        # append sequestration to existing sequestration da
-        seq_da_in = datablock["impact"]["co2e_sequestration"]
-        seq_da = xr.concat([seq_da_in, seq_da], dim="Item")
-        datablock["impact"]["co2e_sequestration"] = seq_da
+    append_sequestration(datablock, seq_da)
 
     return datablock
 
 
+@node_io(reads=[_TIMESCALE, _FOOD_YEARS, *_LAND, _SEQUESTRATION],
+         writes=[_SEQUESTRATION])
 def forest_sequestration_model(
         datablock,
         land_type,
@@ -1052,13 +1232,13 @@ def forest_sequestration_model(
     food_orig = datablock["food"]["g/cap/day"]
 
     # Load the land use data from the datablock
-    pctg = datablock["land"]["percentage_land_use"].copy(deep=True)
+    totals = land_totals(datablock)
     logistic_0_val = logistic_food_supply(food_orig, timescale, 0, 1)
 
     for land_type_i, seq_i in zip(land_type, seq):
 
         # Compute forest area in ha, maximum anual sequestration, and growth curve
-        area_land = pctg.loc[{"aggregate_class":land_type_i}].sum().to_numpy()
+        area_land = totals.loc[{"aggregate_class":land_type_i}].sum().to_numpy()
         max_seq = area_land * seq_i
 
 
@@ -1068,19 +1248,28 @@ def forest_sequestration_model(
         seq_ds = xr.Dataset({land_type_i: land_type_seq})
         seq_da = seq_ds.to_array(dim="Item", name="sequestration")
 
-        if "co2e_sequestration" not in datablock["impact"]:
-            datablock["impact"]["co2e_sequestration"] = seq_da
-        else:
-            # append sequestration to existing sequestration da
-            seq_da_in = datablock["impact"]["co2e_sequestration"]
-            seq_da = xr.concat([seq_da_in, seq_da], dim="Item")
-            datablock["impact"]["co2e_sequestration"] = seq_da
+        append_sequestration(datablock, seq_da)
 
     # Compute agroecology sequestration
 
     return datablock
 
 
+def scale_impact_neutral(
+        datablock,
+        **params
+        ):
+    """Neutral scale_impact node, see neutral.neutral_values"""
+
+    if not np.all(np.isfinite(datablock["impact"]["baseline"].values)):
+        return scale_impact(datablock, **params)
+
+    return datablock
+
+
+@neutral_values(stub=scale_impact_neutral, scale_factor=0)
+@node_io(reads=[_TIMESCALE, _FOOD, _IMPACT, ("impact", "baseline")],
+         writes=[_IMPACT])
 def scale_impact(
         datablock,
         scale_factor,
@@ -1094,7 +1283,7 @@ def scale_impact(
     # load quantities and impacts
     food_orig = datablock["food"]["g/cap/day"]
     impacts = datablock["impact"]["gco2e/gfood"].copy(deep=True)
-    impacts_baseline = datablock["impact"]["baseline"].copy(deep=True)
+    impacts_baseline = datablock["impact"]["baseline"]
 
     items = get_items(food_orig, items)
 
@@ -1107,6 +1296,88 @@ def scale_impact(
     return datablock
 
 
+@node_io(reads=[_TIMESCALE, _FOOD, _IMPACT, ("impact", "baseline")],
+         writes=[_IMPACT])
+def scale_impact_multiple(
+        datablock,
+        scale_factors,
+        items
+        ):
+    """Scales the impact values of several item selections relative to the
+    baseline impact factors, giving the same result as a sequence of
+    scale_impact nodes with each of the scale factors and item selections.
+
+    The impact factors are copied once and each item selection is resolved
+    once. The scalings are applied to the copy in the order of the sequence,
+    so the values are identical to those of the scale_impact nodes.
+    """
+
+    timescale = datablock["global_parameters"]["timescale"]
+    food_orig = datablock["food"]["g/cap/day"]
+    impacts = datablock["impact"]["gco2e/gfood"]
+    impacts_baseline = datablock["impact"]["baseline"]
+
+    # The scalings are applied to the arrays directly if the impacts, the
+    # baseline and the scaling curves share their years, as in the pipeline.
+    # Otherwise the scale_impact nodes are run in turn.
+    aligned = impacts.dims == ("Item", "Year") and impacts_baseline.dims == impacts.dims \
+        and np.array_equal(impacts.Year, impacts_baseline.Year) \
+        and np.array_equal(impacts.Year, food_orig.Year)
+
+    positions = {}
+    if aligned:
+        impact_index = impacts.get_index("Item")
+        baseline_index = impacts_baseline.get_index("Item")
+        for item_sel in items:
+            key = repr(item_sel)
+            if key in positions:
+                continue
+            selected = get_items(food_orig, item_sel)
+            if selected is None:
+                aligned = False
+                break
+            impact_pos = impact_index.get_indexer(selected)
+            baseline_pos = baseline_index.get_indexer(selected)
+            if np.any(impact_pos < 0) or np.any(baseline_pos < 0) \
+                    or len(np.unique(impact_pos)) != len(impact_pos):
+                aligned = False
+                break
+            positions[key] = (impact_pos, baseline_pos)
+
+    if not aligned:
+        for scale_factor, item_sel in zip(scale_factors, items):
+            datablock = scale_impact(datablock, scale_factor, item_sel)
+        return datablock
+
+    values = impacts.values.copy()
+    baseline_values = impacts_baseline.values
+
+    for scale_factor, item_sel in zip(scale_factors, items):
+        impact_pos, baseline_pos = positions[repr(item_sel)]
+        scale = logistic_food_supply(food_orig, timescale, 0, scale_factor).values
+        delta = baseline_values[baseline_pos] * scale
+        values[impact_pos] = values[impact_pos] - delta
+
+    datablock["impact"]["gco2e/gfood"] = impacts.copy(data=values)
+
+    return datablock
+
+
+def scale_production_neutral(
+        datablock,
+        **params
+        ):
+    """Neutral scale_production node, see neutral.neutral_values"""
+
+    if not neutral_food_supply(datablock["food"]["g/cap/day"]):
+        return scale_production(datablock, **params)
+
+    return datablock
+
+
+@neutral_values(stub=scale_production_neutral, scale_factor=1)
+@node_io(reads=[_TIMESCALE, _FOOD],
+         writes=[_FOOD])
 def scale_production(
         datablock,
         scale_factor,
@@ -1116,42 +1387,71 @@ def scale_production(
     a multiplicative factor.
     """
 
+    steps = scale_production_steps(datablock, scale_factor, items)
+    datablock["food"]["g/cap/day"] = apply_production_steps(datablock["food"]["g/cap/day"],
+                                                            [steps])
+
+    return datablock
+
+
+def scale_production_steps(
+        datablock,
+        scale_factor,
+        items=None
+        ):
+    """Returns the production scaling steps of a scale_production node, see
+    apply_production_steps."""
+
     timescale = datablock["global_parameters"]["timescale"]
 
     # load quantities and impacts
-    food_orig = datablock["food"]["g/cap/day"].copy(deep=True)
+    food_orig = datablock["food"]["g/cap/day"]
 
     # if no items are specified, do nothing
     items = get_items(food_orig, items)
 
     scale_prod = logistic_food_supply(food_orig, timescale, 1, scale_factor)
 
-    out = food_orig.fbs.scale_add(element_in="production",
-                                element_out="imports",
-                                scale=scale_prod,
-                                items=items,
-                                add=False)
+    # Reduce feed and seed, check for negative sources and update the values
+    # using the ratio to the original values.
+    # The same ratio could be used to update the per cap/day nutrient values,
+    # as it is independent of population growth
+    return [("scale_add", "production", "imports", scale_prod, items, False),
+            ("feed_scale", "imports"),
+            ("negative", "production", "imports", True),
+            ("negative", "imports", "exports", False),
+            ("ratio",)]
 
-    # Reduce feed and seed
-    out = feed_scale(out, food_orig, source = "imports")
 
-    out = check_negative_source(out, "production", "imports")
-    out = check_negative_source(out, "imports", "exports", add=False)
+def BECCS_farm_land_neutral(
+        datablock,
+        farm_percentage,
+        items,
+        land_type="Arable",
+        new_land_type="BECCS",
+        mask_map=None,
+        mask_values=None
+        ):
+    """Neutral BECCS_farm_land node, see neutral.neutral_values"""
 
-    ratio = out / food_orig
-    ratio = ratio.where(~np.isnan(ratio), 1)
+    # Land taken from a single class is added to the new class without
+    # skipping its missing values
+    missing_from = land_type if np.isscalar(land_type) else None
+    classes = datablock["land"]["percentage_land_use"].aggregate_class.values
 
-    # Update per cap/day values and per year values using the same ratio, which
-    # is independent of population growth
-    # qty_key = ["g/cap/day", "g_prot/cap/day", "g_fat/cap/day", "kCal/cap/day"]
-    # for key in qty_key:
-    #     datablock["food"][key] *= ratio
+    if not neutral_food_supply(datablock["food"]["g/cap/day"]) or \
+            (missing_from is not None and (mask_map is not None or new_land_type in classes)):
+        return BECCS_farm_land(datablock, farm_percentage, items, land_type, new_land_type,
+                               mask_map, mask_values)
 
-    datablock["food"]["g/cap/day" ] *= ratio
+    add_land_classes(datablock, [new_land_type], missing_from)
 
     return datablock
 
 
+@neutral_values(stub=BECCS_farm_land_neutral, farm_percentage=0)
+@node_io(reads=[_TIMESCALE, _FOOD, *_LAND, ("land", "{mask_map}")],
+         writes=[_FOOD, *_LAND])
 def BECCS_farm_land(
         datablock,
         farm_percentage,
@@ -1165,12 +1465,34 @@ def BECCS_farm_land(
     and increasing the amount of CO2e sequestered.
     """
 
+    steps = BECCS_farm_land_steps(datablock, farm_percentage, items, land_type,
+                                  new_land_type, mask_map, mask_values)
+    datablock["food"]["g/cap/day"] = apply_production_steps(datablock["food"]["g/cap/day"],
+                                                            [steps])
+
+    return datablock
+
+
+def BECCS_farm_land_steps(
+        datablock,
+        farm_percentage,
+        items,
+        land_type="Arable",
+        new_land_type="BECCS",
+        mask_map=None,
+        mask_values=None
+        ):
+    """Updates the land use as BECCS_farm_land does and returns the production
+    scaling steps of the node, see apply_production_steps."""
+
     timescale = datablock["global_parameters"]["timescale"]
-    pctg = datablock["land"]["percentage_land_use"].copy(deep=True)
-    old_use = datablock["land"]["percentage_land_use"].sel({"aggregate_class":land_type}).sum()
+    precision = land_precision(datablock["land"]["percentage_land_use"])
+    pctg = decode_land(datablock["land"]["percentage_land_use"])
+    totals = land_totals(datablock)
+    old_use = totals.sel({"aggregate_class":land_type}).sum()
 
     if mask_map is not None:
-        mask_map = datablock["land"][mask_map].copy(deep=True)
+        mask_map = datablock["land"][mask_map]
 
     # if no alc grade is provided, then use the whole map
         if mask_values is not None:
@@ -1196,10 +1518,11 @@ def BECCS_farm_land(
         pctg.loc[{"aggregate_class":new_land_type}] += delta_spared
 
     # Add spared class to the land use map
-    datablock["land"]["percentage_land_use"] = pctg
+    totals = transfer_totals(totals, delta_spared, new_land_type)
+    set_land_use(datablock, pctg, precision, totals)
 
     # Scale food production and imports
-    new_use = pctg.sel({"aggregate_class":land_type}).sum()
+    new_use = totals.sel({"aggregate_class":land_type}).sum()
     scale_use = (new_use/old_use).fillna(1).to_numpy()
 
     food_orig = datablock["food"]["g/cap/day"]
@@ -1208,19 +1531,50 @@ def BECCS_farm_land(
     # scaled_items = food_orig.sel(Item=food_orig.Item_origin=="Vegetal Products").Item.values
     scaled_items = get_items(food_orig, items)
 
-    out = food_orig.fbs.scale_add(element_in="production",
-                                  element_out="imports",
-                                  scale=scale_spare,
-                                  items=scaled_items,
-                                  add=False)
+    return [("scale_add", "production", "imports", scale_spare, scaled_items, False)]
 
-    ratio = out / food_orig
-    ratio = ratio.where(~np.isnan(ratio), 1)
-    datablock["food"]["g/cap/day"] = out
+
+def agroecology_model_neutral(
+        datablock,
+        land_percentage,
+        land_type,
+        agroecology_class="Agroecology",
+        tree_coverage=0.1,
+        replaced_items=None,
+        new_items=None,
+        item_yield=None,
+        seq_ha_yr=6.26
+        ):
+    """Neutral agroecology_model node, see neutral.neutral_values"""
+
+    food_orig = datablock["food"]["g/cap/day"]
+    old_use = land_totals(datablock).sel({"aggregate_class":land_type}).sum().to_numpy()
+
+    if new_items is not None or (replaced_items is not None and not (
+            neutral_food_supply(food_orig) and np.isfinite(tree_coverage)
+            and np.isfinite(old_use) and old_use != 0)):
+        return agroecology_model(datablock, land_percentage, land_type, agroecology_class,
+                                 tree_coverage, replaced_items, new_items, item_yield,
+                                 seq_ha_yr)
+
+    totals = add_land_classes(datablock, [agroecology_class])
+
+    # The sequestration of the agroecology class is added even if no land is
+    # converted to it
+    timescale = datablock["global_parameters"]["timescale"]
+    area_agroecology = totals.loc[{"aggregate_class":agroecology_class}].sum().to_numpy()
+    agroecology_seq = logistic_food_supply(food_orig, timescale, 1,
+                                           c_end=area_agroecology * seq_ha_yr)
+
+    seq_ds = xr.Dataset({agroecology_class: agroecology_seq})
+    append_sequestration(datablock, seq_ds.to_array(dim="Item", name="sequestration"))
 
     return datablock
 
 
+@neutral_values(stub=agroecology_model_neutral, land_percentage=0)
+@node_io(reads=[_TIMESCALE, _POPULATION, _FOOD, *_LAND, _SEQUESTRATION],
+         writes=[_FOOD, *_LAND, _SEQUESTRATION])
 def agroecology_model(
         datablock,
         land_percentage,
@@ -1265,9 +1619,11 @@ def agroecology_model(
     """
 
     # Load land use and food data from datablock
-    pctg = datablock["land"]["percentage_land_use"].copy(deep=True)
-    food_orig = datablock["food"]["g/cap/day"].copy(deep=True)
-    old_use = pctg.sel({"aggregate_class":land_type}).sum()
+    precision = land_precision(datablock["land"]["percentage_land_use"])
+    pctg = decode_land(datablock["land"]["percentage_land_use"])
+    food_orig = datablock["food"]["g/cap/day"]
+    totals = land_totals(datablock)
+    old_use = totals.sel({"aggregate_class":land_type}).sum()
     timescale = datablock["global_parameters"]["timescale"]
 
     # Compute land percentages to be converted to agroecology and remove them
@@ -1283,12 +1639,13 @@ def agroecology_model(
 
     delta_total = delta_agroecology.sum(dim="aggregate_class")
     pctg.loc[{"aggregate_class":agroecology_class}] += delta_total
+    totals = transfer_totals(totals, delta_agroecology, agroecology_class)
 
-    out = food_orig.copy(deep=True)
+    out = food_orig
 
     # Reduce production of replaced items if they are provided
     if replaced_items is not None:
-        new_use = pctg.sel({"aggregate_class":land_type}).sum()
+        new_use = totals.sel({"aggregate_class":land_type}).sum()
         scale_use = (new_use/old_use) + (1-tree_coverage) * (1-new_use/old_use)
         scale_use = scale_use.to_numpy()
 
@@ -1314,7 +1671,7 @@ def agroecology_model(
 
         for item, yld in zip(new_items, item_yield):
             old_production = food_orig["production"].sel({"Item":item}).isel(Year=-1)
-            new_production = old_production + yld * delta_agroecology.sum()/pop
+            new_production = old_production + yld * land_sum(delta_agroecology)/pop
             production_scale = (new_production / old_production).to_numpy()
             production_scale_array = logistic_food_supply(food_orig, timescale, 1, production_scale)
 
@@ -1325,7 +1682,7 @@ def agroecology_model(
                                 add=False)
 
     # Compute forest area in ha, maximum anual sequestration, and growth curve
-    area_agroecology = pctg.loc[{"aggregate_class":agroecology_class}].sum().to_numpy()
+    area_agroecology = totals.loc[{"aggregate_class":agroecology_class}].sum().to_numpy()
     max_seq_agroecology = area_agroecology * seq_ha_yr
 
     agroecology_seq = logistic_food_supply(food_orig, timescale, 1, c_end=max_seq_agroecology)
@@ -1334,17 +1691,10 @@ def agroecology_model(
     seq_ds = xr.Dataset({agroecology_class: agroecology_seq})
 
     seq_da = seq_ds.to_array(dim="Item", name="sequestration")
-    if "co2e_sequestration" not in datablock["impact"]:
-        datablock["impact"]["co2e_sequestration"] = seq_da
-
-    else:
-        # append sequestration to existing sequestration da
-        seq_da_in = datablock["impact"]["co2e_sequestration"]
-        seq_da = xr.concat([seq_da_in, seq_da], dim="Item")
-        datablock["impact"]["co2e_sequestration"] = seq_da
+    append_sequestration(datablock, seq_da)
 
     # Rewrite land use data to datablock
-    datablock["land"]["percentage_land_use"] = pctg
+    set_land_use(datablock, pctg, precision, totals)
 
     ratio = out / food_orig
     ratio = ratio.where(~np.isnan(ratio), 1)
@@ -1366,22 +1716,8 @@ def feed_scale(
     """Scales the feed, seed and processing quantities according to the change
     in production of animal and vegetal products"""
 
-    # Obtain reference production values
-    ref_feed_arr = ref["production"].sel(Item=ref.Item_origin=="Animal Products").sum(dim="Item")
-    ref_seed_arr = ref["production"].sel(Item=ref.Item_origin=="Vegetal Products").sum(dim="Item")
-
-    # Compute scaling factors for feed and seed based on proportional production
-    feed_scale = fbs["production"].sel(Item=fbs.Item_origin=="Animal Products").sum(dim="Item") \
-                / ref_feed_arr
-    seed_scale = fbs["production"].sel(Item=fbs.Item_origin=="Vegetal Products").sum(dim="Item") \
-                / ref_seed_arr
-
-    # Set feed_scale and seed_scale to 1 where ref arrays are close or equal to zero
-    feed_scale = xr.where(np.isclose(ref_feed_arr, 0), 1, feed_scale)
-    seed_scale = xr.where(np.isclose(ref_seed_arr, 0), 1, seed_scale)
-
-    processing_scale = fbs["production"].sum(dim="Item") \
-                / ref["production"].sum(dim="Item")
+    feed_scale, seed_scale, processing_scale = feed_scale_factors(fbs["production"],
+                                                                  ref["production"])
 
     if elasticity is not None:
         out = fbs.fbs.scale_add(element_in="feed", element_out=source,
@@ -1407,6 +1743,33 @@ def feed_scale(
     return out
 
 
+def feed_scale_factors(
+        production,
+        ref_production
+        ):
+    """Returns the scaling factors of the feed, seed and processing quantities
+    for a change in production from ref_production, see feed_scale"""
+
+    # Obtain reference production values
+    ref_feed_arr = ref_production.sel(Item=ref_production.Item_origin=="Animal Products").sum(dim="Item")
+    ref_seed_arr = ref_production.sel(Item=ref_production.Item_origin=="Vegetal Products").sum(dim="Item")
+
+    # Compute scaling factors for feed and seed based on proportional production
+    feed_scale = production.sel(Item=production.Item_origin=="Animal Products").sum(dim="Item") \
+                / ref_feed_arr
+    seed_scale = production.sel(Item=production.Item_origin=="Vegetal Products").sum(dim="Item") \
+                / ref_seed_arr
+
+    # Set feed_scale and seed_scale to 1 where ref arrays are close or equal to zero
+    feed_scale = xr.where(np.isclose(ref_feed_arr, 0), 1, feed_scale)
+    seed_scale = xr.where(np.isclose(ref_seed_arr, 0), 1, seed_scale)
+
+    processing_scale = production.sum(dim="Item") \
+                / ref_production.sum(dim="Item")
+
+    return feed_scale, seed_scale, processing_scale
+
+
 def check_negative_source(
         fbs,
         source,
@@ -1435,6 +1798,56 @@ def check_negative_source(
     return fbs
 
 
+def unit_ratio(
+        datablock,
+        fbs
+        ):
+    """Multiplies the food balance sheet of the datablock by a ratio of ones
+    with the coordinates of fbs.
+
+    Nodes which scale the food balance sheet by the ratio of two versions of
+    fbs add the coordinates of fbs to it, which their neutral stubs do with
+    this function."""
+
+    datablock["food"]["g/cap/day"] *= xr.ones_like(fbs)
+
+
+def neutral_food_supply(
+        fbs
+        ):
+    """Checks that the food production nodes leave a food balance sheet
+    unchanged at their neutral parameter values.
+
+    This holds if production and imports have no negative values for the
+    negative source checks to move, if no element has infinite values and if
+    the total production of each year is non-zero, so that the feed, seed and
+    processing scaling factors are one."""
+
+    if np.any(fbs["production"].values < 0) or np.any(fbs["imports"].values < 0):
+        return False
+
+    if any(np.any(np.isinf(fbs[element].values)) for element in fbs.data_vars):
+        return False
+
+    return bool(np.all(fbs["production"].sum(dim="Item").values != 0))
+
+
+def append_sequestration(
+        datablock,
+        seq_da
+        ):
+    """Appends sequestration sources to the co2e_sequestration array of the
+    datablock, creating it if needed"""
+
+    if "co2e_sequestration" not in datablock["impact"]:
+        datablock["impact"]["co2e_sequestration"] = seq_da
+    else:
+        # append sequestration to existing sequestration da
+        seq_da_in = datablock["impact"]["co2e_sequestration"]
+        seq_da = xr.concat([seq_da_in, seq_da], dim="Item")
+        datablock["impact"]["co2e_sequestration"] = seq_da
+
+
 def logistic_food_supply(
         fbs,
         timescale,
@@ -1484,6 +1897,8 @@ def scale_kcal_feed(
     return out
 
 
+@node_io(reads=[_FOOD, _FOOD_BASELINE, ("land", "percentage_land_use")],
+         writes=_LAND)
 def production_land_scale(
         datablock,
         bdleaf_conif_ratio
@@ -1491,9 +1906,10 @@ def production_land_scale(
     """Scales land based on the relative production change of livestock and
     arable crops"""
 
-    land = datablock["land"]["percentage_land_use"].copy(deep=True)
-    obs = datablock["food"]["g/cap/day"].copy(deep=True)
-    ref = datablock["food"]["baseline_projected"].copy(deep=True)
+    precision = land_precision(datablock["land"]["percentage_land_use"])
+    land = decode_land(datablock["land"]["percentage_land_use"])
+    obs = datablock["food"]["g/cap/day"]
+    ref = datablock["food"]["baseline_projected"]
 
     # Obtain reference and observed production values
     ref_livest = ref["production"].sel(Year=2050, Item=ref.Item_origin=="Animal Products").sum(dim="Item")
@@ -1535,11 +1951,31 @@ def production_land_scale(
     else:
         land.loc[{"aggregate_class":"Coniferous woodland"}] = delta*(1-bdleaf_conif_ratio)
 
-    datablock["land"]["percentage_land_use"] = land
+    set_land_use(datablock, land, precision)
 
     return datablock
 
 
+def managed_agricultural_land_carbon_model_neutral(
+        datablock,
+        fraction,
+        managed_class,
+        old_class
+        ):
+    """Neutral managed_agricultural_land_carbon_model node, see
+    neutral.neutral_values"""
+
+    if np.isscalar(managed_class):
+        managed_class = [managed_class]
+
+    add_land_classes(datablock, managed_class)
+
+    return datablock
+
+
+@neutral_values(stub=managed_agricultural_land_carbon_model_neutral, fraction=0)
+@node_io(reads=_LAND,
+         writes=_LAND)
 def managed_agricultural_land_carbon_model(
         datablock,
         fraction,
@@ -1557,7 +1993,9 @@ def managed_agricultural_land_carbon_model(
         old_class = [old_class]
 
     # Load land use data from datablock
-    pctg = datablock["land"]["percentage_land_use"].copy(deep=True)
+    precision = land_precision(datablock["land"]["percentage_land_use"])
+    pctg = decode_land(datablock["land"]["percentage_land_use"])
+    totals = land_totals(datablock)
 
     # Create new category for "managed arable" land
     for new_class_name in managed_class:
@@ -1575,12 +2013,15 @@ def managed_agricultural_land_carbon_model(
     delta_arable = pctg.loc[{"aggregate_class":old_class}] * fraction
     pctg.loc[{"aggregate_class":old_class}] -= delta_arable
     pctg.loc[{"aggregate_class":managed_class}] += delta_arable.sum(dim="aggregate_class")
+    totals = transfer_totals(totals, delta_arable, managed_class)
 
     # Rewrite land use data to datablock
-    datablock["land"]["percentage_land_use"] = pctg
+    set_land_use(datablock, pctg, precision, totals)
     return datablock
 
 
+@node_io(reads=[_TIMESCALE, _FOOD, ("land", "percentage_land_use")],
+         writes=_LAND)
 def zero_land_farming_model(
         datablock,
         fraction,
@@ -1593,14 +2034,15 @@ def zero_land_farming_model(
     This ignores any item passed which is not a Vegetal Product.
     """
 
-    food_orig = datablock["food"]["g/cap/day"].copy(deep=True)
+    food_orig = datablock["food"]["g/cap/day"]
 
     items = get_items(food_orig, items)
 
     timescale = datablock["global_parameters"]["timescale"]
 
     # Load land use data from datablock
-    pctg = datablock["land"]["percentage_land_use"].copy(deep=True)
+    precision = land_precision(datablock["land"]["percentage_land_use"])
+    pctg = decode_land(datablock["land"]["percentage_land_use"])
 
     # Load production data from datablock
     plant_items = food_orig.sel(Item=food_orig.Item_origin=="Vegetal Products").Item.values
@@ -1626,11 +2068,26 @@ def zero_land_farming_model(
     pctg.loc[{"aggregate_class":"Broadleaf woodland"}] += delta_arable * bdleaf_conif_ratio
     pctg.loc[{"aggregate_class":"Coniferous woodland"}] += delta_arable * (1-bdleaf_conif_ratio)
 
-    datablock["land"]["percentage_land_use"] = pctg
+    set_land_use(datablock, pctg, precision)
+
+    return datablock
+
+
+def extra_urban_farming_neutral(
+        datablock,
+        **params
+        ):
+    """Neutral extra_urban_farming node, see neutral.neutral_values"""
+
+    if not neutral_food_supply(datablock["food"]["g/cap/day"]):
+        return extra_urban_farming(datablock, **params)
 
     return datablock
 
 
+@neutral_values(stub=extra_urban_farming_neutral, fraction=0)
+@node_io(reads=[_TIMESCALE, _FOOD, _FOOD_BASELINE],
+         writes=[_FOOD])
 def extra_urban_farming(
         datablock,
         fraction,
@@ -1668,6 +2125,42 @@ def extra_urban_farming(
     return datablock
 
 
+def mixed_farming_model_neutral(
+        datablock,
+        fraction,
+        prod_scale_factor,
+        items,
+        secondary_items,
+        secondary_prod_scale_factor,
+        land_type=["Arable",
+                   "Managed arable"],
+        secondary_land_type=["Improved grassland",
+                             "Semi-natural grassland",
+                             "Managed pasture"],
+        new_land_type="Mixed farming"
+        ):
+    """Neutral mixed_farming_model node, see neutral.neutral_values"""
+
+    totals = land_totals(datablock)
+    old_use = totals.loc[{"aggregate_class":land_type}].sum().to_numpy()
+    secondary_use = totals.loc[{"aggregate_class":secondary_land_type}].sum().to_numpy()
+
+    if not (neutral_food_supply(datablock["food"]["g/cap/day"])
+            and np.isfinite(prod_scale_factor) and np.isfinite(secondary_prod_scale_factor)
+            and np.isfinite(old_use) and old_use != 0
+            and np.isfinite(secondary_use) and secondary_use != 0):
+        return mixed_farming_model(datablock, fraction, prod_scale_factor, items,
+                                   secondary_items, secondary_prod_scale_factor, land_type,
+                                   secondary_land_type, new_land_type)
+
+    add_land_classes(datablock, [new_land_type])
+
+    return datablock
+
+
+@neutral_values(stub=mixed_farming_model_neutral, fraction=0)
+@node_io(reads=[_TIMESCALE, _FOOD, *_LAND],
+         writes=[_FOOD, *_LAND])
 def mixed_farming_model(
         datablock,
         fraction,
@@ -1692,10 +2185,38 @@ def mixed_farming_model(
     items.
     """
 
+    steps = mixed_farming_model_steps(datablock, fraction, prod_scale_factor, items,
+                                      secondary_items, secondary_prod_scale_factor,
+                                      land_type, secondary_land_type, new_land_type)
+    datablock["food"]["g/cap/day"] = apply_production_steps(datablock["food"]["g/cap/day"],
+                                                            [steps])
+
+    return datablock
+
+
+def mixed_farming_model_steps(
+        datablock,
+        fraction,
+        prod_scale_factor,
+        items,
+        secondary_items,
+        secondary_prod_scale_factor,
+        land_type=["Arable",
+                   "Managed arable"],
+        secondary_land_type=["Improved grassland",
+                             "Semi-natural grassland",
+                             "Managed pasture"],
+        new_land_type="Mixed farming"
+        ):
+    """Updates the land use as mixed_farming_model does and returns the
+    production scaling steps of the node, see apply_production_steps."""
+
     # Load land use data from datablock
-    old_land = datablock["land"]["percentage_land_use"]
-    pctg = datablock["land"]["percentage_land_use"].copy(deep=True)
-    food_orig = datablock["food"]["g/cap/day"].copy(deep=True)
+    precision = land_precision(datablock["land"]["percentage_land_use"])
+    pctg = decode_land(datablock["land"]["percentage_land_use"])
+    totals = land_totals(datablock)
+    old_use = totals.loc[{"aggregate_class":land_type}].sum()
+    food_orig = datablock["food"]["g/cap/day"]
     timescale = datablock["global_parameters"]["timescale"]
 
     # Create new category for "mixed farming" land
@@ -1708,9 +2229,10 @@ def mixed_farming_model(
     delta_arable = pctg.loc[{"aggregate_class":land_type}] * fraction
     pctg.loc[{"aggregate_class":land_type}] -= delta_arable
     pctg.loc[{"aggregate_class":new_land_type}] += delta_arable.sum(dim="aggregate_class")
+    totals = transfer_totals(totals, delta_arable, new_land_type)
 
     # Compute relative change in arable land
-    mixed_farm_frac = delta_arable.sum() / old_land.loc[{"aggregate_class":land_type}].sum()
+    mixed_farm_frac = land_sum(delta_arable) / old_use
     arable_scale = 1 - mixed_farm_frac + mixed_farm_frac * prod_scale_factor
     arable_scale = arable_scale.values
 
@@ -1720,35 +2242,20 @@ def mixed_farming_model(
 
     scale = logistic_food_supply(food_orig, timescale, 1, arable_scale)
 
-    out = food_orig.fbs.scale_add(element_in="production",
-                                  element_out="imports",
-                                  scale=scale,
-                                  items=items,
-                                  add=False)
-
     # Compute relative change in secondary items
     # Get relative new area of mixed farming to secondary producing area
-    total_area_secondary = pctg.loc[{"aggregate_class":secondary_land_type}].sum()
-    mixed_farm_to_secondary_ratio = delta_arable.sum() / total_area_secondary
+    total_area_secondary = totals.loc[{"aggregate_class":secondary_land_type}].sum()
+    mixed_farm_to_secondary_ratio = land_sum(delta_arable) / total_area_secondary
     secondary_ratio = 1 + mixed_farm_to_secondary_ratio * secondary_prod_scale_factor
     secondary_ratio = secondary_ratio.values
 
     secondary_scale = logistic_food_supply(food_orig, timescale, 1, secondary_ratio)
 
-    out = out.fbs.scale_add(element_in="production",
-                                  element_out="exports",
-                                  scale=secondary_scale,
-                                  items=secondary_items,
-                                  add=True)
-
-
     # Update land use data to datablock
-    datablock["land"]["percentage_land_use"] = pctg
+    set_land_use(datablock, pctg, precision, totals)
 
-    # Rewrite food data datablock
-    datablock["food"]["g/cap/day"] = out
-
-    return datablock
+    return [("scale_add", "production", "imports", scale, items, False),
+            ("scale_add", "production", "exports", secondary_scale, secondary_items, True)]
 
 
 def get_items(
@@ -1763,6 +2270,25 @@ def get_items(
     return items
 
 
+def shift_production_neutral(
+        datablock,
+        scale,
+        items,
+        items_target,
+        land_area_ratio
+        ):
+    """Neutral shift_production node, see neutral.neutral_values"""
+
+    if not (neutral_food_supply(datablock["food"]["g/cap/day"])
+            and np.all(np.isfinite(land_area_ratio))):
+        return shift_production(datablock, scale, items, items_target, land_area_ratio)
+
+    return datablock
+
+
+@neutral_values(stub=shift_production_neutral, scale=0)
+@node_io(reads=[_TIMESCALE, _FOOD],
+         writes=[_FOOD])
 def shift_production(
         datablock,
         scale,
@@ -1793,8 +2319,25 @@ def shift_production(
         items being scaled.
     """
 
+    steps = shift_production_steps(datablock, scale, items, items_target, land_area_ratio)
+    datablock["food"]["g/cap/day"] = apply_production_steps(datablock["food"]["g/cap/day"],
+                                                            [steps])
+
+    return datablock
+
+
+def shift_production_steps(
+        datablock,
+        scale,
+        items,
+        items_target,
+        land_area_ratio
+        ):
+    """Returns the production scaling steps of a shift_production node, see
+    apply_production_steps."""
+
     # Load food data from datablock
-    food_orig = datablock["food"]["g/cap/day"].copy(deep=True)
+    food_orig = datablock["food"]["g/cap/day"]
     timescale = datablock["global_parameters"]["timescale"]
 
     items = get_items(food_orig, items)
@@ -1806,33 +2349,224 @@ def shift_production(
     scale_target = 1 - land_area_ratio * scale
     scale_target = logistic_food_supply(food_orig, timescale, 1, scale_target)
 
-    # Scale production quantities
+    # Scale production quantities, then check for negative sources and correct
+    return [("scale_add", "production", "imports", scale_items, items, False),
+            ("scale_add", "production", "imports", scale_target, items_target, False),
+            ("negative", "imports", "exports", False)]
 
-    out = food_orig.fbs.scale_add(element_in="production",
-                                element_out="imports",
-                                scale=scale_items,
-                                items=items,
-                                add=False)
 
-    out = out.fbs.scale_add(element_in="production",
-                            element_out="imports",
-                            scale=scale_target,
-                            items=items_target,
-                            add=False)
+# ---- Production scaling pass ----
 
-    # Check for negative sources and correct
-    out = check_negative_source(out, "imports", "exports", add=False)
+def apply_production_steps(
+        food,
+        node_steps
+        ):
+    """Applies the production scaling steps of a sequence of nodes to a food
+    balance sheet, in a single pass over its arrays.
+
+    Each step is a tuple with the name of an operation and its arguments:
+
+    ("scale_add", element_in, element_out, scale, items, add)
+        Scales element_in for the items and adds the difference to
+        element_out, as food.fbs.scale_add.
+    ("feed_scale", source)
+        Scales the feed, seed and processing quantities to the change in
+        production since the start of the node, as feed_scale.
+    ("negative", source, fallback, add)
+        Moves the negative values of source to fallback, as
+        check_negative_source.
+    ("ratio",)
+        Multiplies the elements at the start of the node by the ratio of the
+        current elements to them, replacing nan ratios by 1, as
+        scale_production.
+
+    The operations are made on the element arrays with the same arithmetic
+    as the functions above, so the result is identical to that of the nodes
+    run in turn, without building a Dataset for each of them.
 
-    # Rewrite food data to datablock and return
-    datablock["food"]["g/cap/day"] = out
+    Parameters
+    ----------
+    food : xarray.Dataset
+        Food balance sheet.
+    node_steps : list of list of tuple
+        Production scaling steps of each node, in order.
+
+    Returns
+    -------
+    food : xarray.Dataset
+        Food balance sheet with the scaled elements.
+    """
+
+    values = {name: food[name].values for name in food.data_vars}
+
+    for steps in node_steps:
+        start = dict(values)
+        for step in steps:
+            operation, args = step[0], step[1:]
+            if operation == "scale_add":
+                _scale_add_values(food, values, *args)
+
+            elif operation == "feed_scale":
+                source, = args
+                scales = feed_scale_factors(food["production"].copy(data=values["production"]),
+                                            food["production"].copy(data=start["production"]))
+                for element, scale in zip(["feed", "seed", "processing"], scales):
+                    _scale_add_values(food, values, element, source, scale, None, True)
+
+            elif operation == "negative":
+                _negative_values(values, *args)
+
+            elif operation == "ratio":
+                for name, value in values.items():
+                    if value is not start[name]:
+                        with np.errstate(divide="ignore", invalid="ignore"):
+                            ratio = value / start[name]
+                            ratio = np.where(np.isnan(ratio), 1, ratio)
+                            values[name] = start[name] * ratio
+
+            else:
+                raise ValueError(f"Unknown production scaling step {operation}")
+
+    return food.copy(data=values)
+
+
+def _scale_add_values(
+        food,
+        values,
+        element_in,
+        element_out,
+        scale,
+        items,
+        add
+        ):
+    """Applies a scale_add step to the element arrays"""
+
+    dims = food[element_in].dims
+
+    index = [slice(None)] * len(dims)
+    if items is not None:
+        if np.isscalar(items):
+            items = [items]
+        positions = food.get_index("Item").get_indexer(items)
+        if np.any(positions < 0):
+            raise KeyError(f"Items not found in the food balance sheet: " \
+                           f"{np.asarray(items)[positions < 0]}")
+        index[dims.index("Item")] = positions
+    index = tuple(index)
+
+    if isinstance(scale, xr.DataArray):
+        scale = scale.sel({dim: food[dim].values for dim in scale.dims})
+        scale = scale.expand_dims([dim for dim in dims if dim not in scale.dims])
+        scale = scale.transpose(*dims).values
+
+    # Copies keep the memory layout of the elements, which sets the order of
+    # the sums over items of feed_scale
+    old = values[element_in]
+    new = old.copy(order="K")
+    new[index] = old[index] * scale
+
+    # The integer sign promotes the difference as in scale_add
+    dif = np.where(np.isnan(old), 0, old) - np.where(np.isnan(new), 0, new)
+    values[element_out] = values[element_out] + np.where(add, -1, 1) * dif
+    values[element_in] = new
+
+
+def _negative_values(
+        values,
+        source,
+        fallback,
+        add
+        ):
+    """Applies a negative source check step to the element arrays"""
+
+    delta_neg = np.where(values[source] < 0, values[source], 0)
+
+    # Updated in place, keeping the types of the elements
+    source_values = values[source].copy(order="K")
+    source_values -= delta_neg
+    fallback_values = values[fallback].copy(order="K")
+    if add:
+        fallback_values += delta_neg
+    else:
+        fallback_values -= delta_neg
+
+    values[source], values[fallback] = source_values, fallback_values
+
+
+# Nodes scaling the food production, mapped to the function updating the land
+# use as the node does and returning its production scaling steps
+PRODUCTION_STEPS = {
+    BECCS_farm_land: BECCS_farm_land_steps,
+    peatland_restoration: peatland_restoration_steps,
+    mixed_farming_model: mixed_farming_model_steps,
+    scale_production: scale_production_steps,
+    shift_production: shift_production_steps,
+    }
+
+
+def _member_paths(params, node_paths):
+    paths = []
+    for node, node_params in zip(params["nodes"], params["params"]):
+        paths.extend(path for path in node_paths(node, node_params) if path not in paths)
+    return paths
+
+
+@node_io(reads=lambda params: _member_paths(params, node_reads),
+         writes=lambda params: _member_paths(params, node_writes))
+def production_pass(
+        datablock,
+        nodes,
+        params
+        ):
+    """Runs a sequence of nodes, applying the production scaling steps of the
+    nodes listed in PRODUCTION_STEPS in a single pass after the last node.
+
+    The land use of each node is updated in order. The other nodes of the
+    sequence must not read or write the food balance sheet. The result is
+    identical to that of the nodes run in turn.
+
+    Parameters
+    ----------
+    datablock : dict
+        The datablock dictionary.
+    nodes : list of callable
+        Nodes of the sequence.
+    params : list of dict
+        Parameters of each node.
+    """
+
+    node_steps = []
+    for node, node_params in zip(nodes, params):
+        if node in PRODUCTION_STEPS:
+            node_steps.append(PRODUCTION_STEPS[node](datablock, **node_params))
+        else:
+            datablock = node(datablock=datablock, **node_params)
+
+    datablock["food"]["g/cap/day"] = apply_production_steps(datablock["food"]["g/cap/day"],
+                                                            node_steps)
 
     return datablock
 
 
+@node_io(reads=[("food",), _POPULATION, ("advanced_settings",), ("run_params",),
+                ("impact", "g_co2e/year"), ("impact", "g_co2e/year_land"), _SEQUESTRATION,
+                *_LAND, ("land", "baseline_class_totals"), ("land", "baseline")],
+         writes=[*_QTY_KEYS[1:], ("food", "kton/year"), ("metrics",)])
 def compute_metrics(
-        datablock
+        datablock,
+        run_params=None
         ):
-    """Computes a series of metrics from the resulting datablock"""
+    """Computes a series of metrics from the resulting datablock
+
+    Parameters
+    ----------
+    run_params : dict, optional
+        Slider values of the run. Defaults to the "run_params" entry of the
+        datablock.
+    """
+
+    if run_params is None:
+        run_params = datablock["run_params"]
 
     datablock["metrics"] = {}
 
@@ -1928,8 +2662,8 @@ def compute_metrics(
 
     dairy_herd_beef = datablock["advanced_settings"]["dairy_herd_beef"]
     # Read total population from datablock
-    pop_baseline = datablock["population"]["population"].sel(Region = 826, Year=2020)
-    pop_new = datablock["population"]["population"].sel(Region = 826)
+    pop_baseline = datablock["population"]["population"].isel(Region = 0).sel(Year=2020)
+    pop_new = datablock["population"]["population"].isel(Region = 0)
 
     # Dairy herd
 
@@ -2001,26 +2735,26 @@ def compute_metrics(
             datablock["metrics"]["livestock"] = xr.concat([datablock["metrics"]["livestock"], da], dim="Item")
 
     # Land use
-    pctg = datablock["land"]["percentage_land_use"]
-    totals = pctg.sum(dim=["x", "y"])
+    totals = land_totals(datablock)
+    baseline_totals = land_totals(datablock, "baseline")
 
     total_pasture = totals.sel(aggregate_class=["Improved grassland",
                                                 "Semi-natural grassland",
                                                 "Managed pasture",
                                                 "Silvopasture"]).sum().values
 
-    baseline_pasture = datablock["land"]["baseline"].sel(aggregate_class=["Improved grassland",
-                                                                          "Semi-natural grassland"]).sum().values
+    baseline_pasture = baseline_totals.sel(aggregate_class=["Improved grassland",
+                                                         "Semi-natural grassland"]).sum().values
 
     total_forest = totals.sel(aggregate_class=["Broadleaf woodland",
                                                "Coniferous woodland",
                                                "New Broadleaf woodland",
                                                "New Coniferous woodland"]).sum().values
 
-    new_forest_land = (total_forest - datablock["land"]["baseline"].sel(aggregate_class=["Broadleaf woodland", "Coniferous woodland"]).sum().values)
+    new_forest_land = (total_forest - baseline_totals.sel(aggregate_class=["Broadleaf woodland", "Coniferous woodland"]).sum().values)
 
-    baseline_forest = datablock["land"]["baseline"].sel(aggregate_class=["Broadleaf woodland",
-                                                                         "Coniferous woodland"]).sum().values
+    baseline_forest = baseline_totals.sel(aggregate_class=["Broadleaf woodland",
+                                                        "Coniferous woodland"]).sum().values
 
     total_arable = totals.sel(aggregate_class=["Arable",
                                                "Managed arable",
@@ -2032,14 +2766,14 @@ def compute_metrics(
     total_mixed_farming = totals.sel(aggregate_class="Mixed farming").sum().values
     total_beccs = totals.sel(aggregate_class=["Bioenergy crops (pasture)", "Bioenergy crops (arable)"]).sum().values
 
-    if datablock["run_params"]["land_BECCS_pasture"] + datablock["run_params"]["land_BECCS"] != 0:
-        beccs_on_pasture = total_beccs * datablock["run_params"]["land_BECCS_pasture"] / (datablock["run_params"]["land_BECCS_pasture"] + datablock["run_params"]["land_BECCS"])
-        beccs_on_arable = total_beccs * datablock["run_params"]["land_BECCS"] / (datablock["run_params"]["land_BECCS_pasture"] + datablock["run_params"]["land_BECCS"])
+    if run_params["land_BECCS_pasture"] + run_params["land_BECCS"] != 0:
+        beccs_on_pasture = total_beccs * run_params["land_BECCS_pasture"] / (run_params["land_BECCS_pasture"] + run_params["land_BECCS"])
+        beccs_on_arable = total_beccs * run_params["land_BECCS"] / (run_params["land_BECCS_pasture"] + run_params["land_BECCS"])
     else:
         beccs_on_pasture = 0
         beccs_on_arable = 0
 
-    baseline_arable = datablock["land"]["baseline"].sel(aggregate_class=["Arable"]).sum().values
+    baseline_arable = baseline_totals.sel(aggregate_class=["Arable"]).sum().values
 
     new_arable_land_pctg = (total_arable - baseline_arable) / baseline_arable * 100
     new_pasture_land_pctg = (total_pasture - baseline_pasture) / baseline_pasture * 100
@@ -2089,7 +2823,7 @@ def compute_metrics(
     datablock["metrics"]["new_cereal_area"] = new_cereal_area
 
     baseline_horticulture_area_mha = datablock["advanced_settings"]["baseline_horticulture_area"]
-    new_horiticulture_area = baseline_horticulture_area_mha * total_arable / baseline_arable * (1+datablock["run_params"]["horticulture"]/100)
+    new_horiticulture_area = baseline_horticulture_area_mha * total_arable / baseline_arable * (1+run_params["horticulture"]/100)
     datablock["metrics"]["new_horticulture_area"] = new_horiticulture_area
 
     other_crops_area_mha = total_arable/1e6 - new_potato_area - new_oilseed_area - new_cereal_area - new_horiticulture_area
@@ -2097,7 +2831,7 @@ def compute_metrics(
 
     # Food balance sheet
 
-    population = datablock["population"]["population"].sel(Region=826)
+    population = datablock["population"]["population"].isel(Region=0)
     food_qty = datablock["food"]["g/cap/day"]
 
     datablock["food"]["kton/year"] = food_qty * population / 1e6 * 365.25
@@ -2105,12 +2839,15 @@ def compute_metrics(
     return datablock
 
 
+@node_io(reads=[("land", "percentage_land_use"), ("land", "baseline")],
+         writes=_LAND)
 def label_new_forest(
         datablock
         ):
 
-    land = datablock["land"]["percentage_land_use"].copy(deep=True)
-    land_baseline = datablock["land"]["baseline"].copy(deep=True)
+    precision = land_precision(datablock["land"]["percentage_land_use"])
+    land = decode_land(datablock["land"]["percentage_land_use"])
+    land_baseline = decode_land(datablock["land"]["baseline"], copy=False)
 
     if "New Broadleaf woodland" not in land.aggregate_class.values:
         new_class = xr.zeros_like(land.isel(aggregate_class=0)).where(np.isfinite(land.isel(aggregate_class=0)))
@@ -2135,24 +2872,30 @@ def label_new_forest(
         # Limit "Broadleaf woodland" to the baseline model
         land.loc[{"aggregate_class": w_type}] = land_baseline.sel(aggregate_class=w_type).where(new_w_mask, land.sel(aggregate_class=w_type))
 
-    datablock["land"]["percentage_land_use"] = land
+    set_land_use(datablock, land, precision)
 
     return datablock
 
 
+@node_io(reads=[("run_params",)],
+         writes=[("URL",)])
 def generate_API_url(
         datablock,
         base_url="https://sarahjp-hack.streamlit.app/?",
-        keys=None
+        keys=None,
+        run_params=None
         ):
     """Generates a URL for the current model run"""
 
+    if run_params is None:
+        run_params = datablock["run_params"]
+
     url = base_url
 
     if keys is None:
         keys = []
     for key in keys:
-        url += f"{key}={datablock['run_params'][key]}&"
+        url += f"{key}={run_params[key]}&"
 
     datablock["URL"] = url
 
@@ -0,0 +1,129 @@
+"""Neutral parameter values of the model nodes.
+
+At many slider positions, such as the default ones, model nodes change
+nothing: a scale_impact node with a zero scale factor or a BECCS_farm_land
+node converting no land return the datablock they were given, after copying
+arrays and running the xarray operations anyway. Model nodes declare the
+parameter values for which they are neutral with the neutral_values
+decorator, along with a stub doing the bookkeeping the node still does, such
+as adding its land use class or its zero sequestration row.
+eliminate_neutral_nodes replaces the neutral nodes of a pipeline by their
+stubs before it runs, keeping the indices of all the nodes.
+
+Stubs give the same datablock as the node. Where this only holds for some
+inputs, such as food balance sheets without negative imports, the stub checks
+its inputs and runs the node if needed. Stubs also check the parameters they
+are run with, and run the node when they are no longer neutral, such as when
+they were changed with set_node_parameter after the pipeline was built.
+"""
+
+import functools
+
+import numpy as np
+
+from .node_io import is_declared, node_defaults
+
+
+def neutral_values(stub=None, **values):
+    """Decorator declaring the parameter values for which a node is neutral.
+
+    Applied above node_io, so that the stub shares the datablock paths the
+    node declares.
+
+    Parameters
+    ----------
+    stub : callable, optional
+        Function run in place of the node when it is neutral, with the same
+        parameters, returning the datablock. If None, the datablock is
+        returned unchanged.
+    **values
+        Neutral value of each parameter. A node is neutral if all of these
+        parameters take their neutral value. Parameters given as lists are
+        neutral if all their elements are.
+
+    Returns
+    -------
+    decorator : callable
+        Decorator storing the values in the neutral attribute of the node
+        function, and the stub in its neutral_stub attribute, wrapped so that
+        it runs the node when its parameters are not neutral. The node
+        function is returned unchanged.
+    """
+
+    def decorator(func):
+        func.neutral = values
+        func.neutral_stub = _checked_stub(func, stub)
+        return func
+
+    return decorator
+
+
+def _checked_stub(node, stub):
+    """Returns the stub run in place of a neutral node, which runs the node
+    instead if its parameters are not neutral"""
+
+    def checked_stub(datablock, **params):
+        if not is_neutral(node, params):
+            return node(datablock=datablock, **params)
+        if stub is None:
+            return datablock
+        return stub(datablock=datablock, **params)
+
+    if stub is not None:
+        checked_stub = functools.wraps(stub)(checked_stub)
+    else:
+        # Stubs are identified by their qualified name in the cache keys
+        checked_stub.__module__ = node.__module__
+        checked_stub.__name__ = f"{node.__name__}_neutral"
+        checked_stub.__qualname__ = f"{node.__qualname__}_neutral"
+
+    if is_declared(node):
+        checked_stub.reads, checked_stub.writes = node.reads, node.writes
+
+    return checked_stub
+
+
+def is_neutral(node, params):
+    """Returns True if a node is neutral with the given parameters"""
+
+    values = getattr(node, "neutral", None)
+    if not values:
+        return False
+
+    defaults = node_defaults(node)
+    for name, value in values.items():
+        param = params.get(name, defaults.get(name))
+        try:
+            if not np.all(np.asarray(param, dtype=float) == value):
+                return False
+        except (TypeError, ValueError):
+            return False
+
+    return True
+
+
+def eliminate_neutral_nodes(pipeline):
+    """Replaces the neutral nodes of a pipeline by their stubs.
+
+    Skipped nodes are left as they are. Stubs keep the name, index and
+    parameters of the node they replace, so that the node list can be used
+    as before, and run the node if its parameters are changed to non-neutral
+    values.
+
+    Parameters
+    ----------
+    pipeline : Pipeline
+        Pipeline whose node list is compiled, before it runs.
+
+    Returns
+    -------
+    pipeline : Pipeline
+        The same pipeline, with the stubs of its neutral nodes.
+    """
+
+    pipeline.nodes = [node.neutral_stub if not node_skip and is_neutral(node, node_params)
+                      else node
+                      for node, node_params, node_skip in zip(pipeline.nodes, pipeline.params,
+                                                              pipeline.skip)]
+
+    return pipeline
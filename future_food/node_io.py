@@ -0,0 +1,164 @@
+"""Declared inputs and outputs of the model nodes.
+
+Model nodes declare the datablock entries they read and write as paths, the
+successive keys used to reach an entry from the datablock. For example
+("food", "g/cap/day") is the food quantities dataset, ("food", "g/cap/day",
+"Year") only its Year coordinate and ("metrics",) the whole metrics section.
+
+A path element written as "{name}" is replaced by the value of the node
+parameter called name, such as the key of an optional land mask. Paths whose
+parameter is None are left out. Nodes whose paths depend on their parameters
+in other ways, such as the nodes running other nodes, declare them as
+functions of the node parameters returning the paths.
+"""
+
+import inspect
+
+MISSING = "<missing>"
+
+
+def node_io(reads=(), writes=()):
+    """Decorator declaring the datablock paths read and written by a node.
+
+    Parameters
+    ----------
+    reads : list of tuple or callable
+        Paths of the datablock entries the node reads, or function of the
+        node parameters returning them.
+    writes : list of tuple or callable
+        Paths of the datablock entries the node adds or replaces, or function
+        of the node parameters returning them.
+
+    Returns
+    -------
+    decorator : callable
+        Decorator storing the paths in the reads and writes attributes of the
+        node function, which is returned unchanged.
+    """
+
+    def decorator(func):
+        func.reads = reads if callable(reads) else [tuple(path) for path in reads]
+        func.writes = writes if callable(writes) else [tuple(path) for path in writes]
+        return func
+
+    return decorator
+
+
+def is_declared(node):
+    """Returns True if a node declares its datablock inputs and outputs"""
+    return hasattr(node, "reads") and hasattr(node, "writes")
+
+
+def node_reads(node, params):
+    """Returns the paths read by a node with the given parameters"""
+    return resolve_paths(_declared(node.reads, params), params)
+
+
+def node_writes(node, params):
+    """Returns the paths written by a node with the given parameters"""
+    return resolve_paths(_declared(node.writes, params), params)
+
+
+def node_defaults(node):
+    """Returns the default values of the parameters of a node"""
+    return {name: parameter.default
+            for name, parameter in inspect.signature(node).parameters.items()
+            if parameter.default is not inspect.Parameter.empty}
+
+
+def _declared(paths, params):
+    if callable(paths):
+        return [tuple(path) for path in paths(params)]
+    return paths
+
+
+def resolve_paths(paths, params):
+    """Replaces the "{name}" elements of paths by the value of the name
+    parameter, leaving out the paths whose parameter is None"""
+
+    resolved = []
+    for path in paths:
+        elements = []
+        for element in path:
+            if isinstance(element, str) and element.startswith("{") and element.endswith("}"):
+                element = params.get(element[1:-1])
+                if element is None:
+                    break
+            elements.append(element)
+        else:
+            resolved.append(tuple(elements))
+
+    return resolved
+
+
+def read_path(datablock, path):
+    """Returns the entry of a datablock at a path, or MISSING if any of its
+    keys is not found"""
+
+    value = datablock
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return MISSING
+
+    return value
+
+
+def write_path(datablock, path, value):
+    """Stores a value at a path of a datablock, creating the sections leading
+    to it if needed. MISSING values delete the entry instead."""
+
+    section = datablock
+    for key in path[:-1]:
+        if key not in section:
+            section[key] = {}
+        section = section[key]
+
+    if value is MISSING:
+        section.pop(path[-1], None)
+    else:
+        section[path[-1]] = value
+
+
+def overlaps(path, other):
+    """Returns True if one of two paths is a prefix of the other, so that
+    writing to one of them can change the value of the other"""
+
+    n = min(len(path), len(other))
+    return tuple(path[:n]) == tuple(other[:n])
+
+
+def node_dependencies(reads, writes):
+    """Builds the dependency graph of a sequence of nodes.
+
+    Each node depends on the earlier nodes writing an entry it reads or
+    writes, and on the earlier nodes reading an entry it writes, so that
+    running every node after its dependencies gives the same result as
+    running the nodes in sequence.
+
+    Parameters
+    ----------
+    reads : list of list of tuple
+        Paths read by each node. Nodes which do not declare their inputs and
+        outputs should be given [()], which overlaps every path.
+    writes : list of list of tuple
+        Paths written by each node.
+
+    Returns
+    -------
+    dependencies : list of set
+        Indices of the earlier nodes each node depends on.
+    """
+
+    def conflict(paths, others):
+        return any(overlaps(path, other) for path in paths for other in others)
+
+    dependencies = []
+    for j in range(len(reads)):
+        dependencies.append({i for i in range(j)
+                             if conflict(writes[i], reads[j])
+                             or conflict(writes[i], writes[j])
+                             or conflict(reads[i], writes[j])})
+
+    return dependencies
@@ -0,0 +1,332 @@
+"""Pipeline with checkpoints of the intermediate datablocks.
+
+Interactive use runs the same pipeline many times, changing the parameters of
+a few nodes at a time. ModelPipeline stores a copy-on-write checkpoint of the
+datablock after each node, keyed by the initial datablock and the parameters
+of all the nodes up to that one. A new run resumes from the checkpoint of the
+last node whose parameters, and those of all the nodes before it, are
+unchanged, so only the nodes from the first changed one onwards are run.
+
+Nodes declaring their inputs and outputs with node_io can also be memoized
+individually, under a fingerprint of the entries they read and of their
+parameters. A node whose inputs are unchanged then reuses its stored outputs
+even if an earlier node had different parameters, for example when a slider
+only changes the land nodes of a run and not the food nodes after them.
+
+The same declarations define which nodes are independent of each other. With
+more than one worker, nodes are run on a thread pool as soon as the nodes
+writing their inputs have finished, and after the earlier nodes reading or
+writing their outputs, so that results are identical to a sequential run.
+NumPy releases the GIL during most array operations, so independent nodes run
+concurrently. Pipelines run on a single worker by default: the nodes of the
+calculator pipeline mostly depend on each other, and its runs gain little or
+nothing from more workers.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import xarray as xr
+
+from agrifoodpy.pipeline import Pipeline
+
+from .cache import LRUCache, fingerprint
+from .datablock_utils import _is_section, copy_datablock, freeze
+from .node_io import (is_declared, node_dependencies, node_reads, node_writes,
+                      read_path, write_path)
+
+# Bound of the total size of the distinct arrays of checkpoint caches, as
+# checkpoints share most of their arrays with each other. A run of the
+# calculator pipeline adds about 300 MiB of new arrays, mostly land use grids,
+# so this keeps the checkpoints of the last one or two runs
+CHECKPOINT_BYTES = 512 * 2**20
+
+checkpoint_cache = LRUCache(maxsize=None, maxbytes=CHECKPOINT_BYTES, shared=True)
+
+# Outputs of individual nodes, bounded by their total size. The land nodes
+# store about 300 MiB of land use grids per run of the calculator pipeline
+node_output_cache = LRUCache(maxsize=None, maxbytes=1024 * 2**20)
+
+
+class ModelPipeline(Pipeline):
+    """Pipeline resuming its runs from checkpointed datablocks.
+
+    Nodes must only depend on the datablock and on their parameters, and must
+    store their results as new arrays instead of modifying the arrays of the
+    datablock in place, as the arrays of the checkpoints are shared with the
+    datablock of the pipeline.
+
+    The sections listed in UNKEYED are not part of the checkpoint keys.
+    "run_params" records the slider values of a run for reference, so nodes
+    which use them must receive them through their parameters.
+
+    Parameters
+    ----------
+    datablock : dict, optional
+        Initial datablock.
+    checkpoints : LRUCache, optional
+        Cache in which the checkpoints are stored, preferably one created
+        with shared=True. Defaults to the module checkpoint_cache, which is
+        shared by all pipelines and bounded to 512 MiB. If False, checkpoints
+        are disabled.
+    node_cache : bool or LRUCache, optional
+        Cache in which the outputs of the nodes declaring their inputs and
+        outputs are memoized. If True, the module node_output_cache is used,
+        which is shared by all pipelines. Defaults to False, which disables
+        memoization.
+    profiler : NodeProfiler, optional
+        Profiler recording the time and memory used by each node run.
+    workers : int, optional
+        Number of threads running independent nodes concurrently. Defaults
+        to 1, which runs the nodes in order on the calling thread. Nodes which
+        do not declare their inputs and outputs wait for all the earlier nodes
+        and are waited for by all the later ones. Nodes must update and return
+        the datablock they receive when running on more than one worker, and
+        a ValueError is raised otherwise.
+        Checkpoints are then only stored when no node after the finished ones
+        has started, which may only happen at the end of the run, while the
+        node cache still reuses the outputs of unchanged nodes.
+    """
+
+    UNKEYED = ["run_params"]
+
+    def __init__(
+            self,
+            datablock=None,
+            checkpoints=None,
+            node_cache=False,
+            profiler=None,
+            workers=1
+            ):
+        super().__init__(datablock=datablock)
+        if checkpoints is None:
+            checkpoints = checkpoint_cache
+        if node_cache is True:
+            node_cache = node_output_cache
+        self.checkpoints = checkpoints if checkpoints is not False else None
+        self.node_cache = node_cache if node_cache is not False else None
+        self.profiler = profiler
+        self.workers = workers
+        self.resumed_from = None
+        self.cached_nodes = []
+
+    def checkpoint_keys(self, to_node=None, skip=None):
+        """Returns the checkpoint key of the datablock after each node.
+
+        The key of each node combines the key of the previous node with the
+        function and parameters of the node, and whether it is skipped. The
+        key before the first node is the fingerprint of the initial datablock.
+        """
+
+        if to_node is None:
+            to_node = len(self.nodes)
+
+        key = fingerprint({name: section for name, section in self.datablock.items()
+                           if name not in self.UNKEYED})
+
+        keys = []
+        for i in range(to_node):
+            key = fingerprint([key, self.nodes[i], self.params[i], self._skipped(i, skip)])
+            keys.append(key)
+
+        return keys
+
+    def run(self, from_node=0, to_node=None, skip=None, timing=False):
+        """Runs the pipeline, resuming from the last valid checkpoint.
+
+        Parameters are those of Pipeline.run. Checkpoints are only used when
+        the run starts from the first node. The index of the node the run
+        resumed from is stored in resumed_from, or None if all the nodes ran,
+        and the indices of the nodes whose outputs were taken from the node
+        cache in cached_nodes.
+        """
+
+        if to_node is None:
+            to_node = len(self.nodes)
+
+        pipeline_start_time = time.time()
+        self.resumed_from = None
+        self.cached_nodes = []
+
+        keys = None
+        if self.checkpoints is not None and from_node == 0:
+            keys = self.checkpoint_keys(to_node, skip)
+
+        # ---- Resume from the last checkpoint ----
+        if keys is not None:
+            for i in reversed(range(to_node)):
+                checkpoint = self.checkpoints.get(keys[i])
+                if checkpoint is not None:
+                    datablock = copy_datablock(checkpoint)
+                    datablock.update({name: self.datablock[name] for name in self.UNKEYED
+                                      if name in self.datablock})
+                    self.datablock = datablock
+                    self.resumed_from = i
+                    from_node = i + 1
+                    break
+
+        if timing and self.resumed_from is not None:
+            print(f"Resumed from node {self.resumed_from} checkpoint.")
+
+        # ---- Run the remaining nodes ----
+        if self.profiler is not None:
+            self.profiler.start()
+
+        if self.workers > 1:
+            self._run_concurrent(from_node, to_node, skip, timing, keys)
+            from_node = to_node
+
+        for i in range(from_node, to_node):
+            if self._skipped(i, skip):
+                if timing:
+                    print(f"Node {i:<3}: {self.names[i][:30]:<32} skipped.")
+            else:
+                node_start_time = time.time()
+                self.datablock = self._run_node(i)
+                if timing:
+                    status = "loaded" if i in self.cached_nodes else "executed"
+                    print(f"Node {i:<3}: {self.names[i][:30]:<32} " \
+                          f"{status} in {time.time() - node_start_time:.4f} seconds.")
+
+            if keys is not None:
+                self.checkpoints.put(keys[i], copy_datablock(self.datablock))
+
+        if self.profiler is not None:
+            self.profiler.stop()
+
+        if timing:
+            print(f"Pipeline executed in {time.time() - pipeline_start_time:.4f} seconds.")
+
+    def dependencies(self, nodes):
+        """Returns the nodes each of a list of nodes has to wait for.
+
+        Parameters
+        ----------
+        nodes : list of int
+            Indices of the nodes to run, in order.
+
+        Returns
+        -------
+        dependencies : dict
+            Set of the indices of the nodes each node depends on.
+        """
+
+        reads, writes = [], []
+        for i in nodes:
+            node, params = self.nodes[i], self.params[i]
+            if is_declared(node):
+                reads.append(node_reads(node, params))
+                writes.append(node_writes(node, params))
+            else:
+                reads.append([()])
+                writes.append([()])
+
+        dependencies = node_dependencies(reads, writes)
+
+        return {i: {nodes[j] for j in node_deps} for i, node_deps in zip(nodes, dependencies)}
+
+    def _run_concurrent(self, from_node, to_node, skip, timing, keys):
+        nodes = [i for i in range(from_node, to_node) if not self._skipped(i, skip)]
+        waiting = self.dependencies(nodes)
+        done = set(range(to_node)) - set(nodes)
+        running = {}
+        started = set()
+        checkpointed = from_node - 1
+
+        if timing:
+            for i in sorted(done - set(range(from_node))):
+                print(f"Node {i:<3}: {self.names[i][:30]:<32} skipped.")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while waiting or running:
+                for i in [i for i in nodes if i in waiting and not waiting[i]]:
+                    del waiting[i]
+                    started.add(i)
+                    running[executor.submit(self._timed_node, i)] = i
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in sorted(finished, key=running.get):
+                    i = running.pop(future)
+                    elapsed = future.result()
+                    done.add(i)
+                    for node_deps in waiting.values():
+                        node_deps.discard(i)
+                    if timing:
+                        status = "loaded" if i in self.cached_nodes else "executed"
+                        print(f"Node {i:<3}: {self.names[i][:30]:<32} " \
+                              f"{status} in {elapsed:.4f} seconds.")
+
+                # The datablock only matches a checkpoint when no node after
+                # the last of the finished nodes has started
+                last = next(i for i in range(to_node + 1) if i not in done) - 1
+                if keys is not None and last > checkpointed and not running and max(started) <= last:
+                    self.checkpoints.put(keys[last], copy_datablock(self.datablock))
+                    checkpointed = last
+
+    def _timed_node(self, i):
+        node_start_time = time.time()
+        datablock = self._run_node(i)
+        if datablock is not self.datablock:
+            raise ValueError(f"Node {self.names[i]} returned a new datablock, but nodes "
+                             f"must update and return the datablock they receive "
+                             f"when running on more than one worker")
+        return time.time() - node_start_time
+
+    def node_key(self, i):
+        """Returns the node cache key of a node, combining its function and
+        parameters with the current values of the entries it reads"""
+
+        node, params = self.nodes[i], self.params[i]
+        inputs = [read_path(self.datablock, path) for path in node_reads(node, params)]
+
+        return fingerprint([node, params, inputs])
+
+    def _run_node(self, i):
+        if self.profiler is not None:
+            return self.profiler.profile_node(self, i, lambda: self._execute_node(i))
+
+        return self._execute_node(i)
+
+    def _execute_node(self, i):
+        node, params = self.nodes[i], self.params[i]
+        if self.node_cache is None or not is_declared(node):
+            return node(datablock=self.datablock, **params)
+
+        key = self.node_key(i)
+        outputs = self.node_cache.get(key)
+
+        if outputs is not None:
+            for path, value in outputs.items():
+                write_path(self.datablock, path, _share(value))
+            self.cached_nodes.append(i)
+            return self.datablock
+
+        datablock = node(datablock=self.datablock, **params)
+        self.node_cache.put(key, {path: _share(read_path(datablock, path))
+                                  for path in node_writes(node, params)})
+
+        return datablock
+
+    def _skipped(self, i, skip):
+        return bool((skip is not None and (i in skip or self.names[i] in skip)) or self.skip[i])
+
+
+def _share(value):
+    """Returns a copy of a node output sharing its frozen arrays"""
+
+    if _is_section(value):
+        return copy_datablock(value)
+    if isinstance(value, (xr.DataArray, xr.Dataset)):
+        return freeze(value).copy(deep=False)
+
+    return value
+
+
+def clear_checkpoints():
+    """Removes all the checkpoints stored in the module checkpoint cache"""
+    checkpoint_cache.clear()
+
+
+def clear_node_cache():
+    """Removes all the outputs stored in the module node output cache"""
+    node_output_cache.clear()
@@ -1,9 +1,13 @@
 from .model import *
+from .fusion import fuse_nodes
+from .neutral import eliminate_neutral_nodes
 
 def pipeline_setup(
         pipeline,
         params,
         adv_settings,
+        fuse=False,
+        neutral=True
         ):
     """
     pipeline builder 
@@ -14,6 +18,20 @@ def pipeline_setup(
 
     It returns the updated Pipeline object with the functions to be called and
     parameters to be used in the function calling
+
+    If fuse is True, runs of consecutive nodes which can be merged, like the
+    scale_impact nodes, are replaced by single nodes giving the same results,
+    see fusion.fuse_nodes. This shortens the node list and changes the
+    indices and parameters of the merged nodes, so it is disabled by default
+    and must not be used by callers indexing the nodes, such as with
+    set_node_parameter or the skip and from_node arguments of run.
+
+    If neutral is True, nodes whose sliders are at a position where they leave
+    the datablock unchanged are replaced by stubs doing only their
+    bookkeeping, such as adding their land use class, see
+    neutral.eliminate_neutral_nodes. The stubs keep the index, name and
+    parameters of their node, and run it if its parameters are changed to
+    non-neutral values. Neutral nodes are replaced before nodes are fused.
     """
 
     # Store run parameters in the datablock for later use
@@ -281,7 +299,8 @@ def pipeline_setup(
     pipeline.add_node(compute_emissions)
 
     # Compute additional metrics 
-    pipeline.add_node(compute_metrics)
+    pipeline.add_node(compute_metrics,
+                         {"run_params":params})
 
     # Generate pathway URL
     pipeline.add_node(generate_API_url,
@@ -289,7 +308,14 @@ def pipeline_setup(
                              "ruminant",
                              "pig_poultry",
                              "fish_seafood",
-                             ]}
+                             ],
+                          "run_params":params}
     )
 
+    if neutral:
+        pipeline = eliminate_neutral_nodes(pipeline)
+
+    if fuse:
+        pipeline = fuse_nodes(pipeline)
+
     return pipeline
@@ -0,0 +1,253 @@
+"""Per-node profiling of pipeline runs.
+
+A NodeProfiler passed to ModelPipeline records, for every node it runs, the
+wall and CPU time, the peak memory allocated while the node ran, as traced by
+tracemalloc, and the size of the datablock entries the node wrote. Records
+can be exported as Chrome trace-event JSON, to be opened in chrome://tracing
+or Perfetto, or printed as a summary table.
+
+Nodes sharing a function, such as the scale_impact nodes of the calculator
+pipeline, are labeled with the parameters that tell them apart.
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import xarray as xr
+
+from .cache import nbytes
+from .datablock_utils import _is_section
+from .node_io import MISSING, is_declared, node_writes, read_path
+
+# Longest parameter value shown in node labels
+_LABEL_VALUE_LENGTH = 30
+
+
+class NodeProfiler():
+    """Collects timing and memory records of pipeline nodes.
+
+    Parameters
+    ----------
+    memory : bool, optional
+        If True, tracemalloc traces allocations while the pipeline runs,
+        which slows the nodes down. When nodes run concurrently, the peak memory of a
+        node includes the allocations of the nodes running alongside it.
+    """
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.records = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._started_tracing = False
+
+    def clear(self):
+        """Removes all the records"""
+        with self._lock:
+            self.records = []
+
+    def start(self):
+        """Starts tracing allocations, if memory is profiled and they are not
+        traced already. Called by the pipeline before running its nodes."""
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        """Stops tracing allocations, if start began tracing them"""
+
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def profile_node(self, pipeline, i, run):
+        """Runs a node through run() and records its profile.
+
+        Parameters
+        ----------
+        pipeline : ModelPipeline
+            Pipeline the node belongs to.
+        i : int
+            Index of the node in the pipeline.
+        run : callable
+            Function running the node and returning the datablock.
+
+        Returns
+        -------
+        datablock : dict
+            Datablock returned by run.
+        """
+
+        node, params = pipeline.nodes[i], pipeline.params[i]
+        before = {key: _identity(value) for key, value
+                  in _written_entries(pipeline.datablock, node, params).items()}
+
+        memory = self.memory and tracemalloc.is_tracing()
+        if memory:
+            tracemalloc.reset_peak()
+            memory_start = tracemalloc.get_traced_memory()[0]
+
+        cpu_start = time.thread_time()
+        start = time.perf_counter()
+        datablock = run()
+        wall = time.perf_counter() - start
+        cpu = time.thread_time() - cpu_start
+
+        peak = 0
+        if memory:
+            peak = max(tracemalloc.get_traced_memory()[1] - memory_start, 0)
+
+        after = _written_entries(datablock, node, params)
+        written = sum(nbytes(value) for key, value in after.items()
+                      if value is not MISSING and before.get(key) != _identity(value))
+
+        record = {"node": i,
+                  "name": pipeline.names[i],
+                  "function": getattr(node, "__name__", repr(node)),
+                  "label": node_label(pipeline, i),
+                  "start": start - self._origin,
+                  "wall": wall,
+                  "cpu": cpu,
+                  "peak_bytes": peak,
+                  "written_bytes": written,
+                  "thread": threading.get_ident()}
+
+        with self._lock:
+            self.records.append(record)
+
+        return datablock
+
+    def trace_events(self):
+        """Returns the records as a list of Chrome trace events"""
+
+        pid = os.getpid()
+        threads = {}
+        events = []
+        for record in self.records:
+            tid = threads.setdefault(record["thread"], len(threads))
+            events.append({"name": record["label"],
+                           "cat": record["function"],
+                           "ph": "X",
+                           "ts": record["start"] * 1e6,
+                           "dur": record["wall"] * 1e6,
+                           "pid": pid,
+                           "tid": tid,
+                           "args": {"node": record["node"],
+                                    "cpu_ms": record["cpu"] * 1e3,
+                                    "peak_bytes": record["peak_bytes"],
+                                    "written_bytes": record["written_bytes"]}})
+
+        return events
+
+    def to_chrome_trace(self, path):
+        """Writes the records to a Chrome trace-event JSON file"""
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events(),
+                       "displayTimeUnit": "ms"}, f)
+
+    def summary(self, sort="wall", limit=None):
+        """Returns a table with the records of each node.
+
+        Parameters
+        ----------
+        sort : str, optional
+            Record to sort the nodes by, in decreasing order: "wall", "cpu",
+            "peak_bytes" or "written_bytes". If None, nodes are listed in the
+            order they ran.
+        limit : int, optional
+            Maximum number of nodes listed.
+
+        Returns
+        -------
+        table : str
+            Summary table, with a total line.
+        """
+
+        records = list(self.records)
+        if sort is not None:
+            records.sort(key=lambda record: record[sort], reverse=True)
+        if limit is not None:
+            records = records[:limit]
+
+        width = max([len(record["label"]) for record in records] + [5])
+        lines = [f"{'Node':>4}  {'Label':<{width}}  {'Wall ms':>9}  {'CPU ms':>9}  " \
+                 f"{'Peak MiB':>9}  {'Written MiB':>11}"]
+        for record in records:
+            lines.append(f"{record['node']:>4}  {record['label']:<{width}}  " \
+                         f"{record['wall'] * 1e3:>9.1f}  {record['cpu'] * 1e3:>9.1f}  " \
+                         f"{record['peak_bytes'] / 2**20:>9.2f}  " \
+                         f"{record['written_bytes'] / 2**20:>11.2f}")
+
+        lines.append(f"{'':>4}  {'Total':<{width}}  " \
+                     f"{sum(record['wall'] for record in self.records) * 1e3:>9.1f}  " \
+                     f"{sum(record['cpu'] for record in self.records) * 1e3:>9.1f}")
+
+        return "\n".join(lines)
+
+    def print_summary(self, sort="wall", limit=None):
+        """Prints the summary table, see summary"""
+        print(self.summary(sort=sort, limit=limit))
+
+
+def node_label(pipeline, i):
+    """Returns a label for a node of a pipeline.
+
+    Nodes whose function is used once in the pipeline are labeled with its
+    name. Otherwise the label also lists the values of the parameters needed
+    to tell the node apart from the other nodes sharing the function.
+    """
+
+    node = pipeline.nodes[i]
+    name = getattr(node, "__name__", repr(node))
+    shared = [j for j, other in enumerate(pipeline.nodes) if other is node]
+    if len(shared) == 1:
+        return name
+
+    params = pipeline.params[i]
+    others = [j for j in shared if j != i]
+
+    values = []
+    for key in params:
+        if not others:
+            break
+        matching = [j for j in others if repr(pipeline.params[j].get(key)) == repr(params[key])]
+        if len(matching) == len(others):
+            continue
+        others = matching
+        value = repr(params[key])
+        if len(value) > _LABEL_VALUE_LENGTH:
+            value = value[:_LABEL_VALUE_LENGTH - 3] + "..."
+        values.append(f"{key}={value}")
+
+    return f"{name}({', '.join(values)})"
+
+
+def _written_entries(datablock, node, params):
+    """Returns the entries a node may write, keyed by path. Nodes which do not
+    declare their outputs may write any entry of the datablock sections."""
+
+    if is_declared(node):
+        return {path: read_path(datablock, path) for path in node_writes(node, params)}
+
+    entries = {}
+    for name, section in datablock.items():
+        if _is_section(section):
+            entries.update({(name, key): value for key, value in section.items()})
+        else:
+            entries[(name,)] = section
+
+    return entries
+
+
+def _identity(value):
+    """Identifies the arrays held by a datablock entry, so that entries
+    modified in place, like datasets updated with *=, count as written"""
+
+    if isinstance(value, xr.Dataset):
+        return tuple(id(variable.data) for variable in value.variables.values())
+    return id(value)
@@ -0,0 +1,270 @@
+"""Persistent store of scenario results.
+
+Calculator traffic concentrates on a few hundred popular pathways, whose
+results are the same every time as long as the model and the baseline data do
+not change. scenario_key identifies a run by all the slider positions and
+advanced settings passed to pipeline_setup, independently of their order and
+of how their numbers are typed, optionally rounding the sliders to a step so
+that nearby positions share a result. ResultStore keeps the results of runs on
+disk in an SQLite database under these keys, evicting the least recently used
+ones when its size goes over a bound, so that they survive restarts and are
+shared by the processes serving the calculator.
+
+The keys also include the version of the model, identified by the source code
+of future_food and the versions of future_food and agrifoodpy, so that results
+computed by an earlier version are not served after an upgrade. They are
+evicted from the store as they stop being used.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from collections.abc import Mapping
+from importlib import metadata
+from numbers import Number
+
+import importlib.resources as resources
+
+import numpy as np
+
+# Version of the model, computed on first use
+_model_version = None
+
+
+def quantize_sliders(params, quantize):
+    """Rounds slider positions to the nearest multiple of a step.
+
+    Parameters
+    ----------
+    params : dict
+        Slider positions.
+    quantize : float or dict
+        Step of all the numeric sliders, or dictionary mapping slider names to
+        their step. Sliders without a step, or with a step of zero, are left
+        as they are.
+
+    Returns
+    -------
+    params : dict
+        New dictionary with the rounded slider positions.
+    """
+
+    quantized = dict(params)
+    for name, value in params.items():
+        step = quantize.get(name) if isinstance(quantize, Mapping) else quantize
+        if step and isinstance(value, Number) and not isinstance(value, bool):
+            quantized[name] = round(round(value / step) * step, 12)
+
+    return quantized
+
+
+def scenario_key(params, adv_settings, quantize=None, baseline=None):
+    """Returns a canonical key identifying a run of the calculator pipeline.
+
+    The key does not depend on the order of the parameters, and numbers are
+    compared by value, so that 20, 20.0 and numpy.float32(20) give the same
+    key. It includes the version of the model, see model_version.
+
+    Parameters
+    ----------
+    params : dict
+        Slider positions, as passed to pipeline_setup.
+    adv_settings : dict
+        Advanced settings, as passed to pipeline_setup.
+    quantize : float or dict, optional
+        Steps to which the sliders are rounded, see quantize_sliders.
+    baseline : str, optional
+        Identifier of the baseline datablock, such as its fingerprint, when
+        runs on several baselines share a store.
+
+    Returns
+    -------
+    key : str
+        Hexadecimal sha256 digest.
+    """
+
+    if quantize is not None:
+        params = quantize_sliders(params, quantize)
+
+    canonical = json.dumps(_canonical([params, adv_settings, baseline, model_version()]),
+                           sort_keys=True, separators=(",", ":"))
+
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def model_version():
+    """Returns an identifier of the version of the model.
+
+    It combines the SHA-256 digest of the Python modules of future_food with
+    the installed versions of future_food and agrifoodpy, so that it changes
+    with any change of the code computing the results, including changes of
+    a source checkout which keep the same package version.
+
+    Returns
+    -------
+    version : list
+        Versions of future_food and agrifoodpy, None if they are not
+        installed, and hexadecimal digest of the modules.
+    """
+
+    global _model_version
+    if _model_version is None:
+        digest = hashlib.sha256()
+        modules = sorted(resources.files("future_food").iterdir(), key=lambda item: item.name)
+        for module in modules:
+            if module.name.endswith(".py"):
+                digest.update(module.name.encode() + b"\0" + module.read_bytes())
+
+        _model_version = [_package_version("future-food"), _package_version("agrifoodpy"),
+                          digest.hexdigest()]
+
+    return _model_version
+
+
+def _package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _canonical(value):
+    if isinstance(value, Mapping):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, Number) and not isinstance(value, bool):
+        # Adding 0.0 turns -0.0 into 0.0
+        return float(value) + 0.0
+    return value
+
+
+class ResultStore():
+    """Disk-backed least-recently-used store of scenario results, bounded by
+    their total size.
+
+    Results are pickled into an SQLite database, which several processes may
+    share. Each process opens its own connection to it on first use.
+
+    Parameters
+    ----------
+    path : str
+        Path of the SQLite database, created if needed.
+    maxbytes : int, optional
+        Maximum total size of the pickled results. Results larger than
+        maxbytes are not kept.
+    """
+
+    def __init__(self, path, maxbytes=256 * 2**20):
+        self.path = path
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._connection = None
+        self._pid = None
+
+    def __len__(self):
+        with self._lock:
+            return self._execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._execute("SELECT 1 FROM results WHERE key = ?",
+                                 (key,)).fetchone() is not None
+
+    @property
+    def nbytes(self):
+        """Total size of the stored results"""
+        with self._lock:
+            return self._execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def get(self, key, default=None):
+        """Returns the result stored under key and marks it as recently used,
+        or default if it is not in the store."""
+        with self._lock:
+            row = self._execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            with self._connect():
+                self._execute("UPDATE results SET used = "
+                              "(SELECT COALESCE(MAX(used), 0) + 1 FROM results) WHERE key = ?",
+                              (key,))
+        return pickle.loads(row[0])
+
+    def put(self, key, value):
+        """Stores value under key, evicting the least recently used results
+        if the store is full."""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock, self._connect():
+            self._execute("DELETE FROM results WHERE key = ?", (key,))
+            if len(blob) > self.maxbytes:
+                return
+            self._execute("INSERT INTO results (key, value, size, used) VALUES "
+                          "(?, ?, ?, (SELECT COALESCE(MAX(used), 0) + 1 FROM results))",
+                          (key, blob, len(blob)))
+            self._evict()
+
+    def pop(self, key, default=None):
+        """Removes and returns the result stored under key."""
+        with self._lock:
+            row = self._execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return default
+            with self._connect():
+                self._execute("DELETE FROM results WHERE key = ?", (key,))
+        return pickle.loads(row[0])
+
+    def clear(self):
+        """Removes all the results from the store."""
+        with self._lock, self._connect():
+            self._execute("DELETE FROM results")
+
+    def close(self):
+        """Closes the connection of the current process to the database."""
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    def _evict(self):
+        excess = self._execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0] \
+            - self.maxbytes
+        if excess <= 0:
+            return
+
+        evicted = []
+        for key, size in self._execute("SELECT key, size FROM results ORDER BY used"):
+            evicted.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+
+    def _connect(self):
+        """Returns the connection of the current process, opening it and
+        creating the table if needed. Used as a context manager, it commits
+        the statements of the block."""
+
+        # Connections must not be used across forks
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, "
+                               "value BLOB NOT NULL, size INTEGER NOT NULL, "
+                               "used INTEGER NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+            connection.commit()
+            self._connection, self._pid = connection, os.getpid()
+
+        return self._connection
+
+    def _execute(self, statement, parameters=()):
+        return self._connect().execute(statement, parameters)
@@ -0,0 +1,365 @@
+"""Local scenario service around the calculator pipeline.
+
+The calculator runs pipeline_setup and the pipeline once per request, and
+bursts of requests for the same slider positions, from shared links or page
+reloads, each computed the same scenario. ScenarioService runs the pipeline on
+a bounded pool of worker threads and coalesces concurrent requests for the
+same parameter set into a single computation, whose metrics are returned to
+all of them. Requests for new parameter sets arriving while the queue of
+pending computations is full are rejected with ServiceBusy instead of piling
+up behind it.
+
+With a ResultStore, the metrics and land totals of computed scenarios are kept
+on disk and returned for later requests for the same parameter set, and slider
+positions may be quantized so that nearby positions share a result.
+
+serve_http exposes a service through a minimal HTTP server built on asyncio
+streams, answering one request per connection:
+
+GET /metrics?ruminant=-20&pig_poultry=0&...
+POST /metrics, with the slider positions as a JSON object
+    Metrics of the scenario, as JSON. Answers 503 if the service is busy and
+    400 if the parameters are invalid.
+GET /stats
+    Number of requests received, coalesced, answered from the store and
+    rejected, and of scenarios computed successfully.
+"""
+
+import asyncio
+import json
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import xarray as xr
+
+from .cache import LRUCache, fingerprint
+from .datablock_utils import copy_datablock, freeze_datablock, materialize
+from .land_totals import land_totals
+from .pipeline import CHECKPOINT_BYTES, ModelPipeline
+from .pipeline_builder import pipeline_setup
+from .result_store import quantize_sliders, scenario_key
+
+# Largest request body accepted by the HTTP server
+MAX_BODY_BYTES = 1 << 20
+
+
+class ServiceBusy(RuntimeError):
+    """Raised when the queue of pending computations of a ScenarioService is
+    full"""
+
+
+class ScenarioService():
+    """Runs the calculator pipeline for scenario requests, coalescing the
+    concurrent requests for the same parameter set.
+
+    Parameters
+    ----------
+    datablock : dict
+        Baseline datablock. Its lazy entries are loaded and its arrays made
+        read-only, and each computation runs on a copy-on-write copy of it.
+    adv_settings : dict
+        Advanced settings, shared by all the scenarios.
+    workers : int, optional
+        Number of worker threads running computations concurrently.
+    max_queue : int, optional
+        Number of computations which may wait for a free worker. Requests
+        needing a new computation beyond it raise ServiceBusy.
+    checkpoints : LRUCache, optional
+        Checkpoint cache of the pipelines, see ModelPipeline, so that
+        scenarios resume from the nodes they share with earlier ones.
+        Defaults to a cache of the service bounded to CHECKPOINT_BYTES of
+        distinct arrays. If False, checkpoints are disabled.
+    store : ResultStore, optional
+        Persistent store of the results of computed scenarios. Its keys
+        include the fingerprint of the baseline datablock and the version of
+        the model, see scenario_key.
+    quantize : float or dict, optional
+        Steps to which the slider positions are rounded before computing a
+        scenario, see quantize_sliders.
+    """
+
+    def __init__(
+            self,
+            datablock,
+            adv_settings,
+            workers=1,
+            max_queue=8,
+            checkpoints=None,
+            store=None,
+            quantize=None
+            ):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+
+        if checkpoints is None:
+            checkpoints = LRUCache(maxsize=None, maxbytes=CHECKPOINT_BYTES, shared=True)
+
+        self.datablock = freeze_datablock(materialize(datablock))
+        self.adv_settings = adv_settings
+        self.workers = workers
+        self.max_queue = max_queue
+        self.checkpoints = checkpoints
+        self.store = store
+        self.quantize = quantize
+        self.stats = {"requests": 0, "computed": 0, "coalesced": 0, "stored": 0,
+                      "rejected": 0}
+        self._baseline = fingerprint(self.datablock) if store is not None else None
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="scenario")
+        # The store is read on its own thread, so that lookups neither block
+        # the event loop nor wait for the computations
+        self._store_executor = ThreadPoolExecutor(max_workers=1,
+                                                  thread_name_prefix="store")
+
+    @property
+    def pending(self):
+        """Number of computations running or waiting for a worker"""
+        return len(self._pending)
+
+    async def metrics(self, params):
+        """Returns the metrics of the scenario with the given slider positions.
+
+        See result.
+
+        Parameters
+        ----------
+        params : dict
+            Slider positions, as passed to pipeline_setup.
+
+        Returns
+        -------
+        metrics : dict
+            Metrics section of the final datablock.
+        """
+
+        return (await self.result(params))["metrics"]
+
+    async def result(self, params):
+        """Returns the metrics and land totals of the scenario with the given
+        slider positions.
+
+        Results found in the store are returned without computing them. The
+        store is read on a separate thread, so that the event loop keeps
+        serving other requests meanwhile. Requests made while a computation
+        for the same parameters is pending wait for it instead of starting a
+        new one. The returned results are shared by all the requests of a
+        computation and must not be modified.
+
+        Parameters
+        ----------
+        params : dict
+            Slider positions, as passed to pipeline_setup.
+
+        Returns
+        -------
+        result : dict
+            Dictionary with the metrics section of the final datablock under
+            "metrics", and its land use class totals under "class_totals".
+
+        Raises
+        ------
+        ServiceBusy
+            If a new computation is needed and max_queue computations are
+            already waiting for a worker.
+        """
+
+        self.stats["requests"] += 1
+        if self.quantize is not None:
+            params = quantize_sliders(params, self.quantize)
+        key = scenario_key(params, self.adv_settings, baseline=self._baseline)
+
+        loop = asyncio.get_running_loop()
+
+        future = self._pending.get(key)
+        if future is None and self.store is not None:
+            result = await loop.run_in_executor(self._store_executor, self.store.get, key)
+            if result is not None:
+                self.stats["stored"] += 1
+                return result
+            # A computation may have started while the store was read
+            future = self._pending.get(key)
+
+        if future is not None:
+            self.stats["coalesced"] += 1
+        else:
+            if len(self._pending) >= self.workers + self.max_queue:
+                self.stats["rejected"] += 1
+                raise ServiceBusy(f"{len(self._pending)} scenario computations are "
+                                  f"already pending")
+
+            future = loop.run_in_executor(self._executor, self._run, key, dict(params))
+            self._pending[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+
+        # A cancelled request must not cancel the computation of the others
+        return await asyncio.shield(future)
+
+    def close(self):
+        """Waits for the pending computations and stops the threads of the
+        service"""
+        self._executor.shutdown(wait=True)
+        self._store_executor.shutdown(wait=True)
+
+    def _run(self, key, params):
+        pipeline = ModelPipeline(datablock=copy_datablock(self.datablock),
+                                 checkpoints=self.checkpoints)
+        # Requests never see the node list, so its nodes can be fused
+        pipeline = pipeline_setup(pipeline, params, self.adv_settings, fuse=True)
+        pipeline.run()
+
+        result = {"metrics": pipeline.datablock["metrics"],
+                  "class_totals": land_totals(pipeline.datablock)}
+        if self.store is not None:
+            self.store.put(key, result)
+
+        return result
+
+    def _finish(self, key, future):
+        if self._pending.get(key) is future:
+            del self._pending[key]
+        # Failed computations, such as those of invalid parameters, are not
+        # counted
+        if not future.cancelled() and future.exception() is None:
+            self.stats["computed"] += 1
+
+
+def to_json(value):
+    """Converts metrics to JSON compatible values.
+
+    xarray objects are converted with their to_dict method, numpy arrays and
+    scalars to lists and Python scalars, and non-finite numbers to None.
+    """
+
+    if isinstance(value, (xr.DataArray, xr.Dataset)):
+        return to_json(value.to_dict(data="list"))
+    if isinstance(value, (np.ndarray, np.generic)):
+        return to_json(value.tolist())
+    if isinstance(value, Mapping):
+        return {str(key): to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+async def serve_http(service, host="127.0.0.1", port=8000):
+    """Starts an HTTP server answering scenario requests with a service.
+
+    Parameters
+    ----------
+    service : ScenarioService
+        Service computing the scenarios.
+    host : str, optional
+        Address to listen on.
+    port : int, optional
+        Port to listen on. If 0, a free port is chosen, which can be read from
+        server.sockets[0].getsockname().
+
+    Returns
+    -------
+    server : asyncio.Server
+        Started server. Use server.serve_forever() to keep serving, and
+        server.close() to stop.
+    """
+
+    return await asyncio.start_server(lambda reader, writer: _handle(service, reader, writer),
+                                      host, port)
+
+
+async def _handle(service, reader, writer):
+    try:
+        try:
+            method, target, body = await _read_request(reader)
+            status, payload = await _respond(service, method, target, body)
+        except (ValueError, asyncio.IncompleteReadError) as error:
+            status, payload = HTTPStatus.BAD_REQUEST, {"error": str(error)}
+        except Exception as error:
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(error)}
+
+        content = json.dumps(to_json(payload)).encode()
+        headers = [f"HTTP/1.1 {status.value} {status.phrase}",
+                   "Content-Type: application/json",
+                   f"Content-Length: {len(content)}",
+                   "Connection: close"]
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            headers.append("Retry-After: 1")
+
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + content)
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _read_request(reader):
+    """Reads the method, target and body of an HTTP request"""
+
+    request_line = (await reader.readline()).decode("latin-1").split()
+    if len(request_line) != 3:
+        raise ValueError("Malformed request line")
+    method, target, _ = request_line
+
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1")
+        if line in ["\r\n", "\n", ""]:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0))
+    if not 0 <= length <= MAX_BODY_BYTES:
+        raise ValueError(f"Request bodies must be at most {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length)
+
+    return method, target, body
+
+
+async def _respond(service, method, target, body):
+    """Returns the status and payload of the response to a request"""
+
+    url = urlsplit(target)
+
+    if url.path == "/stats":
+        if method != "GET":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Use GET"}
+        return HTTPStatus.OK, {**service.stats, "pending": service.pending}
+
+    if url.path != "/metrics":
+        return HTTPStatus.NOT_FOUND, {"error": f"Unknown path {url.path}"}
+
+    if method == "GET":
+        params = {name: _number(value) for name, value in parse_qsl(url.query)}
+    elif method == "POST":
+        params = json.loads(body or b"{}")
+        if not isinstance(params, dict):
+            raise ValueError("The request body must be a JSON object")
+    else:
+        return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Use GET or POST"}
+
+    try:
+        metrics = await service.metrics(params)
+    except ServiceBusy as error:
+        return HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(error)}
+    except KeyError as error:
+        return HTTPStatus.BAD_REQUEST, {"error": f"Missing parameter {error}"}
+    except (TypeError, ValueError) as error:
+        return HTTPStatus.BAD_REQUEST, {"error": str(error)}
+
+    return HTTPStatus.OK, metrics
+
+
+def _number(value):
+    """Parses a query string value as an int or a float"""
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
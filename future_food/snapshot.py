@@ -0,0 +1,177 @@
+"""Single-file snapshots of the baseline datablock.
+
+A snapshot stores every array of a baseline datablock in one binary file, so
+it can be memory-mapped at start up instead of rebuilt from the data packages.
+
+The file layout is
+
+    magic (8 bytes) | version (uint32) | header size (uint64) | JSON header |
+    padding | aligned raw arrays
+
+The JSON header describes the datablock sections, the xarray objects in each
+section and the offset, dtype and shape of each of their arrays. Arrays with
+identical contents are only stored once.
+"""
+
+import hashlib
+import json
+import struct
+
+import numpy as np
+import xarray as xr
+
+from .assets import _atomic_write, _to_json
+
+SNAPSHOT_MAGIC = b"FFSNAP\x00\x00"
+SNAPSHOT_VERSION = 1
+
+_PREAMBLE = struct.Struct("<8sIQ")
+_ALIGN = 64
+
+
+def write_snapshot(path, datablock, metadata=None):
+    """Writes the sections of a datablock to a snapshot file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the snapshot file. The file is written with owner-only
+        permissions, as it may contain decrypted data.
+    datablock : dict
+        Datablock to store. Only the sections, which must map names to xarray
+        objects, are stored.
+    metadata : dict, optional
+        JSON serializable metadata stored in the snapshot header.
+    """
+
+    arrays = []
+    digests = {}
+    offset = 0
+
+    def add_array(values):
+        nonlocal offset
+        values = np.asarray(values)
+        if values.dtype.kind not in "biufcmMSU":
+            return {"dtype": values.dtype.str,
+                    "values": values.tolist()}
+
+        digest = hashlib.sha256(values.dtype.str.encode()
+                                + str(values.shape).encode()
+                                + values.tobytes()).digest()
+        if digest not in digests:
+            digests[digest] = offset
+            arrays.append((offset, values))
+            offset = _aligned(offset + values.nbytes)
+
+        return {"offset": digests[digest],
+                "dtype": values.dtype.str,
+                "shape": list(values.shape)}
+
+    def add_variable(var):
+        return {"dims": list(var.dims),
+                "attrs": _attrs(var.attrs),
+                "data": add_array(var.values)}
+
+    def add_object(obj):
+        entry = {"coords": {name: add_variable(coord.variable)
+                            for name, coord in obj.coords.items()},
+                 "attrs": _attrs(obj.attrs)}
+        if isinstance(obj, xr.DataArray):
+            entry.update({"type": "DataArray",
+                          "name": obj.name,
+                          "variable": add_variable(obj.variable)})
+        elif isinstance(obj, xr.Dataset):
+            entry.update({"type": "Dataset",
+                          "data_vars": {name: add_variable(var.variable)
+                                        for name, var in obj.data_vars.items()}})
+        else:
+            raise ValueError(f"Cannot store objects of type {type(obj).__name__} in a snapshot")
+        return entry
+
+    sections = {section: {key: add_object(value) for key, value in entries.items()}
+                for section, entries in datablock.items()
+                if isinstance(entries, dict)}
+
+    header = json.dumps({"metadata": metadata or {},
+                         "sections": sections}).encode()
+    data_start = _aligned(_PREAMBLE.size + len(header))
+
+    def writer(f):
+        f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        for array_offset, values in arrays:
+            f.seek(data_start + array_offset)
+            f.write(values.tobytes())
+        f.truncate(data_start + offset)
+
+    _atomic_write(path, writer)
+
+
+def read_snapshot(path):
+    """Memory-maps a snapshot file.
+
+    Parameters
+    ----------
+    path : str
+        Path to a snapshot written by write_snapshot.
+
+    Returns
+    -------
+    datablock : dict
+        Datablock with one dictionary per stored section. Arrays are read-only
+        views of the mapped file.
+    metadata : dict
+        Metadata stored with the snapshot.
+    """
+
+    with open(path, "rb") as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            raise ValueError(f"{path} is not a future_food snapshot")
+        magic, version, header_size = _PREAMBLE.unpack(preamble)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a future_food snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot {path} has version {version}, "
+                             f"expected version {SNAPSHOT_VERSION}. "
+                             "Rebuild it with build_snapshot.")
+        header = json.loads(f.read(header_size))
+
+    data_start = _aligned(_PREAMBLE.size + header_size)
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+
+    def get_array(entry):
+        if "values" in entry:
+            return np.asarray(entry["values"], dtype=entry["dtype"])
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        count = int(np.prod(shape, dtype=np.int64))
+        return np.frombuffer(buffer, dtype=dtype, count=count,
+                             offset=data_start + entry["offset"]).reshape(shape)
+
+    def get_variable(entry):
+        return xr.Variable(entry["dims"], get_array(entry["data"]), attrs=entry["attrs"])
+
+    def get_object(entry):
+        coords = {name: get_variable(coord) for name, coord in entry["coords"].items()}
+        if entry["type"] == "DataArray":
+            return xr.DataArray(get_variable(entry["variable"]),
+                                coords=coords,
+                                name=entry["name"],
+                                attrs=entry["attrs"])
+        return xr.Dataset({name: get_variable(var) for name, var in entry["data_vars"].items()},
+                          coords=coords,
+                          attrs=entry["attrs"])
+
+    datablock = {section: {key: get_object(entry) for key, entry in entries.items()}
+                 for section, entries in header["sections"].items()}
+
+    return datablock, header["metadata"]
+
+
+def _aligned(size):
+    return -(-size // _ALIGN) * _ALIGN
+
+
+def _attrs(attrs):
+    return {key: _to_json(value) for key, value in attrs.items()}
@@ -0,0 +1,132 @@
+"""Scenario sweeps on a pool of worker processes.
+
+run_sweep builds the baseline datablock once, loads all its entries and makes
+its arrays read-only, and then forks the worker processes. The workers inherit
+the baseline memory pages from the parent instead of receiving a pickled copy
+of it, and never write to them, so the land grid and food balance arrays are
+shared by all the workers. Each worker runs the pipeline on copy-on-write
+copies of the baseline and only sends back the requested results.
+"""
+
+import multiprocessing
+import os
+import warnings
+
+from .cache import LRUCache
+from .datablock_setup import datablock_setup
+from .datablock_utils import copy_datablock, freeze_datablock, materialize
+from .node_io import read_path
+from .pipeline import CHECKPOINT_BYTES, ModelPipeline
+from .pipeline_builder import pipeline_setup
+
+# Baseline datablock and settings of a sweep, set in its worker processes
+# when they start
+_sweep_state = {}
+
+
+def run_sweep(
+        param_sets,
+        adv_settings,
+        workers=None,
+        datablock=None,
+        paths=(("metrics",),),
+        chunksize=1,
+        **setup_kwargs
+        ):
+    """Runs the calculator pipeline for many parameter sets on forked worker
+    processes, yielding the results as they finish.
+
+    Parameters
+    ----------
+    param_sets : list of dict
+        Slider positions of each run.
+    adv_settings : dict
+        Advanced settings, shared by all the runs.
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    datablock : dict, optional
+        Baseline datablock. If None, it is built with datablock_setup, using
+        adv_settings and setup_kwargs, which must include AES_KEY and AES_IV.
+    paths : list of tuple, optional
+        Datablock paths returned for each run. Defaults to the metrics
+        section. If None, the whole datablock of each run is returned.
+    chunksize : int, optional
+        Number of consecutive parameter sets sent to a worker at once. The
+        runs of a chunk share a checkpoint cache bounded to CHECKPOINT_BYTES,
+        so that each run resumes from the last node it has in common with the
+        earlier runs of the chunk, see ModelPipeline.
+    **setup_kwargs
+        Keyword arguments of datablock_setup.
+
+    Yields
+    ------
+    index : int
+        Position of the parameter set in param_sets.
+    result : dict
+        Requested paths of the final datablock of the run, or the whole
+        datablock if paths is None.
+    """
+
+    if datablock is None:
+        datablock = datablock_setup(advanced_settings=adv_settings, **setup_kwargs)
+
+    # Load every lazy entry before forking, so the workers share them
+    baseline = freeze_datablock(materialize(datablock))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    chunks = [list(range(start, min(start + chunksize, len(param_sets))))
+              for start in range(0, len(param_sets), chunksize)]
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        warnings.warn("Forked worker processes are not available on this "
+                      "platform, running the sweep in the current process.")
+        workers = 1
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _run_chunk(baseline, param_sets, adv_settings, paths, chunk)
+        return
+
+    # The initializer arguments of forked workers are inherited, not pickled,
+    # and each sweep has its own workers, so concurrent sweeps do not share
+    # their state
+    state = {"baseline": baseline, "param_sets": param_sets,
+             "adv_settings": adv_settings, "paths": paths}
+
+    context = multiprocessing.get_context("fork")
+    with context.Pool(processes=workers, initializer=_start_worker,
+                      initargs=(state,)) as pool:
+        for results in pool.imap_unordered(_sweep_worker, chunks):
+            yield from results
+
+
+def _start_worker(state):
+    _sweep_state.update(state)
+
+
+def _sweep_worker(chunk):
+    return list(_run_chunk(_sweep_state["baseline"], _sweep_state["param_sets"],
+                           _sweep_state["adv_settings"], _sweep_state["paths"], chunk))
+
+
+def _run_chunk(baseline, param_sets, adv_settings, paths, chunk):
+    checkpoints = LRUCache(maxsize=None, maxbytes=CHECKPOINT_BYTES, shared=True)
+    for i in chunk:
+        pipeline = ModelPipeline(datablock=copy_datablock(baseline), checkpoints=checkpoints)
+        pipeline = pipeline_setup(pipeline, param_sets[i], adv_settings, fuse=True)
+        pipeline.run()
+        yield i, _collect(pipeline, paths)
+
+
+def _collect(pipeline, paths):
+    """Returns the requested paths of the final datablock of a run, or a
+    copy-on-write copy of the whole datablock if paths is None"""
+
+    datablock = copy_datablock(pipeline.datablock)
+
+    if paths is None:
+        return datablock
+
+    return {tuple(path): read_path(datablock, path) for path in paths}
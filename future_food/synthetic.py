@@ -0,0 +1,566 @@
+"""Synthetic baseline datablocks.
+
+synthetic_datablock builds a datablock with the same sections, entries,
+dimensions, coordinates and data types as datablock_setup, from random values
+instead of the agrifoodpy_data tables and the encrypted land cover asset. It
+goes through the same _BaselineLoader code as datablock_setup, with source
+tables generated from a seed, so the derived entries are computed as for the
+real baseline. It is meant for benchmarks and tests in environments without
+the data packages or the AES key, and its results have no physical meaning.
+
+The number of items, item groups and origins, the projection horizon, the land
+grid size and resolution, the number of land classes and the number of regions
+can be increased beyond those of the UK baseline, to stress test the model.
+"""
+
+import copy
+import threading
+
+import numpy as np
+import xarray as xr
+
+from .datablock_setup import (AREA_FAO, AREA_POP, AREA_POP_WORLD, _BaselineLoader,
+                              _lazy_datablock)
+from .datablock_utils import materialize
+
+# FAOSTAT items by origin and group. The last item of most groups is the group
+# total, which datablock_setup drops from the food balance sheets.
+ITEMS = {
+    ("Vegetal Products", "Cereals - Excluding Beer"): [
+        (2511, "Wheat and products"), (2513, "Barley and products"),
+        (2514, "Maize and products"), (2515, "Rye and products"), (2516, "Oats"),
+        (2517, "Millet and products"), (2518, "Sorghum and products"),
+        (2520, "Cereals, Other"), (2807, "Rice and products"),
+        (2905, "Cereals - Excluding Beer")],
+    ("Vegetal Products", "Starchy Roots"): [
+        (2531, "Potatoes and products"), (2532, "Cassava and products"),
+        (2533, "Sweet potatoes"), (2534, "Roots, Other"), (2535, "Yams"),
+        (2907, "Starchy Roots")],
+    ("Vegetal Products", "Sugar Crops"): [
+        (2536, "Sugar cane"), (2537, "Sugar beet"), (2908, "Sugar Crops")],
+    ("Vegetal Products", "Sugar & Sweeteners"): [
+        (2541, "Sugar non-centrifugal"), (2542, "Sugar (Raw Equivalent)"),
+        (2543, "Sweeteners, Other"), (2745, "Honey"), (2909, "Sugar & Sweeteners")],
+    ("Vegetal Products", "Pulses"): [
+        (2546, "Beans"), (2547, "Peas"), (2549, "Pulses, Other and products"),
+        (2911, "Pulses")],
+    ("Vegetal Products", "Treenuts"): [
+        (2551, "Nuts and products"), (2912, "Treenuts")],
+    ("Vegetal Products", "Oilcrops"): [
+        (2552, "Groundnuts"), (2555, "Soyabeans"), (2557, "Sunflower seed"),
+        (2558, "Rape and Mustardseed"), (2559, "Cottonseed"),
+        (2560, "Coconuts - Incl Copra"), (2561, "Sesame seed"),
+        (2562, "Palm kernels"), (2563, "Olives (including preserved)"),
+        (2570, "Oilcrops, Other"), (2913, "Oilcrops")],
+    ("Vegetal Products", "Vegetable Oils"): [
+        (2571, "Soyabean Oil"), (2572, "Groundnut Oil"), (2573, "Sunflowerseed Oil"),
+        (2574, "Rape and Mustard Oil"), (2575, "Cottonseed Oil"),
+        (2576, "Palmkernel Oil"), (2577, "Palm Oil"), (2578, "Coconut Oil"),
+        (2579, "Sesameseed Oil"), (2580, "Olive Oil"), (2581, "Ricebran Oil"),
+        (2582, "Maize Germ Oil"), (2586, "Oilcrops Oil, Other"),
+        (2914, "Vegetable Oils")],
+    ("Vegetal Products", "Vegetables"): [
+        (2601, "Tomatoes and products"), (2602, "Onions"),
+        (2605, "Vegetables, other"), (2918, "Vegetables")],
+    ("Vegetal Products", "Fruits - Excluding Wine"): [
+        (2611, "Oranges, Mandarines"), (2612, "Lemons, Limes and products"),
+        (2613, "Grapefruit and products"), (2614, "Citrus, Other"), (2615, "Bananas"),
+        (2616, "Plantains"), (2617, "Apples and products"),
+        (2618, "Pineapples and products"), (2619, "Dates"),
+        (2620, "Grapes and products (excl wine)"), (2625, "Fruits, other"),
+        (2919, "Fruits - Excluding Wine")],
+    ("Vegetal Products", "Stimulants"): [
+        (2630, "Coffee and products"), (2633, "Cocoa Beans and products"),
+        (2635, "Tea (including mate)"), (2922, "Stimulants")],
+    ("Vegetal Products", "Spices"): [
+        (2640, "Pepper"), (2641, "Pimento"), (2642, "Cloves"),
+        (2645, "Spices, Other"), (2923, "Spices")],
+    ("Vegetal Products", "Alcoholic Beverages"): [
+        (2655, "Wine"), (2656, "Beer"), (2657, "Beverages, Fermented"),
+        (2658, "Beverages, Alcoholic"), (2659, "Alcohol, Non-Food"),
+        (2924, "Alcoholic Beverages")],
+    ("Vegetal Products", "Miscellaneous"): [
+        (2680, "Infant food")],
+    ("Animal Products", "Meat"): [
+        (2731, "Bovine Meat"), (2732, "Mutton & Goat Meat"), (2733, "Pigmeat"),
+        (2734, "Poultry Meat"), (2735, "Meat, Other"), (2943, "Meat")],
+    ("Animal Products", "Offals"): [
+        (2736, "Offals, Edible"), (2945, "Offals")],
+    ("Animal Products", "Animal fats"): [
+        (2737, "Fats, Animals, Raw"), (2740, "Butter, Ghee"), (2743, "Cream"),
+        (2781, "Fish, Body Oil"), (2782, "Fish, Liver Oil"), (2946, "Animal fats")],
+    ("Animal Products", "Fish, Seafood"): [
+        (2761, "Freshwater Fish"), (2762, "Demersal Fish"), (2763, "Pelagic Fish"),
+        (2764, "Marine Fish, Other"), (2765, "Crustaceans"), (2766, "Cephalopods"),
+        (2767, "Molluscs, Other"), (2769, "Aquatic Animals, Others"),
+        (2960, "Fish, Seafood")],
+    ("Animal Products", "Aquatic Products, Other"): [
+        (2768, "Meat, Aquatic Mammals"), (2775, "Aquatic Plants"),
+        (2961, "Aquatic Products, Other")],
+    ("Vegetal Products", "Vegetal Products"): [
+        (2903, "Vegetal Products")],
+    ("Animal Products", "Animal Products"): [
+        (2941, "Animal Products")],
+    ("Animal Products", "Milk - Excluding Butter"): [
+        (2948, "Milk - Excluding Butter")],
+    ("Animal Products", "Eggs"): [
+        (2949, "Eggs")],
+}
+
+
+# Items dropped by datablock_setup from the food balance sheets
+SUMMARY_ITEMS = [2905, 2943, 2924, 2946, 2961, 2960, 2919, 2945, 2913, 2911,
+                 2923, 2907, 2918, 2914, 2912, 2908, 2909, 2922, 2941, 2903]
+
+ELEMENTS = ["stock", "losses", "processing", "food", "other", "residual",
+            "tourist", "domestic", "production", "feed", "seed", "imports",
+            "exports"]
+
+# Fraction of missing values of each element, as in the UK food balance sheet
+_MISSING_FRACTION = {"stock": 0.15, "losses": 0.65, "processing": 0.7,
+                     "food": 0.14, "other": 0.64, "residual": 0.15,
+                     "tourist": 1.0, "domestic": 0.04, "production": 0.32,
+                     "feed": 0.62, "seed": 0.87, "imports": 0.04,
+                     "exports": 0.04}
+
+LAND_CLASSES = ["Broadleaf woodland", "Coniferous woodland", "Arable",
+                "Improved grassland", "Semi-natural grassland",
+                "Mountain, heath, bog", "Saltwater", "Freshwater", "Coastal",
+                "Built-up areas and gardens"]
+
+# Mean share of each land class in a land pixel, and of each added class
+_LAND_SHARES = [0.07, 0.06, 0.2, 0.25, 0.12, 0.12, 0.01, 0.02, 0.02, 0.13]
+_EXTRA_LAND_SHARE = 0.02
+
+# Population in 2020 and 2050 of the country and world regions, in thousands
+_POPULATION = {AREA_POP: (67000., 71500.), AREA_POP_WORLD: (7840000., 9700000.)}
+
+_FAO_REGION_NAME = "United Kingdom of Great Britain and Northern Ireland"
+
+# Codes of the first item and region added to the FAOSTAT ones
+_EXTRA_ITEM_CODE = 20001
+_EXTRA_REGION_CODE = 10001
+
+# Pixel size and (y, x) extent of the UK land cover grid, in metres
+LAND_RESOLUTION = 2000.
+LAND_EXTENT = (1250000., 700000.)
+
+
+def synthetic_datablock(
+        advanced_settings={},
+        seed=0,
+        n_items=None,
+        n_groups=None,
+        n_origins=None,
+        end_year=2050,
+        land_resolution=LAND_RESOLUTION,
+        land_shape=None,
+        n_land_classes=None,
+        lazy=False,
+        land_precision="float64",
+        land_layout="grid"
+        ):
+    """Builds a baseline datablock from synthetic source tables.
+
+    By default the datablock has the size of the UK baseline. The item list,
+    projection horizon, land grid and land classes can be enlarged to measure
+    how the model scales. The FAOSTAT items and land classes, which the model
+    nodes refer to, are always included.
+
+    Parameters
+    ----------
+    advanced_settings : dict, optional
+        Advanced settings stored in the datablock. Its "pop_proj" entry sets
+        the name of the population projection, "Medium" by default.
+    seed : int, optional
+        Seed of the random values. The same seed always gives the same
+        datablock.
+    n_items : int, optional
+        Number of items of the food balance sheets, at least the 97 FAOSTAT
+        items. Items are added to the new groups first, and then to all the
+        groups in turn.
+    n_groups : int, optional
+        Number of item groups of the food balance sheets, at least the 21
+        FAOSTAT groups. New groups are assigned to the new origins first,
+        and then to all the origins in turn.
+    n_origins : int, optional
+        Number of item origins, at least the two FAOSTAT origins.
+    end_year : int, optional
+        Last year of the population projections and of the model projection,
+        2050 or later.
+    land_resolution : float, optional
+        Size of the land use grid pixels, in metres. Land areas are sums of
+        pixel percentages, so they grow with the number of pixels.
+    land_shape : tuple of int, optional
+        Number of (y, x) pixels of the land use grid. Defaults to the number
+        of pixels of land_resolution covering the UK grid extent.
+    n_land_classes : int, optional
+        Number of land use classes, at least the 10 UKCEH aggregate classes.
+    lazy : bool, optional
+        If True, the datablock sections are LazySection mappings.
+    land_precision : str, optional
+        Storage precision of the land use grids.
+    land_layout : str, optional
+        Layout of the land use grids, "grid" or "pixel".
+
+    Returns
+    -------
+    datablock : dict
+        Datablock with the schema of the datablock_setup baseline.
+    """
+
+    datablocks = synthetic_datablock_regions(1, advanced_settings=advanced_settings,
+                                             seed=seed, n_items=n_items,
+                                             n_groups=n_groups, n_origins=n_origins,
+                                             end_year=end_year,
+                                             land_resolution=land_resolution,
+                                             land_shape=land_shape,
+                                             n_land_classes=n_land_classes,
+                                             lazy=lazy, land_precision=land_precision,
+                                             land_layout=land_layout)
+
+    return datablocks[(AREA_POP, AREA_FAO)]
+
+
+def synthetic_datablock_regions(
+        n_regions,
+        advanced_settings={},
+        seed=0,
+        n_items=None,
+        n_groups=None,
+        n_origins=None,
+        end_year=2050,
+        land_resolution=LAND_RESOLUTION,
+        land_shape=None,
+        n_land_classes=None,
+        lazy=False,
+        land_precision="float64",
+        land_layout="grid"
+        ):
+    """Builds one synthetic datablock per region, like datablock_setup_regions.
+
+    The first region is the UK, with codes (826, 229), and the other regions
+    have codes (10001, 10001), (10002, 10002) and so on. The source tables are
+    generated once for all the regions, and the regions share the land use
+    grid and emission factors, as in datablock_setup_regions.
+
+    Parameters
+    ----------
+    n_regions : int
+        Number of regions.
+    advanced_settings, seed, n_items, n_groups, n_origins, end_year,
+    land_resolution, land_shape, n_land_classes, lazy, land_precision,
+    land_layout
+        See synthetic_datablock.
+
+    Returns
+    -------
+    datablocks : dict
+        Dictionary mapping each region code pair to its datablock.
+    """
+
+    population_projection = advanced_settings.get("pop_proj", "Medium")
+    sources = _SyntheticTables(population_projection, n_regions=n_regions, seed=seed,
+                               n_items=n_items, n_groups=n_groups, n_origins=n_origins,
+                               end_year=end_year, land_resolution=land_resolution,
+                               land_shape=land_shape, n_land_classes=n_land_classes)
+
+    datablocks = {}
+    for area_pop, area_fao in sources.regions:
+        loader = _SyntheticLoader(population_projection, sources,
+                                  area_pop=area_pop, area_fao=area_fao,
+                                  land_precision=land_precision,
+                                  land_layout=land_layout)
+        datablock = _lazy_datablock(loader)
+        if not lazy:
+            datablock = materialize(datablock)
+        datablock["advanced_settings"] = advanced_settings
+        datablocks[(area_pop, area_fao)] = datablock
+
+    return datablocks
+
+
+class _SyntheticLoader(_BaselineLoader):
+    """Baseline loader reading synthetic source tables. The emission factors,
+    which _BaselineLoader reads from agrifoodpy_data directly, are read from
+    the source tables too, and the projection years are those of the
+    tables."""
+
+    def __init__(
+            self,
+            population_projection,
+            sources,
+            area_pop=AREA_POP,
+            area_fao=AREA_FAO,
+            land_precision="float64",
+            land_layout="grid"
+            ):
+        super().__init__(None, None, population_projection,
+                         area_pop=area_pop, area_fao=area_fao, sources=sources,
+                         land_precision=land_precision, land_layout=land_layout)
+        self.years = sources.years
+
+    def emission_factors(self):
+
+        UKNDC_FAOSTAT = self.sources.UKNDC_FAOSTAT()
+        scale_ones = xr.DataArray(data=np.ones_like([2020]), coords={"Year": [2020]})
+
+        extended_impact = UKNDC_FAOSTAT["NDC_emissions_agriculture"].drop_vars(["Item_name", "Item_group", "Item_origin"]) * scale_ones
+        land_use_food_impact = UKNDC_FAOSTAT["NDC_emissions_land_use"].drop_vars(["Item_name", "Item_group", "Item_origin"]) * scale_ones
+
+        return {"gco2e/gfood": extended_impact,
+                "gco2e/gfood_land": land_use_food_impact}
+
+
+class _SyntheticTables():
+    """Random source tables with the layout of the _SourceTables selections.
+
+    Each table draws from its own random generator, seeded from seed and the
+    table, so tables do not depend on the order they are built in. Tables are
+    generated once, and every land cover user but the last one gets its own
+    copy of the grid, as with _SourceTables.
+    """
+
+    def __init__(
+            self,
+            population_projection,
+            n_regions=1,
+            seed=0,
+            n_items=None,
+            n_groups=None,
+            n_origins=None,
+            end_year=2050,
+            land_resolution=LAND_RESOLUTION,
+            land_shape=None,
+            n_land_classes=None
+            ):
+        if n_regions < 1:
+            raise ValueError(f"At least one region is needed, got {n_regions}")
+        if end_year < 2050:
+            raise ValueError(f"The end year must be 2050 or later, got {end_year}")
+        if n_land_classes is None:
+            n_land_classes = len(LAND_CLASSES)
+        if n_land_classes < len(LAND_CLASSES):
+            raise ValueError(f"At least {len(LAND_CLASSES)} land classes are "
+                             f"needed, got {n_land_classes}")
+        if land_shape is None:
+            land_shape = [max(int(round(extent / land_resolution)), 1) for extent in LAND_EXTENT]
+
+        self.population_projection = population_projection
+        self.seed = seed
+        self.years = np.arange(2020, end_year + 1)
+        self.regions = [(AREA_POP, AREA_FAO)] + \
+            [(_EXTRA_REGION_CODE + k, _EXTRA_REGION_CODE + k) for k in range(n_regions - 1)]
+        self.items = _item_table(n_items, n_groups, n_origins)
+        self.land_classes = LAND_CLASSES + \
+            [f"Synthetic class {k + 1}" for k in range(n_land_classes - len(LAND_CLASSES))]
+        self.land_resolution = land_resolution
+        self.land_shape = tuple(land_shape)
+        self.land_users = len(self.regions)
+        self._tables = {}
+        self._lock = threading.RLock()
+
+    def _table(self, name, load):
+        with self._lock:
+            if name not in self._tables:
+                self._tables[name] = load()
+            return self._tables[name]
+
+    def _rng(self, table):
+        return np.random.default_rng([self.seed, table])
+
+    def _items(self, summary=True):
+        items = [item for item in self.items if summary or item[0] not in SUMMARY_ITEMS]
+        codes, names, groups, origins = (np.array(values) for values in zip(*items))
+        return {"Item": codes,
+                "Item_name": ("Item", names),
+                "Item_group": ("Item", groups),
+                "Item_origin": ("Item", origins)}
+
+    def UN(self):
+        """Population projections, in thousands of people"""
+
+        def load():
+            rng = self._rng(0)
+            extra = len(self.regions) - 1
+            regions = [AREA_POP, AREA_POP_WORLD] + [area_pop for area_pop, _ in self.regions[1:]]
+            names = ["United Kingdom", "World"] + [f"Synthetic region {k + 1}" for k in range(extra)]
+
+            # Linear growth through the 2020 and 2050 values
+            start = np.array([_POPULATION[AREA_POP][0], _POPULATION[AREA_POP_WORLD][0]]
+                             + list(rng.uniform(1e3, 1e5, extra)))
+            end = np.array([_POPULATION[AREA_POP][1], _POPULATION[AREA_POP_WORLD][1]]
+                           + list(start[2:] * rng.uniform(0.9, 1.3, extra)))
+            fraction = (self.years[:, None] - 2020) / 30
+
+            projections = {}
+            for name in dict.fromkeys(["Medium", self.population_projection]):
+                end_scale = 1. if name == "Medium" else rng.uniform(0.9, 1.1)
+                values = start + (end * end_scale - start) * fraction
+                projections[name] = (("Year", "Region"), values.astype(np.float32))
+
+            return xr.Dataset(projections,
+                              coords={"Year": self.years,
+                                      "Region": regions,
+                                      "Region_name": ("Region", names),
+                                      "Region_type": ("Region", ["Country/Area", "World"] + ["Country/Area"] * extra),
+                                      "Region_subregion": ("Region", ["Northern Europe", "nan"] + ["Synthetic"] * extra),
+                                      "Region_region": ("Region", ["Europe", "nan"] + ["Synthetic"] * extra),
+                                      "Datatype": "Total"})
+
+        return self._table("UN", load)
+
+    def FAOSTAT(self):
+        """Food balance sheets for 2020, in thousand tonnes"""
+
+        def load():
+            rng = self._rng(1)
+            items = self._items()
+            shape = (len(self.regions), len(items["Item"]))
+
+            domestic = rng.lognormal(6., 1.5, shape)
+            production = domestic * rng.uniform(0., 1.5, shape)
+            exports = production * rng.uniform(0., 0.4, shape)
+            imports = np.maximum(domestic - production + exports, 0.)
+            values = {"domestic": domestic,
+                      "production": production,
+                      "imports": imports,
+                      "exports": exports,
+                      "stock": production + imports - exports - domestic,
+                      "food": domestic * rng.uniform(0.3, 0.9, shape),
+                      "feed": domestic * rng.uniform(0., 0.4, shape),
+                      "seed": domestic * rng.uniform(0., 0.05, shape),
+                      "processing": domestic * rng.uniform(0., 0.3, shape),
+                      "losses": domestic * rng.uniform(0., 0.05, shape),
+                      "other": domestic * rng.uniform(0., 0.1, shape),
+                      "residual": np.zeros(shape),
+                      "tourist": np.zeros(shape)}
+
+            data = {}
+            for element in ELEMENTS:
+                element_values = values[element].copy()
+                element_values[rng.random(shape) < _MISSING_FRACTION[element]] = np.nan
+                data[element] = (("Region", "Year", "Item"),
+                                 element_values.astype(np.float32)[:, None, :])
+
+            return xr.Dataset(data, coords={**self._fao_regions(),
+                                            "Year": [2020],
+                                            **items})
+
+        return self._table("FAOSTAT", load)
+
+    def Nutrients_FAOSTAT(self):
+        """Nutrient contents for 2020, per gram of food"""
+
+        def load():
+            rng = self._rng(2)
+            items = self._items()
+            shape = (len(self.regions), len(items["Item"]))
+            fats = np.isin(items["Item_group"][1], ["Vegetable Oils", "Animal fats"])
+
+            nutrients = {"kcal": np.where(fats, 8.8, rng.uniform(0.2, 4., shape)),
+                         "protein": np.where(fats, 0., rng.uniform(0., 0.3, shape)),
+                         "fat": np.where(fats, 1., rng.uniform(0., 0.3, shape))}
+
+            return xr.Dataset({name: (("Region", "Item"), values.astype(np.float32))
+                               for name, values in nutrients.items()},
+                              coords={**self._fao_regions(),
+                                      "Year": 2020,
+                                      **items})
+
+        return self._table("Nutrients_FAOSTAT", load)
+
+    def UKNDC_FAOSTAT(self):
+        """Agricultural and land use emission factors, in gCO2e per gram of
+        food"""
+
+        def load():
+            rng = self._rng(3)
+            items = self._items(summary=False)
+            n = len(items["Item"])
+            animal = items["Item_origin"][1] == "Animal Products"
+
+            return xr.Dataset({"NDC_emissions_agriculture": ("Item", np.where(animal, rng.uniform(2., 30., n), rng.uniform(0., 1., n))),
+                               "NDC_emissions_land_use": ("Item", np.where(animal, rng.uniform(0., 5., n), rng.uniform(0., 1., n)))},
+                              coords=items)
+
+        return self._table("UKNDC_FAOSTAT", load)
+
+    def land_cover(self):
+        """Land cover percentage grid, with NaN outside an island shaped
+        land mask"""
+
+        def load():
+            rng = self._rng(4)
+            ny, nx = self.land_shape
+
+            # Elliptic island with a noisy coast
+            y, x = np.meshgrid(np.linspace(-1, 1, ny), np.linspace(-1, 1, nx), indexing="ij")
+            radius = np.sqrt((x / 0.7)**2 + (y / 0.8)**2) + rng.normal(0., 0.05, (ny, nx))
+            land = radius < 1.
+
+            shares = _LAND_SHARES + [_EXTRA_LAND_SHARE] * (len(self.land_classes) - len(LAND_CLASSES))
+            percentages = rng.dirichlet(np.array(shares) / sum(shares) * 5., size=int(land.sum()))
+            values = np.full((len(self.land_classes), ny, nx), np.nan)
+            values[:, land] = percentages.T * 100
+
+            return xr.DataArray(values,
+                                dims=["aggregate_class", "y", "x"],
+                                coords={"aggregate_class": self.land_classes,
+                                        "y": (np.arange(ny)[::-1] + 0.5) * self.land_resolution,
+                                        "x": (np.arange(nx) + 0.5) * self.land_resolution},
+                                name="percentage")
+
+        with self._lock:
+            LC = self._table("land_cover", load)
+            self.land_users -= 1
+            if self.land_users > 0:
+                return copy.deepcopy(LC)
+            # Hand the grid itself to the last user
+            return self._tables.pop("land_cover")
+
+    def _fao_regions(self):
+        names = [_FAO_REGION_NAME] + [f"Synthetic region {k + 1} (FAO)"
+                                      for k in range(len(self.regions) - 1)]
+        return {"Region": [area_fao for _, area_fao in self.regions],
+                "Region_name": ("Region", names)}
+
+
+def _item_table(n_items=None, n_groups=None, n_origins=None):
+    """Returns the (code, name, group, origin) rows of the FAOSTAT items,
+    extended with synthetic items, groups and origins, sorted by code"""
+
+    rows = [(code, name, group, origin) for (origin, group), items in ITEMS.items()
+            for code, name in items]
+    group_origins = {group: origin for _, _, group, origin in rows}
+    origins = list(dict.fromkeys(group_origins.values()))
+    food_groups = list(dict.fromkeys(group for code, _, group, _ in rows
+                                     if code not in SUMMARY_ITEMS))
+    n_food_items = len(rows) - len(SUMMARY_ITEMS)
+
+    n_items = n_food_items if n_items is None else n_items
+    n_groups = len(food_groups) if n_groups is None else n_groups
+    n_origins = len(origins) if n_origins is None else n_origins
+
+    if n_items < n_food_items or n_groups < len(food_groups) or n_origins < len(origins):
+        raise ValueError(f"At least {n_food_items} items, {len(food_groups)} groups "
+                         f"and {len(origins)} origins are needed, got {n_items}, "
+                         f"{n_groups} and {n_origins}")
+
+    new_origins = [f"Synthetic origin {k + 1}" for k in range(n_origins - len(origins))]
+    new_groups = [f"Synthetic group {k + 1}" for k in range(n_groups - len(food_groups))]
+    if len(new_groups) < len(new_origins) or n_items - n_food_items < len(new_groups):
+        raise ValueError("Every new origin needs a new group, and every new "
+                         "group a new item")
+
+    all_origins = new_origins + origins
+    for k, group in enumerate(new_groups):
+        group_origins[group] = all_origins[k % len(all_origins)]
+
+    item_groups = new_groups + food_groups
+    for k in range(n_items - n_food_items):
+        code = _EXTRA_ITEM_CODE + k
+        group = item_groups[k % len(item_groups)]
+        rows.append((code, f"Synthetic item {code}", group, group_origins[group]))
+
+    return sorted(rows)
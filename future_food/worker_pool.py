@@ -0,0 +1,180 @@
+"""Pool of pre-forked worker processes kept warm for scenario requests.
+
+A new worker process pays for datablock_setup, the imports of xarray,
+agrifoodpy and the model, and the first run of the pipeline before it can
+answer anything. WorkerPool pays for them once in the parent process: it
+builds the baseline datablock, loads all its entries and makes its arrays
+read-only, and runs warm-up scenarios such as the default one of the
+calculator, which fill the checkpoint cache of the pool. The worker processes
+are then forked and inherit all of this copy-on-write, and new scenarios
+resume from the last checkpoint they share with the warm-up runs, so that a
+scenario only changing the later sliders only runs the nodes after them.
+
+Jobs are dispatched to the workers over the queue of a multiprocessing pool,
+and their results are sent back through concurrent.futures.Future objects,
+which asyncio code can await with asyncio.wrap_future.
+"""
+
+import gc
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import Future
+from multiprocessing.pool import ThreadPool
+
+from .cache import LRUCache
+from .datablock_setup import datablock_setup
+from .datablock_utils import copy_datablock, freeze_datablock, materialize
+from .pipeline import CHECKPOINT_BYTES, ModelPipeline
+from .pipeline_builder import pipeline_setup
+from .sweep import _collect
+
+# Baseline datablock, settings, paths and checkpoints of the worker
+# processes, set when they start
+_worker_state = {}
+
+
+class WorkerPool():
+    """Pool of worker processes forked from a warmed-up parent process.
+
+    Parameters
+    ----------
+    adv_settings : dict
+        Advanced settings, shared by all the runs.
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    datablock : dict, optional
+        Baseline datablock. If None, it is built with datablock_setup, using
+        adv_settings and setup_kwargs, which must include AES_KEY and AES_IV.
+    warmup : list of dict, optional
+        Slider positions of the scenarios run in the parent process before
+        forking, such as the default scenario of the calculator.
+    paths : list of tuple, optional
+        Datablock paths returned for each run. Defaults to the metrics
+        section. If None, the whole datablock of each run is returned.
+    checkpoints : LRUCache, optional
+        Checkpoint cache filled by the warm-up runs. Each worker process
+        inherits it and adds the checkpoints of its own runs to its copy.
+        Defaults to a cache of the pool bounded to CHECKPOINT_BYTES of
+        distinct arrays, which bounds the memory each worker adds to the
+        arrays it shares with the parent process. If False, checkpoints are
+        disabled.
+    **setup_kwargs
+        Keyword arguments of datablock_setup.
+    """
+
+    def __init__(
+            self,
+            adv_settings,
+            workers=None,
+            datablock=None,
+            warmup=None,
+            paths=(("metrics",),),
+            checkpoints=None,
+            **setup_kwargs
+            ):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        if checkpoints is None:
+            checkpoints = LRUCache(maxsize=None, maxbytes=CHECKPOINT_BYTES, shared=True)
+
+        if datablock is None:
+            datablock = datablock_setup(advanced_settings=adv_settings, **setup_kwargs)
+
+        # Load every lazy entry before forking, so the workers share them
+        self.datablock = freeze_datablock(materialize(datablock))
+        self.adv_settings = adv_settings
+        self.workers = workers
+        self.paths = None if paths is None else [tuple(path) for path in paths]
+        self.checkpoints = checkpoints
+
+        # ---- Warm up the parent process ----
+        for params in warmup or []:
+            _run(self.datablock, params, adv_settings, self.paths, checkpoints)
+
+        state = {"datablock": self.datablock, "adv_settings": adv_settings,
+                 "paths": self.paths, "checkpoints": checkpoints}
+
+        if "fork" not in multiprocessing.get_all_start_methods():
+            warnings.warn("Forked worker processes are not available on this "
+                          "platform, running the jobs on a thread of the "
+                          "current process.")
+            self._pool = ThreadPool(1, initializer=_start_worker, initargs=(state,))
+            return
+
+        # The initializer arguments of forked workers are inherited, not
+        # pickled. Freezing the garbage collector keeps the collections of
+        # the workers from writing to the pages of the inherited objects.
+        gc.collect()
+        gc.freeze()
+        try:
+            context = multiprocessing.get_context("fork")
+            self._pool = context.Pool(processes=workers, initializer=_start_worker,
+                                      initargs=(state,))
+        finally:
+            gc.unfreeze()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, params):
+        """Runs a scenario on a worker process.
+
+        Parameters
+        ----------
+        params : dict
+            Slider positions, as passed to pipeline_setup.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Future of the requested paths of the final datablock of the run,
+            or of the whole datablock if paths is None.
+        """
+
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self._pool.apply_async(_worker_run, (dict(params),),
+                               callback=future.set_result,
+                               error_callback=future.set_exception)
+        return future
+
+    def run(self, params):
+        """Runs a scenario on a worker process and returns its results, see
+        submit."""
+        return self.submit(params).result()
+
+    def map(self, param_sets):
+        """Runs scenarios on the worker processes, yielding their results in
+        the order of param_sets."""
+        futures = [self.submit(params) for params in param_sets]
+        for future in futures:
+            yield future.result()
+
+    def close(self):
+        """Waits for the submitted jobs and stops the worker processes"""
+        self._pool.close()
+        self._pool.join()
+
+
+def _start_worker(state):
+    _worker_state.update(state)
+
+
+def _worker_run(params):
+    return _run(_worker_state["datablock"], params, _worker_state["adv_settings"],
+                _worker_state["paths"], _worker_state["checkpoints"])
+
+
+def _run(datablock, params, adv_settings, paths, checkpoints):
+    pipeline = ModelPipeline(datablock=copy_datablock(datablock), checkpoints=checkpoints)
+    pipeline = pipeline_setup(pipeline, params, adv_settings, fuse=True)
+    pipeline.run()
+
+    return _collect(pipeline, paths)
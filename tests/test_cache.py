@@ -0,0 +1,25 @@
+"""Fingerprints of the arrays of datablocks and node parameters."""
+
+import numpy as np
+
+from future_food.cache import fingerprint
+from future_food.datablock_utils import freeze
+
+
+def test_readonly_view_of_writable_array_is_rehashed():
+    base = np.zeros(1 << 14)
+    view = base.view()
+    view.flags.writeable = False
+
+    before = fingerprint(view)
+    base[0] = 1
+
+    assert fingerprint(view) != before
+
+
+def test_freeze_freezes_the_base_of_views():
+    base = np.zeros(1 << 14)
+    view = freeze(base[::2])
+
+    assert not base.flags.writeable
+    assert fingerprint(view) == fingerprint(np.zeros(1 << 13))
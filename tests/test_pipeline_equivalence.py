@@ -0,0 +1,185 @@
+"""Runs of the calculator pipeline with and without its optimizations.
+
+Fusing nodes and eliminating neutral nodes must not change the results of a
+run, so the final datablocks of optimized runs are compared bit for bit to
+those of a run of every node in turn, on a synthetic baseline.
+"""
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from future_food.datablock_utils import copy_datablock, freeze_datablock
+from future_food.model import scale_impact
+from future_food.pipeline import ModelPipeline
+from future_food.pipeline_builder import pipeline_setup
+from future_food.synthetic import synthetic_datablock
+
+slider_values = {
+    "ruminant" : -20,
+    "pig_poultry" : -10,
+    "fish_seafood" : 0,
+    "dairy" : -10,
+    "eggs" : 0,
+    "fruit_veg" : 20,
+    "pulses" : 20,
+    "meat_alternatives" : 20,
+    "dairy_alternatives" : 20,
+    "waste" : 20,
+    "foresting_pasture" : 13.17,
+    "bdleaf_conif_ratio":75,
+    "land_BECCS" : 2,
+    "land_BECCS_pasture":2,
+    "horticulture" : 20,
+    "pulse_production" : 20,
+    "lowland_peatland" : 20,
+    "upland_peatland" : 20,
+    "pasture_soil_carbon" : 20,
+    "arable_soil_carbon" : 20,
+    "mixed_farming" : 10,
+    "silvopasture" : 10,
+    "nitrogen" : 20,
+    "methane_inhibitor" : 20,
+    "stock_density" : 10,
+    "manure_management" : 20,
+    "livestock_yield":105,
+    "animal_breeding" : 20,
+    "fossil_livestock" : 20,
+    "agroforestry" : 10,
+    "vertical_farming" : 10,
+    "fossil_arable" : 20,
+    "waste_BECCS" : 1,
+    "overseas_BECCS" : 1,
+    "DACCS" : 1,
+    "biochar":1
+}
+
+advanced_settings = {
+    "pop_proj": "Medium",
+    "yield_proj":0.0,
+    "elasticity":0.5,
+    "baseline_total_emissions":71,
+    "baseline_agricultural_emissions":30,
+    "ssr_metric":"g/cap/day",
+    "baseline_beef_herd":5672659,
+    "baseline_dairy_herd":3479950,
+    "baseline_dairy_herd_breeding_aged_2_years_":1836442,
+    "baseline_sheep_flock":31016701,
+    "baseline_poultry_heads":178000000,
+    "baseline_pig_heads":4715669,
+    "baseline_potato_area":0.12,
+    "baseline_oilseed_area":0.418,
+    "baseline_horticulture_area":0.145,
+    "baseline_cereal_area":3.1,
+    "baseline_othercrops_area":0.75,
+    "labmeat_co2e":2.2,
+    "dairy_alternatives_co2e":0.31,
+    "rda_kcal":2250,
+    "n_scale":20,
+    "bdleaf_seq_ha_yr":3.82,
+    "conif_seq_ha_yr":7.63,
+    "new_bdleaf_seq_ha_yr":2.1,
+    "new_conif_seq_ha_yr":11.2,
+    "peatland_seq_ha_yr":20,
+    "managed_arable_seq_ha_yr":0.66,
+    "managed_pasture_seq_ha_yr":0.66,
+    "mixed_farming_seq_ha_yr":0.66,
+    "beccs_crops_arable_seq_ha_yr":5.34,
+    "beccs_crops_pasture_seq_ha_yr":11.82,
+    "BECCS_arable_tco2_ha_yr":20.84,
+    "BECCS_pasture_tco2_ha_yr":5.11,
+    "dairy_herd_grazing":0.05,
+    "dairy_herd_beef":0.52,
+    "horticulture_land_ratio":0.086,
+    "pulse_land_ratio":0.033,
+    "mixed_farming_production_scale":0.93,
+    "mixed_farming_secondary_production_scale":0.1,
+    "agroecology_tree_coverage":0.1,
+    "nitrogen_prod_factor":0,
+    "nitrogen_ghg_factor":0.1,
+    "manure_prod_factor":0,
+    "manure_ghg_factor":0.07,
+    "breeding_prod_factor":0,
+    "breeding_ghg_factor":0.08,
+    "methane_prod_factor":0,
+    "methane_ghg_factor":0.13,
+    "fossil_livestock_prod_factor":0,
+    "fossil_livestock_ghg_factor":0.1,
+    "fossil_arable_prod_factor":0,
+    "fossil_arable_ghg_factor":0.1,
+    "scaling_nutrient":"kCal/cap/day"
+}
+
+# Slider positions at which the sliders leave the datablock unchanged, see
+# future_food.neutral. The forest sliders set a target and have none.
+neutral_slider_values = {key: 100 if key == "livestock_yield" else 0 for key in slider_values}
+neutral_slider_values.update({key: slider_values[key]
+                              for key in ["foresting_pasture", "bdleaf_conif_ratio"]})
+
+# Half of the sliders at their neutral positions, so that neutral and
+# non-neutral nodes alternate along the pipeline
+mixed_slider_values = {key: value if i % 2 else neutral_slider_values[key]
+                       for i, (key, value) in enumerate(slider_values.items())}
+
+SLIDER_SETS = {"default": slider_values,
+               "neutral": neutral_slider_values,
+               "mixed": mixed_slider_values}
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    return freeze_datablock(synthetic_datablock(advanced_settings))
+
+
+def run_pipeline(baseline, params, **kwargs):
+    pipeline = ModelPipeline(datablock=copy_datablock(baseline), checkpoints=False)
+    pipeline = pipeline_setup(pipeline, params, advanced_settings, **kwargs)
+    pipeline.run()
+
+    return pipeline.datablock
+
+
+def assert_identical(value, expected, path=()):
+    if isinstance(expected, dict):
+        assert set(value) == set(expected), path
+        for key in expected:
+            assert_identical(value[key], expected[key], path + (key,))
+    elif isinstance(expected, (xr.DataArray, xr.Dataset)):
+        xr.testing.assert_identical(value, expected)
+    elif isinstance(expected, np.ndarray):
+        np.testing.assert_array_equal(value, expected, err_msg=str(path))
+    else:
+        assert value == expected, path
+
+
+@pytest.mark.parametrize("sliders", SLIDER_SETS)
+@pytest.mark.parametrize("fuse, neutral", [(True, True), (True, False), (False, True)])
+def test_optimized_run_is_identical(baseline, sliders, fuse, neutral):
+    params = SLIDER_SETS[sliders]
+    expected = run_pipeline(baseline, params, fuse=False, neutral=False)
+    datablock = run_pipeline(baseline, params, fuse=fuse, neutral=neutral)
+
+    for section in ["metrics", "food", "impact", "land"]:
+        assert_identical(datablock[section], expected[section], (section,))
+
+
+def test_neutral_stub_runs_node_with_changed_parameters(baseline):
+    optimized, expected = [
+        pipeline_setup(ModelPipeline(datablock=copy_datablock(baseline), checkpoints=False),
+                       neutral_slider_values, advanced_settings, fuse=False, neutral=neutral)
+        for neutral in [True, False]]
+
+    # Stubs keep the index, name and parameters of their node
+    assert optimized.names == expected.names
+    assert optimized.params == expected.params
+
+    # Changing the parameters of a stub after the pipeline is built runs the
+    # node with them
+    i = expected.nodes.index(scale_impact)
+    assert optimized.nodes[i] is not scale_impact
+    for pipeline in [optimized, expected]:
+        pipeline.params[i]["scale_factor"] = 0.2
+        pipeline.run()
+
+    for section in ["metrics", "food", "impact", "land"]:
+        assert_identical(optimized.datablock[section], expected.datablock[section], (section,))